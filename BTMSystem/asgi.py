@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BTMSystem.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once Django is set up; serves /btms_api/live/ and passes every other request to Django
+from btms_api.live import LiveScoresApplication  # noqa: E402
+
+application = LiveScoresApplication(django_application)
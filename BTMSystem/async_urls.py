@@ -0,0 +1,12 @@
+"""BTMSystem URL Configuration for requests handled asynchronously
+
+The same URLs as `BTMSystem.urls`, with the API served by async views. Selected per request by
+`btms_api.async_views.AsyncURLConfMiddleware` through the `BTMS_ASYNC_URLCONF` setting.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('btms_api.async_urls'))
+]
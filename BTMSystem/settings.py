@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'btms_api.metrics.MetricsMiddleware',
+    'btms_api.async_views.AsyncURLConfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +64,19 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'btms_api.User'
 
+# Cached token authentication (btms_api.authentication.CachedTokenAuthentication).
+# Set BTMS_TOKEN_CACHE_SHARED_ALIAS to a CACHES alias shared by all workers to propagate revocations between them.
+BTMS_TOKEN_CACHE_MAX_ENTRIES = 1024
+BTMS_TOKEN_CACHE_TTL = 60
+BTMS_TOKEN_CACHE_SHARED_ALIAS = None
+
+# Maximum number of items accepted by a single bulk create/update request (btms_api.bulk.BulkModelMixin).
+BTMS_BULK_MAX_ITEMS = 1000
+
+# Commit posted match events from one writer thread, grouping concurrent batches into one transaction
+# (btms_api.match_events.EventWriter). Off writes every batch in its request.
+BTMS_EVENT_GROUP_COMMIT = True
+
 ROOT_URLCONF = 'BTMSystem.urls'
 
 TEMPLATES = [
@@ -85,13 +101,85 @@ WSGI_APPLICATION = 'BTMSystem.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Pick a profile with the BTMS_DATABASE_PROFILE environment variable. 'production' serves SQLite in WAL mode with
+# tuned pragmas, BEGIN IMMEDIATE transactions, retries on lock errors (btms_api.backends.sqlite3) and persistent
+# connections.
+DATABASE_PROFILES = {
+    'development': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'production': {
+        'ENGINE': 'btms_api.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'cache_size': -64000,
+                'mmap_size': 268435456,
+            },
+            'lock_retries': 5,
+            'lock_retry_backoff': 0.01,
+        },
+    },
+}
+BTMS_DATABASE_PROFILE = os.environ.get('BTMS_DATABASE_PROFILE', 'development')
+
+DATABASES = {
+    'default': DATABASE_PROFILES[BTMS_DATABASE_PROFILE],
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# 'responses' holds the read-through response cache of btms_api.response_cache. Any bounded backend works; use
+# 'django.core.cache.backends.filebased.FileBasedCache' with a LOCATION directory (or a shared cache server) so
+# several worker processes share entries and invalidations.
+# 'aggregates' holds the bracket, player statistics and leaderboards and their generations. With a per-process
+# backend, a worker that did not handle a write serves its entries until they expire, so TIMEOUT bounds how stale
+# they can be; point BTMS_AGGREGATE_CACHE_ALIAS at a shared cache to invalidate every worker at once.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'btms-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'aggregates': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'btms-aggregates',
+        'TIMEOUT': 30,
+    },
 }
 
+BTMS_RESPONSE_CACHE_ALIAS = 'responses'
+BTMS_AGGREGATE_CACHE_ALIAS = 'aggregates'
+
+# Serve list reads from values() rows with precompiled converters instead of the serializers, with the same JSON
+# (btms_api.fast_list.FastListMixin). Lists the converters cannot reproduce, e.g. with ?expand=, use the serializers.
+BTMS_FAST_LIST = True
+
+# Per-request phase timings are always collected for /btms_api/metrics/, this only controls the response header.
+BTMS_SERVER_TIMING = True
+
+# Under ASGI (BTMSystem/asgi.py) the API is served from this URLconf, with the reads of teams, players, rounds and
+# matches running in a pool of BTMS_ASYNC_DB_WORKERS threads instead of a thread per request.
+BTMS_ASYNC_URLCONF = 'BTMSystem.async_urls'
+BTMS_ASYNC_DB_WORKERS = 8
+
+# Live scores (/btms_api/live/, btms_api.live) reach the streams of this process only. With several workers, run
+# `python manage.py live_broker` and set its 'host:port' here so every worker relays every score change.
+BTMS_LIVE_BROKER = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class BtmsApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'btms_api'
+
+    def ready(self):
+        from .filters import check_filter_indexes
+        from .signals import connect_signals
+        connect_signals()
+        checks.register(check_filter_indexes, checks.Tags.models)
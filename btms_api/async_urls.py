@@ -0,0 +1,8 @@
+from .async_views import async_urlpatterns
+from .urls import urlpatterns as sync_urlpatterns
+
+# reads of these routes run in the bounded database executor
+ASYNC_READ_ROUTES = {'teams-list', 'teams-detail', 'players-list', 'players-detail', 'rounds-list', 'rounds-detail',
+                     'matches-list', 'matches-detail', 'export-players', 'export-matches'}
+
+urlpatterns = async_urlpatterns(sync_urlpatterns, ASYNC_READ_ROUTES)
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.urls import URLPattern, URLResolver
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import track_queries
+
+# Streamed content kept in memory before spilling to disk, see spool_streaming_response
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """
+    Returns the process-wide executor running the database work of async views, sized by `BTMS_ASYNC_DB_WORKERS`.
+    """
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'BTMS_ASYNC_DB_WORKERS', 8),
+                                                  thread_name_prefix='btms-db')
+    return _db_executor
+
+
+def _run_db_job(func, args, kwargs):
+    # the same connection handling as a request boundary: with CONN_MAX_AGE > 0 every executor thread keeps its
+    # connection, so the executor doubles as a bounded connection pool
+    close_old_connections()
+    try:
+        with track_queries():
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """
+    Runs the blocking `func(*args, **kwargs)` in the database executor with the caller's context variables, and
+    returns its result. The event loop thread is free while it waits.
+    """
+    context = contextvars.copy_context()
+    job = functools.partial(context.run, _run_db_job, func, args, kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_db_executor(), job)
+
+
+def spool_streaming_response(response):
+    """
+    Takes a streaming response, and returns an equivalent one streaming from a temporary file holding its content.
+    Django 4.0 iterates streaming responses on the event loop, where the ORM cannot run, so content produced from
+    querysets is spooled in the database executor first; memory stays bounded by `SPOOL_MAX_MEMORY`.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    for part in response.streaming_content:
+        spooled.write(part)
+    spooled.seek(0)
+    spooled_response = StreamingHttpResponse(iter(lambda: spooled.read(64 * 1024), b''), status=response.status_code)
+    for header, value in response.items():
+        spooled_response[header] = value
+    spooled_response._resource_closers.append(spooled.close)
+    return spooled_response
+
+
+def _read(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if getattr(response, 'streaming', False):
+        response = spool_streaming_response(response)
+    return response
+
+
+def async_view(view, read_in_executor=False):
+    """
+    Takes a synchronous view, and returns an async view running it. Safe methods run in the bounded database
+    executor when `read_in_executor` is set; everything else runs thread sensitive, exactly as Django runs synchronous
+    views under ASGI. Auth, permissions and filters are those of the wrapped view.
+    """
+    def run(request, *args, **kwargs):
+        with track_queries():
+            return view(request, *args, **kwargs)
+
+    run_thread_sensitive = sync_to_async(run, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if read_in_executor and request.method in SAFE_METHODS:
+            return await run_in_db_executor(_read, view, request, *args, **kwargs)
+        return await run_thread_sensitive(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_urlpatterns(patterns, read_names):
+    """
+    Takes URL patterns and the URL names whose reads run in the database executor, and returns the same patterns
+    with every view wrapped by `async_view`.
+    """
+    converted = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            converted.append(URLResolver(pattern.pattern, async_urlpatterns(pattern.url_patterns, read_names),
+                                         pattern.default_kwargs, pattern.app_name, pattern.namespace))
+        else:
+            callback = async_view(pattern.callback, read_in_executor=pattern.name in read_names)
+            converted.append(URLPattern(pattern.pattern, callback, pattern.default_args, pattern.name))
+    return converted
+
+
+class AsyncURLConfMiddleware:
+    """
+    Routes requests handled asynchronously (under `BTMSystem/asgi.py`) to the `BTMS_ASYNC_URLCONF` URLconf, which
+    serves the same URLs with async views. Under WSGI it is a no-op, so synchronous deployments never pay for an
+    event loop per request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            # mark the instance as a coroutine function, as Django's MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        urlconf = getattr(settings, 'BTMS_ASYNC_URLCONF', None)
+        if urlconf:
+            request.urlconf = urlconf
+        return await self.get_response(request)
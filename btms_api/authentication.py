@@ -0,0 +1,126 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+REVOKED_TOKEN_KEY = 'btms_api:revoked-token:%s'
+
+
+def token_digest(key):
+    """
+    Takes a raw token key, and returns the digest used to key cache entries so raw tokens are never stored.
+    """
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded LRU of authenticated `(user, token)` pairs with a TTL, keyed by token digest.
+
+    When `shared_cache_alias` names a Django cache, revocations are also written there as timestamps, and local
+    entries cached before a revocation are discarded, so every worker process agrees on revocations.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, shared_cache_alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_cache_alias = shared_cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared_cache(self):
+        return caches[self.shared_cache_alias] if self.shared_cache_alias else None
+
+    def get(self, digest):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            expires_at, cached_at, user, token = entry
+            if expires_at <= now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            revoked_at = shared_cache.get(REVOKED_TOKEN_KEY % digest)
+            if revoked_at is not None and revoked_at >= cached_at:
+                self.evict(digest)
+                return None
+
+        # hand out a copy so per-request changes to the user never leak into other requests
+        return copy.copy(user), token
+
+    def set(self, digest, user, token):
+        with self._lock:
+            self._entries[digest] = (time.monotonic() + self.ttl, time.time(), user, token)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def revoke(self, digest):
+        """
+        Drops the entry for a token digest in this process and, if configured, in every other process.
+        """
+        self.evict(digest)
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            shared_cache.set(REVOKED_TOKEN_KEY % digest, time.time(), self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Returns the process-wide token cache, configured from the `BTMS_TOKEN_CACHE_*` settings.
+    """
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = TokenCache(max_entries=getattr(settings, 'BTMS_TOKEN_CACHE_MAX_ENTRIES', 1024),
+                                          ttl=getattr(settings, 'BTMS_TOKEN_CACHE_TTL', 60),
+                                          shared_cache_alias=getattr(settings, 'BTMS_TOKEN_CACHE_SHARED_ALIAS', None))
+    return _token_cache
+
+
+def revoke_token(key):
+    """
+    Takes a raw token key, and removes it from the token cache.
+    """
+    get_token_cache().revoke(token_digest(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    `TokenAuthentication` that serves repeated tokens from `TokenCache` instead of querying Token and User.
+    """
+
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+        token_cache = get_token_cache()
+        cached = token_cache.get(digest)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(digest, user, token)
+        return user, token
@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+from django.db.backends.sqlite3.base import Database
+
+# Applied to every new connection, in order; journal_mode=WAL is persistent, the others are per connection
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+}
+DEFAULT_LOCK_RETRIES = 5
+DEFAULT_LOCK_RETRY_BACKOFF = 0.01
+
+
+def is_lock_error(exc):
+    return isinstance(exc, Database.OperationalError) and 'locked' in str(exc)
+
+
+def retry_on_lock(func, retries, backoff):
+    """
+    Calls `func()`, retrying it up to `retries` times with jittered exponential backoff starting at `backoff`
+    seconds while SQLite reports the database as locked.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Database.OperationalError as exc:
+            if attempt == retries or not is_lock_error(exc):
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1))
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Retries statements failing on a lock outside transactions, where a failed statement changed nothing. Inside a
+    transaction the statement is left to fail, the transaction holding the write lock from its `BEGIN IMMEDIATE`.
+    """
+    lock_retries = 0
+    lock_retry_backoff = DEFAULT_LOCK_RETRY_BACKOFF
+
+    def execute(self, query, params=None):
+        if self.connection.in_transaction:
+            return super().execute(query, params)
+        return retry_on_lock(lambda: super(SQLiteCursorWrapper, self).execute(query, params), self.lock_retries,
+                             self.lock_retry_backoff)
+
+    def executemany(self, query, param_list):
+        if self.connection.in_transaction:
+            return super().executemany(query, param_list)
+        param_list = list(param_list)
+        return retry_on_lock(lambda: super(SQLiteCursorWrapper, self).executemany(query, param_list),
+                             self.lock_retries, self.lock_retry_backoff)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite tuned for concurrent serving. Every connection is set up with `OPTIONS['pragmas']` (WAL journal, so
+    readers never wait on the writer, and a busy timeout by default), and transactions start with `BEGIN IMMEDIATE`:
+    a deferred transaction that reads before it writes cannot wait for the write lock and fails at once. Statements
+    and transaction starts still failing on a lock are retried `OPTIONS['lock_retries']` times with backoff from
+    `OPTIONS['lock_retry_backoff']` seconds. Pair it with a `CONN_MAX_AGE` so connections and their page cache
+    outlive requests.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', DEFAULT_PRAGMAS)
+        self.lock_retries = kwargs.pop('lock_retries', DEFAULT_LOCK_RETRIES)
+        self.lock_retry_backoff = kwargs.pop('lock_retry_backoff', DEFAULT_LOCK_RETRY_BACKOFF)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            retry_on_lock(lambda: conn.execute('PRAGMA %s = %s' % (name, value)).fetchall(), self.lock_retries,
+                          self.lock_retry_backoff)
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        cursor.lock_retry_backoff = self.lock_retry_backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        with self.wrap_database_errors:
+            retry_on_lock(lambda: self.connection.execute('BEGIN IMMEDIATE'), self.lock_retries,
+                          self.lock_retry_backoff)
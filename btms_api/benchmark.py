@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import math
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def temporary_database(verbosity=0, name=None):
+    """
+    Creates and migrates a throwaway test database for the duration of the block, so benchmarks never touch the
+    configured database. Pass a file `name` when the database must be shared between threads.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name:
+        test_settings['NAME'] = name
+    try:
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+def percentile_of(samples, percentile):
+    """
+    Takes a list of samples and a percentile, and returns the nearest-rank percentile of the samples.
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, repeat):
+    """
+    Calls `func` `repeat` times, and returns the timings in milliseconds together with the last result.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def summarize(timings):
+    """
+    Takes a list of timings in milliseconds, and returns a dict of summary statistics.
+    """
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile_of(timings, 50), 3),
+        'p95_ms': round(percentile_of(timings, 95), 3),
+        'p99_ms': round(percentile_of(timings, 99), 3),
+    }
+
+
+def populate(teams, players, seed, rounds=0, matches=0, batch_size=5000):
+    """
+    Bulk inserts `teams` teams, `players` players spread evenly over them, and `matches` matches spread over
+    `rounds` rounds, with values drawn from `seed`. Returns the team ids.
+    """
+    from .models import Team, Player, Round, Match
+
+    rng = random.Random(seed)
+    Team.objects.bulk_create(
+        [Team(name='team-%d' % t, average_score=round(rng.uniform(100, 200), 2)) for t in range(teams)])
+    team_ids = list(Team.objects.values_list('id', flat=True))
+    Player.objects.bulk_create(
+        [Player(name='player-%d' % p, position='guard', age=rng.randint(10, 80),
+                number_of_games_played=rng.randint(0, 4), penalty_count=rng.randint(0, 4),
+                height=round(rng.uniform(50, 300), 2), weight=round(rng.uniform(15, 200), 2),
+                average_score=round(rng.uniform(100, 200), 2), is_team_captain=False,
+                team_id=team_ids[p % teams]) for p in range(players)],
+        batch_size=batch_size)
+
+    if rounds:
+        Round.objects.bulk_create(
+            [Round(round_no=r + 1, round_code='R%d' % (r + 1), round_name='Round %d' % (r + 1)) for r in range(rounds)])
+        round_ids = list(Round.objects.values_list('id', flat=True))
+        start_date = datetime.date(2020, 1, 1)
+        Match.objects.bulk_create(
+            [Match(match_no=m + 1, date=start_date + datetime.timedelta(days=rng.randrange(3 * 365)),
+                   time=datetime.time(hour=rng.randint(9, 21), minute=rng.choice([0, 15, 30, 45])),
+                   venue='venue-%d' % rng.randrange(50), round_id=round_ids[m % rounds],
+                   host_team_id=team_ids[m % teams], guest_team_id=team_ids[(m + 1) % teams],
+                   winner_team_id=team_ids[m % teams], host_team_final_score=rng.randint(61, 140),
+                   guest_team_final_score=rng.randint(0, 60)) for m in range(matches)],
+            batch_size=batch_size)
+    return team_ids
+
+
+def _payload(body):
+    if body is None:
+        return b''
+    return body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+
+
+def wsgi_request(application, method, path, body=None, headers=None, content_type='application/json'):
+    """
+    Calls a WSGI application in process with an optional body (JSON encoded unless it is bytes) and `{name: value}`
+    HTTP headers, and returns `(status_code, content)`.
+    """
+    path, _, query_string = path.partition('?')
+    payload = _payload(body)
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+    }
+    environ.update(('HTTP_%s' % name.upper().replace('-', '_'), value) for name, value in (headers or {}).items())
+    setup_testing_defaults(environ)
+
+    statuses = []
+
+    def start_response(status, response_headers, exc_info=None):
+        statuses.append(int(status.split(' ', 1)[0]))
+
+    result = application(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        # closing the response sends request_finished, which closes the thread's database connection
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0], content
+
+
+async def asgi_request(application, method, path, body=None, headers=None, content_type='application/json'):
+    """
+    Calls an ASGI application in process with an optional body (JSON encoded unless it is bytes) and `{name: value}`
+    HTTP headers, and returns `(status_code, response_headers, content)` with lower case header names.
+    """
+    path, _, query_string = path.partition('?')
+    payload = _payload(body)
+    request_headers = [(b'host', b'127.0.0.1'), (b'content-type', content_type.encode('latin1')),
+                       (b'content-length', str(len(payload)).encode('ascii'))]
+    request_headers.extend((name.lower().encode('latin1'), value.encode('latin1'))
+                           for name, value in (headers or {}).items())
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('utf-8'),
+        'query_string': query_string.encode('utf-8'),
+        'root_path': '',
+        'headers': request_headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('127.0.0.1', 80),
+    }
+    disconnected = asyncio.Event()
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            # the client stays connected until the response is complete
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+        body_sent = True
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        disconnected.set()
+    start = messages[0]
+    response_headers = {name.decode('latin1').lower(): value.decode('latin1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run through a connection.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_load(func, indexes, concurrency):
+    """
+    Calls `func(index)`, which returns a status code, for every index from `concurrency` threads. Returns the wall
+    time in seconds and one `(latency_ms, status_code, queries)` sample per call, in index order.
+    """
+    def call(index):
+        counter = QueryCounter()
+        with connections[DEFAULT_DB_ALIAS].execute_wrapper(counter):
+            started = time.perf_counter()
+            status_code = func(index)
+            latency = (time.perf_counter() - started) * 1000
+        return latency, status_code, counter.count
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        samples = [call(index) for index in indexes]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(call, indexes))
+    return time.perf_counter() - started, samples
+
+
+async def run_async_load(func, indexes, concurrency):
+    """
+    Awaits `func(index)`, which returns `(status_code, queries)`, for every index with at most `concurrency` calls in
+    flight. Returns the wall time in seconds and one `(latency_ms, status_code, queries)` sample per call, in index
+    order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(index):
+        async with semaphore:
+            started = time.perf_counter()
+            status_code, queries = await func(index)
+            return (time.perf_counter() - started) * 1000, status_code, queries
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*[call(index) for index in indexes])
+    return time.perf_counter() - started, samples
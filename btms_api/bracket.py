@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from .generations import bump_generation_on_write, get_generations, get_aggregate_cache
+from .models import Match
+
+BRACKET_CACHE_KEY = 'btms_api:bracket:%d'
+BRACKET_GENERATION = 'bracket'
+
+
+def _team(team):
+    return {'id': team.id, 'name': team.name}
+
+
+def invalidate_bracket(**kwargs):
+    """
+    Moves the cached bracket to a new generation. Connected to Team, Round and Match writes.
+    """
+    bump_generation_on_write(get_aggregate_cache(), BRACKET_GENERATION)
+
+
+def _next_matches(rounds):
+    """
+    Takes `[(round, matches)]` in round order, and returns `{match_id: next_match_id}` linking every match to the
+    earliest match of the following round that its winner plays in.
+    """
+    next_matches = {}
+    for (_, matches), (_, following) in zip(rounds, rounds[1:]):
+        by_team = defaultdict(list)
+        for match in following:
+            by_team[match.host_team_id].append(match)
+            by_team[match.guest_team_id].append(match)
+        for match in matches:
+            candidates = [candidate for candidate in by_team.get(match.winner_team_id, [])
+                          if (candidate.date, candidate.time) >= (match.date, match.time)]
+            if candidates:
+                next_matches[match.id] = candidates[0].id
+    return next_matches
+
+
+def build_bracket():
+    """
+    Returns the knockout tree, rounds in `round_no` order with their matches, built from a single joined query.
+    """
+    queryset = Match.objects.select_related('round', 'host_team', 'guest_team', 'winner_team') \
+        .order_by('round__round_no', 'round_id', 'date', 'time', 'id')
+
+    rounds = {}
+    for match in queryset:
+        rounds.setdefault(match.round_id, (match.round, []))[1].append(match)
+    rounds = list(rounds.values())
+    next_matches = _next_matches(rounds)
+
+    return {
+        'rounds': [
+            {
+                'id': round_obj.id,
+                'round_no': round_obj.round_no,
+                'round_code': round_obj.round_code,
+                'round_name': round_obj.round_name,
+                'matches': [
+                    {
+                        'id': match.id,
+                        'match_no': match.match_no,
+                        'date': match.date.isoformat(),
+                        'time': match.time.isoformat(),
+                        'venue': match.venue,
+                        'host_team': _team(match.host_team),
+                        'guest_team': _team(match.guest_team),
+                        'winner_team': _team(match.winner_team),
+                        'host_team_final_score': match.host_team_final_score,
+                        'guest_team_final_score': match.guest_team_final_score,
+                        'next_match': next_matches.get(match.id),
+                    }
+                    for match in matches
+                ],
+            }
+            for round_obj, matches in rounds
+        ],
+    }
+
+
+def get_bracket():
+    """
+    Returns the bracket from the cache, building it if a write has happened since it was cached or it expired.
+    """
+    cache = get_aggregate_cache()
+    key = BRACKET_CACHE_KEY % get_generations(cache, [BRACKET_GENERATION])
+    bracket = cache.get(key)
+    if bracket is None:
+        bracket = build_bracket()
+        cache.set(key, bracket)
+    return bracket
@@ -0,0 +1,158 @@
+import copy
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def get_max_bulk_items():
+    return getattr(settings, 'BTMS_BULK_MAX_ITEMS', 1000)
+
+
+def as_pk(value):
+    """
+    Takes a raw payload value, and returns it as an integer primary key or `None` if it is not one.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def preload_related(serializer, items):
+    """
+    Takes a (child) serializer and the raw payload items, and returns `{model: {pk: instance}}` for every primary key
+    referenced through its related fields, loaded with one `in_bulk` query per related model.
+    """
+    preloaded = {}
+    for name, field in serializer.fields.items():
+        if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.read_only:
+            continue
+        pks = {as_pk(item.get(name)) for item in items if isinstance(item, dict)}
+        pks.discard(None)
+        model = field.queryset.model
+        preloaded.setdefault(model, {}).update(field.queryset.in_bulk(pks) if pks else {})
+    return preloaded
+
+
+def _indexed_errors(errors):
+    return [{'index': index, 'errors': item_errors} for index, item_errors in enumerate(errors) if item_errors]
+
+
+class BulkModelMixin:
+    """
+    Accepts a list payload on `POST` (bulk create) and `PATCH` (bulk partial update, every item carries its `id`)
+    against the list route. Items are validated one by one and errors are reported by index; valid payloads are
+    written with `bulk_create` / `bulk_update` in a single transaction.
+    """
+
+    def check_bulk_payload(self, data):
+        if not isinstance(data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if not data:
+            raise ValidationError({'non_field_errors': ['Expected a non empty list of items.']})
+        max_items = get_max_bulk_items()
+        if len(data) > max_items:
+            raise ValidationError({'non_field_errors': ['A bulk request accepts at most %d items.' % max_items]})
+
+    def get_bulk_serializer(self, items, partial=False):
+        """
+        Returns one serializer instance that validates every item in turn, with the related instances referenced by
+        the items preloaded into its context.
+        """
+        serializer = self.get_serializer(partial=partial)
+        serializer.context['preloaded_related'] = preload_related(serializer, items)
+        return serializer
+
+    def validate_items(self, serializer, items, instances):
+        validated_data, errors = [], []
+        for item, instance in zip(items, instances):
+            serializer.instance = instance
+            try:
+                validated_data.append(serializer.run_validation(item))
+                errors.append({})
+            except ValidationError as exc:
+                validated_data.append(None)
+                errors.append(exc.detail)
+        serializer.instance = None
+        return validated_data, errors
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        return self.bulk_create(request)
+
+    def bulk_create(self, request):
+        items = request.data
+        self.check_bulk_payload(items)
+
+        serializer = self.get_bulk_serializer(items)
+        validated_data, errors = self.validate_items(serializer, items, [None] * len(items))
+        if any(errors):
+            return Response({'errors': _indexed_errors(errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = serializer.Meta.model
+        with transaction.atomic():
+            instances = model.objects.bulk_create([model(**data) for data in validated_data])
+            self.perform_bulk_create(instances)
+
+        return Response(self.get_serializer(instances, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_partial_update(self, request, *args, **kwargs):
+        items = request.data
+        self.check_bulk_payload(items)
+
+        ids = [as_pk(item.get('id')) if isinstance(item, dict) else None for item in items]
+        existing = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+
+        id_errors = []
+        seen = set()
+        for pk in ids:
+            if pk is None:
+                id_errors.append({'id': ['This field is required.']})
+            elif pk in seen:
+                id_errors.append({'id': ['Duplicate id %d.' % pk]})
+            elif pk not in existing:
+                id_errors.append({'id': ['Invalid pk "%d" - object does not exist.' % pk]})
+            else:
+                id_errors.append({})
+            seen.add(pk)
+        if any(id_errors):
+            return Response({'errors': _indexed_errors(id_errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_bulk_serializer(items, partial=True)
+        instances = [existing[pk] for pk in ids]
+        validated_data, errors = self.validate_items(serializer, items, instances)
+        if any(errors):
+            return Response({'errors': _indexed_errors(errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        previous_instances = [copy.copy(instance) for instance in instances]
+        fields = set()
+        for instance, data in zip(instances, validated_data):
+            for attr, value in data.items():
+                setattr(instance, attr, value)
+                fields.add(attr)
+        with transaction.atomic():
+            if fields:
+                serializer.Meta.model.objects.bulk_update(instances, sorted(fields))
+            self.perform_bulk_update(instances, previous_instances)
+
+        return Response(self.get_serializer(instances, many=True).data, status=status.HTTP_200_OK)
+
+    def perform_bulk_create(self, instances):
+        """
+        Hook called inside the transaction after a bulk create; `bulk_create` does not send model signals.
+        """
+        pass
+
+    def perform_bulk_update(self, instances, previous_instances):
+        """
+        Hook called inside the transaction after a bulk update with the updated instances and copies taken before
+        the update; `bulk_update` does not send model signals.
+        """
+        pass
@@ -0,0 +1,76 @@
+import hashlib
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .model_versions import get_model_versions
+from .serializers import get_expanded_fields
+
+
+def get_response_models(view):
+    """
+    Takes a view, and returns the models its response is built from: the serializer model plus the related models
+    of any expanded fields.
+    """
+    serializer_class = view.get_serializer_class()
+    model = serializer_class.Meta.model
+    models = [model]
+    expandable_fields = getattr(serializer_class, 'expandable_fields', {})
+    for field in get_expanded_fields(view.request, expandable_fields):
+        models.append(model._meta.get_field(field).related_model)
+    return models
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class ConditionalGetMixin:
+    """
+    Adds a weak `ETag` and `Last-Modified` to list and detail responses, derived from the write versions of the
+    models the response is built from, and answers a matching `If-None-Match` (or, without it, a fresh enough
+    `If-Modified-Since`) with `304 Not Modified` before the queryset is touched.
+    """
+
+    def get_version_models(self):
+        return get_response_models(self)
+
+    def get_conditional_headers(self, request):
+        versions = get_model_versions(self.get_version_models())
+        key = '|'.join([request.get_full_path(), request.accepted_media_type or ''] +
+                       ['%s:%d' % (label, version) for label, (version, _) in sorted(versions.items())])
+        etag = 'W/"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        modified = [modified_at for _, modified_at in versions.values() if modified_at is not None]
+        last_modified = max(modified).timestamp() if modified else None
+        return etag, last_modified
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or _strip_weak(etag) in [_strip_weak(candidate) for candidate in etags]
+
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        return last_modified is not None and if_modified_since is not None and int(last_modified) <= if_modified_since
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        etag, last_modified = self.get_conditional_headers(request)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
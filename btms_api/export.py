@@ -0,0 +1,94 @@
+import csv
+import datetime
+import decimal
+import itertools
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.views import APIView
+
+# Rows fetched per database round trip and sent per chunk
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _chunks(rows, size=EXPORT_CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _json_value(value):
+    # the same representation as the API: decimals as strings, dates and times in ISO 8601
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """
+    File-like object returning what is written, so `csv.writer` produces strings instead of writing them.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for chunk in _chunks(rows):
+            yield ''.join(writer.writerow(row) for row in chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # only error responses are rendered, exports are streamed
+        detail = data.get('detail', data) if isinstance(data, dict) else data
+        return ''.join(self.stream(['detail'], [[detail]])).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        for chunk in _chunks(rows):
+            yield ''.join(json.dumps(dict(zip(columns, map(_json_value, row))), separators=(',', ':')) + '\n'
+                          for row in chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # only error responses are rendered, exports are streamed
+        return (json.dumps(data, separators=(',', ':')) + '\n').encode(self.charset)
+
+
+class ExportView(APIView):
+    """
+    Streams `export_fields` of every row of `get_queryset()` as CSV (the default, or `?format=csv`) or NDJSON
+    (`?format=ndjson`). Rows are read in chunks with `queryset.iterator()` and sent as they are read, so memory stays
+    flat whatever the table size.
+    """
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    export_fields = []
+    export_name = None
+
+    def get_queryset(self):
+        raise NotImplementedError('`get_queryset()` must be implemented.')
+
+    def get(self, request):
+        rows = self.get_queryset().order_by('pk').values_list(*self.export_fields) \
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(renderer.stream(self.export_fields, rows),
+                                         content_type='%s; charset=%s' % (renderer.media_type, renderer.charset))
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (self.export_name, renderer.format)
+        return response
@@ -0,0 +1,105 @@
+"""
+Seeded fake row generators used by the `generate_data` command.
+
+Every chunk is generated from its own RNG derived from `(seed, kind, chunk_index)`, so the output only depends on
+the seed and never on how chunks are spread over worker processes. This module must not import Django so it can be
+loaded by process pool workers.
+"""
+import datetime
+import random
+
+from faker import Faker
+
+# Rows generated per chunk. Fixed, so the dataset does not depend on insert batch size or worker count.
+CHUNK_SIZE = 1000
+
+
+def _chunk_rng(seed, kind, chunk_index):
+    key = '%s:%s:%d' % (seed, kind, chunk_index)
+    fake = Faker()
+    fake.seed_instance(key)
+    return random.Random(key), fake
+
+
+def team_rows(seed, chunk_index, start, count):
+    """
+    Returns `count` `(name, average_score)` tuples.
+    """
+    rng, fake = _chunk_rng(seed, 'team', chunk_index)
+    return [(fake.slug(), round(rng.uniform(100, 200), 2)) for _ in range(count)]
+
+
+def coach_rows(seed, chunk_index, start, count):
+    """
+    Returns `count` coach names.
+    """
+    rng, fake = _chunk_rng(seed, 'coach', chunk_index)
+    return [fake.name() for _ in range(count)]
+
+
+def player_rows(seed, chunk_index, start, count, players_per_team):
+    """
+    Returns player tuples for global player positions `start` to `start + count`: `(team_position, name, position,
+    age, number_of_games_played, penalty_count, height, weight, average_score, is_team_captain)`.
+    The first player of every team is its captain.
+    """
+    rng, fake = _chunk_rng(seed, 'player', chunk_index)
+    rows = []
+    for player_position in range(start, start + count):
+        rows.append((player_position // players_per_team, fake.name(), fake.slug(), rng.randint(10, 80),
+                     rng.randint(0, 4), rng.randint(0, 4), round(rng.uniform(50, 300), 2),
+                     round(rng.uniform(15, 200), 2), round(rng.uniform(100, 200), 2),
+                     player_position % players_per_team == 0))
+    return rows
+
+
+def bracket_rounds(team_count):
+    """
+    Takes a power of two team count, and returns `(round_no, round_code, round_name)` for every knockout round.
+    """
+    named = {2: ('GF', 'Grand Final'), 4: ('SF', 'Semi Finals'), 8: ('QF', 'Quater Finals'),
+             16: ('R16', 'Round of Sixteen')}
+    rounds = []
+    round_no = 1
+    size = team_count
+    while size >= 2:
+        code, name = named.get(size, ('R%d' % size, 'Round of %d' % size))
+        rounds.append((round_no, code, name))
+        round_no += 1
+        size //= 2
+    return rounds
+
+
+def bracket_matches(seed, tournament, team_positions):
+    """
+    Takes a seed, a tournament number and the positions of the teams entering the bracket, shuffles the draw, and
+    returns one list of match tuples per round: `(match_no, date, time, venue, host_position, guest_position,
+    winner_position, host_score, guest_score)`. The winner of each match advances into the next round, played a
+    week later.
+    """
+    rng, fake = _chunk_rng(seed, 'bracket', tournament)
+    # dates are derived from the RNG only; Faker's date/time providers depend on the current time
+    start_date = datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(3 * 365))
+    rounds = []
+    entrants = list(team_positions)
+    rng.shuffle(entrants)
+    match_no = 1
+    while len(entrants) >= 2:
+        matches = []
+        winners = []
+        round_date = start_date + datetime.timedelta(weeks=len(rounds))
+        for host, guest in zip(entrants[0::2], entrants[1::2]):
+            host_score = rng.randint(60, 140)
+            guest_score = rng.randint(60, 140)
+            if host_score == guest_score:
+                # knockout games are decided in overtime
+                guest_score += 1
+            winner = host if host_score > guest_score else guest
+            date = round_date + datetime.timedelta(days=rng.randrange(3))
+            time = datetime.time(hour=rng.randint(9, 21), minute=rng.choice([0, 15, 30, 45]))
+            matches.append((match_no, date, time, fake.city(), host, guest, winner, host_score, guest_score))
+            winners.append(winner)
+            match_no += 1
+        rounds.append(matches)
+        entrants = winners
+    return rounds
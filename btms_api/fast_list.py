@@ -0,0 +1,133 @@
+import decimal
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .serializers import get_field_columns
+
+# Fields whose representation of a `values()` value is the value itself
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+# Fields whose `to_representation` is applied to the `values()` value
+CONVERTED_FIELDS = (serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+                    serializers.ChoiceField)
+
+_converters = {}
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def _decimal_to_representation(field):
+    """
+    Returns `field.to_representation` for `Decimal` values with the quantize exponent and context computed once,
+    instead of on every call. Fields not rendered as plain strings keep their own method.
+    """
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def to_representation(value):
+        return format(value.quantize(exponent, rounding=rounding, context=context), 'f')
+
+    return to_representation
+
+
+def _to_representation(field):
+    # None when the values() value is already the representation
+    if isinstance(field, PLAIN_FIELDS) or (isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None):
+        return None
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_to_representation(field)
+    if isinstance(field, CONVERTED_FIELDS):
+        return field.to_representation
+    raise UnsupportedField(field)
+
+
+class RowConverter:
+    """
+    Builds the representation of a serializer from `values()` rows of its model: a dict per row with the serializer
+    fields in order, converted with the fields' own `to_representation` where the value is not already a JSON type.
+    `None` stays `None`, as the serializer leaves it. Only the output of the serializer is reproduced; the model
+    instances, field lookups and ordered dicts it builds on the way are skipped.
+    """
+
+    def __init__(self, fields):
+        self.fields = [(name, column) for name, column, _ in fields]
+        self.columns = [column for _, column, _ in fields]
+        self.conversions = [(name, convert) for name, _, convert in fields if convert is not None]
+
+    def __call__(self, rows):
+        fields, conversions = self.fields, self.conversions
+        data = []
+        for row in rows:
+            item = {name: row[column] for name, column in fields}
+            for name, convert in conversions:
+                value = item[name]
+                if value is not None:
+                    item[name] = convert(value)
+            data.append(item)
+        return data
+
+
+def get_row_converter(serializer):
+    """
+    Takes a serializer, and returns the `RowConverter` of its readable fields, or None when one of them cannot be
+    built from a column value (an expanded relation, a method or a related attribute).
+    """
+    field_columns = get_field_columns(serializer)
+    if field_columns is None:
+        return None
+
+    # an expanded field keeps its name but not its class
+    key = (type(serializer), tuple((name, type(serializer.fields[name])) for name in field_columns))
+    converter = _converters.get(key)
+    if converter is None:
+        try:
+            converter = RowConverter([(name, model_field.name, _to_representation(serializer.fields[name]))
+                                      for name, model_field in field_columns.items()])
+        except UnsupportedField:
+            return None
+        _converters[key] = converter
+    return converter
+
+
+class FastListMixin:
+    """
+    Serves list reads from `values()` rows through a `RowConverter`, with the same JSON as the serializer, unless
+    `BTMS_FAST_LIST` is off or the serializer cannot be reproduced (for instance with `?expand=`). List it after the
+    mixins wrapping `list()`, so cached and conditional responses are unchanged.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'BTMS_FAST_LIST', True):
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        converter = get_row_converter(serializer)
+        if converter is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # keyset pagination reads its cursors from the ordering fields, selected or not
+        get_orderings = getattr(self.paginator, 'get_orderings', None)
+        orderings = get_orderings(self).values() if get_orderings else []
+        ordering_columns = {name.lstrip('-') for ordering in orderings for name in ordering}
+        rows = queryset.values(*converter.columns, *sorted(ordering_columns - set(converter.columns)))
+        page = self.paginate_queryset(rows)
+
+        if hasattr(self, 'start_serialize'):
+            self.start_serialize()
+        if page is None:
+            return Response(converter(rows))
+        return self.get_paginated_response(converter(page))
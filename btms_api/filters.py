@@ -0,0 +1,153 @@
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import models
+from rest_framework.exceptions import ValidationError
+
+from .models import Player, Match
+
+EQUALITY = ('exact', 'in')
+RANGE = EQUALITY + ('gt', 'gte', 'lt', 'lte', 'range')
+# Values accepted by one `__in` filter, so a query string cannot grow the IN list without bound
+MAX_IN_VALUES = 100
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+_filtersets = []
+
+
+def get_indexed_fields(model):
+    """
+    Takes a model, and returns the names of its fields that lead an index: the fields of `db_index`, unique and
+    primary key columns (foreign keys included), the first field of every index in `Meta.indexes`, and the fields
+    in the condition of partial indexes.
+    """
+    opts = model._meta
+    indexed = {field.name for field in opts.concrete_fields if field.db_index or field.unique}
+    for index in opts.indexes:
+        if index.condition is not None:
+            indexed.update(child[0].split('__')[0] for child in index.condition.children if isinstance(child, tuple))
+        elif index.fields:
+            indexed.add(index.fields[0].lstrip('-'))
+    indexed.update(fields[0] for fields in opts.unique_together)
+    return indexed
+
+
+class FilterSet:
+    """
+    Declarative filters of a model read from query params. `filters` maps a field name to its lookups: `exact` is
+    written `?position=guard`, the others as in Django (`?age__gte=20`, `?position__in=guard,center`,
+    `?date__range=2022-01-01,2022-03-31`). Filters combine with AND. Every declared field must lead an index, which
+    `check_filter_indexes` verifies, so whichever filter the database picks to drive a combination, it seeks an
+    index instead of scanning the table. Query params naming another field of the model, or a lookup that is not
+    declared, are rejected; `__in` lists are capped at `MAX_IN_VALUES`.
+    """
+    model = None
+    filters = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _filtersets.append(cls)
+
+    def __init__(self, query_params):
+        self.query_params = query_params
+
+    def parse_value(self, field, value):
+        if isinstance(field, models.BooleanField):
+            if value.lower() not in BOOLEAN_VALUES:
+                raise DjangoValidationError('Must be true or false.')
+            return BOOLEAN_VALUES[value.lower()]
+        return field.to_python(value)
+
+    def parse(self, field, lookup, value):
+        if lookup not in ('in', 'range'):
+            return self.parse_value(field, value)
+
+        values = [item.strip() for item in value.split(',') if item.strip()]
+        if lookup == 'range' and len(values) != 2:
+            raise DjangoValidationError('Give the lower and upper bounds separated by a comma.')
+        if lookup == 'in' and len(values) > MAX_IN_VALUES:
+            raise DjangoValidationError('Give at most %d values.' % MAX_IN_VALUES)
+        return [self.parse_value(field, item) for item in values]
+
+    def get_lookups(self):
+        """
+        Returns the `filter()` keyword arguments for the query params, raising `ValidationError` with a message per
+        query param in error. Empty values are ignored.
+        """
+        lookups, errors = {}, {}
+        for param, value in self.query_params.items():
+            name, _, lookup = param.partition('__')
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # not a filter: ordering, pagination, fields, ...
+                continue
+
+            if name not in self.filters:
+                errors[param] = 'Cannot filter on %s. Filters are: %s' % (name, ', '.join(self.filters))
+            elif (lookup or 'exact') not in self.filters[name]:
+                errors[param] = '%s cannot be filtered with __%s. Lookups are: %s' % (
+                    name, lookup, ', '.join(self.filters[name]))
+            elif value.strip():
+                try:
+                    lookups['%s__%s' % (name, lookup or 'exact')] = self.parse(field, lookup, value.strip())
+                except DjangoValidationError as exc:
+                    errors[param] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return lookups
+
+    def filter_queryset(self, queryset):
+        lookups = self.get_lookups()
+        return queryset.filter(**lookups) if lookups else queryset
+
+
+class PlayerFilterSet(FilterSet):
+    model = Player
+    filters = {
+        'team': EQUALITY,
+        'position': EQUALITY,
+        'is_team_captain': ('exact',),
+        'age': RANGE,
+        'number_of_games_played': RANGE,
+        'penalty_count': RANGE,
+        'average_score': RANGE,
+    }
+
+    def parse_value(self, field, value):
+        value = super().parse_value(field, value)
+        # only the captains are in the partial index of is_team_captain, the other players would scan the table
+        if field.name == 'is_team_captain' and not value:
+            raise DjangoValidationError('Only true is supported: filter the captains.')
+        return value
+
+
+class MatchFilterSet(FilterSet):
+    model = Match
+    filters = {
+        'round': EQUALITY,
+        'date': RANGE,
+        'venue': EQUALITY,
+        'host_team': EQUALITY,
+        'guest_team': EQUALITY,
+        'winner_team': EQUALITY,
+    }
+
+
+def check_filter_indexes(app_configs=None, **kwargs):
+    """
+    System check failing for every declared filter whose field does not lead an index of its model.
+    """
+    errors = []
+    for filterset in _filtersets:
+        indexed = get_indexed_fields(filterset.model)
+        for name in filterset.filters:
+            if name not in indexed:
+                errors.append(checks.Error(
+                    '%s filters on %s.%s, which does not lead an index.' % (
+                        filterset.__name__, filterset.model.__name__, name),
+                    hint='Add an index starting with %s to %s.Meta.indexes.' % (name, filterset.model.__name__),
+                    obj=filterset,
+                    id='btms_api.E001',
+                ))
+    return errors
@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GENERATION_KEY = 'btms_api:generation:%s'
+
+
+def _new_generation():
+    # a fresh, never reused value: an evicted generation must not fall back to one that was used before
+    return time.time_ns()
+
+
+def get_aggregate_cache():
+    """
+    Returns the Django cache holding the bracket, statistics and leaderboards built from the tables, selected with the
+    `BTMS_AGGREGATE_CACHE_ALIAS` setting. Entries are stored with the default timeout of the cache, which bounds their
+    staleness on workers whose cache missed a write.
+    """
+    return caches[getattr(settings, 'BTMS_AGGREGATE_CACHE_ALIAS', 'default')]
+
+
+def get_generations(cache, names):
+    """
+    Takes a Django cache and generation names, and returns their current generations as a tuple in the same order.
+    """
+    keys = [GENERATION_KEY % name for name in names]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_generation(), None)
+        found.update(cache.get_many(missing))
+    return tuple(found.get(key) for key in keys)
+
+
+def bump_generation(cache, name):
+    """
+    Moves a generation forward, so every cache entry keyed with the previous one is no longer reachable.
+    """
+    key = GENERATION_KEY % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_generation(), None)
+
+
+def bump_generation_on_write(cache, name):
+    """
+    Bumps a generation now and again once the current transaction commits, so an entry rebuilt from pre-commit data
+    in between is not served afterwards.
+    """
+    bump_generation(cache, name)
+    transaction.on_commit(lambda: bump_generation(cache, name))
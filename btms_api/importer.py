@@ -0,0 +1,268 @@
+import csv
+import io
+import itertools
+import json
+import os
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import standings
+from .bulk import as_pk
+from .live import publish_scores, score_changed
+from .models import Team, Round
+from .serializers import PlayerSerializer, MatchSerializer
+
+# Rows validated and written per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Row errors listed in an import endpoint response, the counts cover every row
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def detect_format(name, content_type=None):
+    """
+    Takes a file name and optional content type, and returns `'csv'` or `'ndjson'`, `'csv'` when unknown.
+    """
+    data_format = IMPORT_FORMATS.get(os.path.splitext(name or '')[1].lower())
+    if data_format is None and content_type in ('application/x-ndjson', 'application/jsonl'):
+        data_format = 'ndjson'
+    return data_format or 'csv'
+
+
+def parse_rows(stream, data_format):
+    """
+    Takes a text stream and `'csv'` or `'ndjson'`, and lazily yields `(row_number, data)` for every record, numbered
+    from 1. `data` is a dict, or the parse error of an NDJSON line.
+    """
+    if data_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), 1):
+            # values beyond the header are collected under the `None` key
+            row.pop(None, None)
+            yield row_number, row
+        return
+
+    row_number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as exc:
+            yield row_number, exc
+
+
+class ReferenceMap:
+    """
+    In-memory map resolving the references used in import files, either a primary key or the natural key in
+    `key_field` (a team name, a round code), to a primary key. Loaded with one query, so rows never query to resolve
+    their references.
+    """
+
+    def __init__(self, model, key_field):
+        self.model = model
+        self.key_field = key_field
+        self.pks = set()
+        self.keys = {}
+        for pk, key in model.objects.values_list('pk', key_field).iterator():
+            self.pks.add(pk)
+            # a key shared by several rows is ambiguous
+            self.keys[str(key)] = None if str(key) in self.keys else pk
+
+    def resolve(self, value):
+        pk = as_pk(value)
+        if pk is not None and pk in self.pks:
+            return pk
+        key = str(value)
+        if key in self.keys:
+            if self.keys[key] is None:
+                raise ValidationError('Ambiguous reference "%s", more than one %s has this %s; use its id.'
+                                      % (value, self.model._meta.verbose_name, self.key_field))
+            return self.keys[key]
+        raise ValidationError('Invalid reference "%s" - object does not exist.' % value)
+
+
+class BatchResult:
+
+    def __init__(self, rows, created, updated, errors):
+        self.rows = rows
+        self.created = created
+        self.updated = updated
+        self.errors = errors
+
+
+class Importer:
+    """
+    Validates rows with the API serializer and upserts them in batches: rows with the `id` of an existing object
+    update it with `bulk_update`, the others are inserted with `bulk_create` (keeping their `id` when given, so
+    re-importing an export is idempotent). Every batch is written in its own transaction; invalid rows are reported
+    and skipped.
+    """
+    serializer_class = None
+    # field name -> (model, natural key field)
+    references = {}
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.model = self.serializer_class.Meta.model
+        self.serializer = self.serializer_class(context={'preloaded_related': {}})
+        self.fields = [name for name, field in self.serializer.fields.items() if not field.read_only]
+        self.reference_maps = {field: ReferenceMap(model, key_field)
+                               for field, (model, key_field) in self.references.items()}
+
+    def import_rows(self, rows):
+        """
+        Takes `(row_number, data)` pairs, and lazily imports them, yielding a `BatchResult` after every committed
+        batch.
+        """
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield self.import_batch(batch)
+
+    def resolve_references(self, data, preloaded):
+        errors = {}
+        for field, reference_map in self.reference_maps.items():
+            value = data.get(field)
+            if value is None or value == '':
+                continue
+            try:
+                pk = reference_map.resolve(value)
+            except ValidationError as exc:
+                errors[field] = exc.detail
+                data.pop(field)
+                continue
+            data[field] = pk
+            model_preloaded = preloaded.setdefault(reference_map.model, {})
+            if pk not in model_preloaded:
+                # a stub is enough, the reference map already proved the row exists
+                model_preloaded[pk] = reference_map.model(pk=pk)
+        return errors
+
+    def validate(self, batch):
+        """
+        Returns `[(row_number, pk, validated_data)]` for the valid rows and `[{'row', 'errors'}]` for the others.
+        """
+        preloaded = self.serializer.context['preloaded_related'] = {}
+        valid, errors, seen = [], [], set()
+        for row_number, data in batch:
+            if not isinstance(data, dict):
+                errors.append({'row': row_number, 'errors': {'non_field_errors': [
+                    'Invalid JSON: %s' % data if isinstance(data, ValueError) else 'Expected an object.']}})
+                continue
+
+            data = dict(data)
+            raw_pk = data.pop('id', None)
+            row_errors = {}
+            pk = None
+            if raw_pk is not None and raw_pk != '':
+                pk = as_pk(raw_pk)
+                if pk is None:
+                    row_errors['id'] = ['A valid integer is required.']
+                elif pk in seen:
+                    row_errors['id'] = ['Duplicate id %d.' % pk]
+                seen.add(pk)
+
+            reference_errors = self.resolve_references(data, preloaded)
+            try:
+                validated_data = self.serializer.run_validation(data)
+            except ValidationError as exc:
+                row_errors = {**exc.detail, **row_errors}
+            row_errors.update(reference_errors)
+
+            if row_errors:
+                errors.append({'row': row_number, 'errors': row_errors})
+            else:
+                valid.append((row_number, pk, validated_data))
+        return valid, errors
+
+    def import_batch(self, batch):
+        valid, errors = self.validate(batch)
+        existing = self.model.objects.in_bulk([pk for _, pk, _ in valid if pk is not None])
+
+        created, updated = [], []
+        for _, pk, validated_data in valid:
+            instance = self.model(pk=pk, **validated_data)
+            (updated if pk in existing else created).append(instance)
+
+        with transaction.atomic():
+            if created:
+                self.model.objects.bulk_create(created)
+            if updated:
+                self.model.objects.bulk_update(updated, self.fields)
+            self.after_batch(created, updated, [existing[instance.pk] for instance in updated])
+        return BatchResult(len(batch), len(created), len(updated), errors)
+
+    def after_batch(self, created, updated, previous):
+        """
+        Hook called inside the batch transaction, with the instances updated and their previous state.
+        """
+        pass
+
+
+class PlayerImporter(Importer):
+    serializer_class = PlayerSerializer
+    references = {'team': (Team, 'name')}
+
+
+class MatchImporter(Importer):
+    serializer_class = MatchSerializer
+    references = {
+        'round': (Round, 'round_code'),
+        'host_team': (Team, 'name'),
+        'guest_team': (Team, 'name'),
+        'winner_team': (Team, 'name'),
+    }
+
+    def after_batch(self, created, updated, previous):
+        # bulk writes bypass MatchViewSet, keep the standings in step
+        standings.update_standings(added=created + updated, removed=previous)
+        publish_scores(created + [match for match, before in zip(updated, previous) if score_changed(before, match)])
+
+
+IMPORTERS = {
+    'players': PlayerImporter,
+    'matches': MatchImporter,
+}
+
+
+class ImportView(APIView):
+    """
+    Imports the CSV or NDJSON file uploaded as the `file` field of a multipart `POST` with `importer_class`. The
+    format follows the file extension (`.csv`, `.ndjson`, `.jsonl`); the upload is parsed as it is read, batch by
+    batch. Responds with the row counts and the first `IMPORT_MAX_REPORTED_ERRORS` row errors.
+    """
+    parser_classes = [MultiPartParser]
+    importer_class = None
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+
+        stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        rows = parse_rows(stream, detect_format(upload.name, upload.content_type))
+        summary = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+        try:
+            for result in self.importer_class().import_rows(rows):
+                summary['rows'] += result.rows
+                summary['created'] += result.created
+                summary['updated'] += result.updated
+                summary['failed'] += len(result.errors)
+                summary['errors'].extend(result.errors[:IMPORT_MAX_REPORTED_ERRORS - len(summary['errors'])])
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # the batches before the unreadable part are already committed
+            summary['errors'].append({'row': summary['rows'] + 1, 'errors': {'file': ['Unreadable file: %s' % exc]}})
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+        return Response(summary)
@@ -0,0 +1,96 @@
+from django.db import connections, router
+
+from .generations import bump_generation_on_write, get_generations, get_aggregate_cache
+from .models import Team, Player
+
+LEADERBOARDS_CACHE_KEY = 'btms_api:leaderboards:%d:%d'
+LEADERBOARDS_GENERATION = 'leaderboards'
+
+# Leaderboards by player field, best first; the player id breaks ties
+LEADERBOARDS = {
+    'average_score': ('-average_score', 'id'),
+    'penalty_count': ('penalty_count', 'id'),
+    'number_of_games_played': ('-number_of_games_played', 'id'),
+}
+DEFAULT_LEADERBOARD_LIMIT = 10
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def invalidate_leaderboards(**kwargs):
+    """
+    Moves the cached leaderboards to a new generation. Connected to Team and Player writes.
+    """
+    bump_generation_on_write(get_aggregate_cache(), LEADERBOARDS_GENERATION)
+
+
+def _order_by(ordering, alias, quote_name):
+    columns = [(name.lstrip('-'), 'DESC' if name.startswith('-') else 'ASC') for name in ordering]
+    return ', '.join('%s%s %s' % (alias, quote_name(Player._meta.get_field(name).column), direction)
+                     for name, direction in columns)
+
+
+def load_ranked_players(limit):
+    """
+    Returns `(board, id, name, position, team id, team name, value, team rank, overall rank)` rows for the top `limit`
+    players of every team in every leaderboard, from one query. Going through the teams, the top players of each
+    team are read from the `(team, <board>)` index, then ranked in their team and overall by `ROW_NUMBER()` windows.
+    Ranking these candidates only is enough, as the overall top players are among the top players of their team.
+    """
+    connection = connections[router.db_for_read(Player)]
+    quote_name = connection.ops.quote_name
+    player, team = quote_name(Player._meta.db_table), quote_name(Team._meta.db_table)
+    team_id = quote_name(Player._meta.get_field('team').column)
+    columns = ', '.join('p.%s' % quote_name(Player._meta.get_field(name).column) for name in ['id', 'name', 'position'])
+
+    boards = []
+    for board, ordering in LEADERBOARDS.items():
+        boards.append(
+            'SELECT %%s, %s, p.%s, t.%s, p.%s, ROW_NUMBER() OVER (PARTITION BY p.%s ORDER BY %s), '
+            'ROW_NUMBER() OVER (ORDER BY %s) FROM %s t INNER JOIN %s p ON p.id IN '
+            '(SELECT id FROM %s WHERE %s = t.id ORDER BY %s LIMIT %%s)' % (
+                columns, team_id, quote_name(Team._meta.get_field('name').column),
+                quote_name(Player._meta.get_field(board).column), team_id, _order_by(ordering, 'p.', quote_name),
+                _order_by(ordering, 'p.', quote_name), team, player, player, team_id,
+                _order_by(ordering, '', quote_name)))
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(boards), [value for board in LEADERBOARDS for value in (board, limit)])
+        return cursor.fetchall()
+
+
+def _entry(board, player_id, name, position, team_id, value, rank):
+    return {'rank': rank, 'id': player_id, 'name': name, 'position': position, 'team': team_id, board: value}
+
+
+def build_leaderboards(limit):
+    """
+    Returns the top `limit` players of every leaderboard: `overall`, by board, and `teams`, a list of the boards of
+    every team with players, by team id.
+    """
+    overall = {board: [] for board in LEADERBOARDS}
+    teams = {}
+    for board, player_id, name, position, team_id, team_name, value, team_rank, overall_rank \
+            in load_ranked_players(limit):
+        if overall_rank <= limit:
+            overall[board].append(_entry(board, player_id, name, position, team_id, value, overall_rank))
+        if team_id not in teams:
+            teams[team_id] = dict({'team': team_id, 'name': team_name}, **{field: [] for field in LEADERBOARDS})
+        teams[team_id][board].append(_entry(board, player_id, name, position, team_id, value, team_rank))
+
+    for boards in [overall] + list(teams.values()):
+        for board in LEADERBOARDS:
+            boards[board].sort(key=lambda entry: entry['rank'])
+    return {'limit': limit, 'overall': overall, 'teams': [teams[team_id] for team_id in sorted(teams)]}
+
+
+def get_leaderboards(limit=DEFAULT_LEADERBOARD_LIMIT):
+    """
+    Returns the leaderboards of `limit` players from the cache, building them if a write has happened since they
+    were cached or they expired.
+    """
+    cache = get_aggregate_cache()
+    key = LEADERBOARDS_CACHE_KEY % (get_generations(cache, [LEADERBOARDS_GENERATION]) + (limit,))
+    leaderboards = cache.get(key)
+    if leaderboards is None:
+        leaderboards = build_leaderboards(limit)
+        cache.set(key, leaderboards)
+    return leaderboards
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import AuthenticationFailed
+
+from .async_views import run_in_db_executor
+from .authentication import CachedTokenAuthentication
+from .bulk import as_pk
+from .models import Match
+
+logger = logging.getLogger(__name__)
+
+LIVE_PATH = '/btms_api/live/'
+# Messages held for a connection that reads slower than scores change; the oldest are dropped first
+LIVE_QUEUE_SIZE = 32
+# Comment lines sent to idle connections, so proxies do not time them out
+LIVE_HEARTBEAT_SECONDS = 15
+# Data relayed by the broker to a worker that is not reading it, before the worker is dropped
+BROKER_MAX_BUFFER = 4 * 1024 * 1024
+BROKER_RECONNECT_SECONDS = 1
+
+_broadcaster = None
+_broker_client = None
+_live_lock = threading.Lock()
+
+
+def match_channel(match_id):
+    return 'match:%d' % match_id
+
+
+def round_channel(round_id):
+    return 'round:%d' % round_id
+
+
+def score_message(match):
+    """
+    Takes a match, and returns its score as an encoded SSE `score` event, ready to be written to every connection.
+    """
+    data = {
+        'match': match.id,
+        'round': match.round_id,
+        'host_team': match.host_team_id,
+        'guest_team': match.guest_team_id,
+        'host_team_final_score': match.host_team_final_score,
+        'guest_team_final_score': match.guest_team_final_score,
+        'winner_team': match.winner_team_id,
+    }
+    return ('event: score\ndata: %s\n\n' % json.dumps(data, separators=(',', ':'))).encode('utf-8')
+
+
+def score_changed(previous, match):
+    return (previous.host_team_final_score, previous.guest_team_final_score, previous.winner_team_id) != \
+        (match.host_team_final_score, match.guest_team_final_score, match.winner_team_id)
+
+
+class Subscription:
+    """
+    The queue of messages of one connection, living on the event loop serving it.
+    """
+
+    def __init__(self, channels, loop, max_size):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(max_size)
+
+    def put(self, message):
+        # called on self.loop; a connection that falls behind gets the latest scores
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+def _deliver(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class Broadcaster:
+    """
+    In-process pub/sub of encoded messages by channel. Publishing is thread safe and costs one callback per event
+    loop holding subscribers, whatever their number; the message bytes are shared by every connection.
+    """
+
+    def __init__(self, queue_size=LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """
+        Subscribes the running event loop to `channels`, and returns the `Subscription` to read messages from.
+        """
+        subscription = Subscription(channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for channel in channels:
+                self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._channels.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._channels[channel]
+
+    def publish(self, channels, message):
+        """
+        Sends `message` once to every subscription of any of `channels`, and returns the number of subscriptions.
+        """
+        by_loop = defaultdict(set)
+        with self._lock:
+            for channel in channels:
+                for subscription in self._channels.get(channel, ()):
+                    by_loop[subscription.loop].add(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, subscriptions, message)
+            except RuntimeError:
+                # the loop was closed under its subscriptions
+                pass
+        return sum(len(subscriptions) for subscriptions in by_loop.values())
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class BrokerClient:
+    """
+    Connection of this worker to the live broker (`python manage.py live_broker`). Messages are published to the
+    broker, which relays them to every worker, this one included; a listener thread feeds what the broker relays
+    into the local broadcaster. While the broker is unreachable messages are published locally only.
+    """
+
+    def __init__(self, address, broadcaster):
+        self.address = _parse_address(address)
+        self.broadcaster = broadcaster
+        self._socket = None
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._listener = threading.Thread(target=self._listen, name='btms-live-broker', daemon=True)
+        self._listener.start()
+
+    def publish(self, channels, message):
+        line = (json.dumps({'channels': channels, 'message': message.decode('utf-8')}) + '\n').encode('utf-8')
+        with self._send_lock:
+            if self._socket is not None:
+                try:
+                    self._socket.sendall(line)
+                    return
+                except OSError:
+                    self._close()
+        self.broadcaster.publish(channels, message)
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            self._connected.clear()
+
+    def _listen(self):
+        while True:
+            try:
+                connection = socket.create_connection(self.address)
+            except OSError:
+                time.sleep(BROKER_RECONNECT_SECONDS)
+                continue
+            try:
+                lines = connection.makefile('rb')
+                # the broker greets a worker with an empty line once it relays to it
+                if lines.readline() == b'\n':
+                    with self._send_lock:
+                        self._socket = connection
+                        self._connected.set()
+                for line in lines:
+                    relayed = json.loads(line)
+                    self.broadcaster.publish(relayed['channels'], relayed['message'].encode('utf-8'))
+            except (OSError, ValueError):
+                logger.warning('Lost the live broker connection at %s:%d', *self.address)
+            with self._send_lock:
+                if self._socket is connection:
+                    self._close()
+                else:
+                    connection.close()
+            time.sleep(BROKER_RECONNECT_SECONDS)
+
+
+async def serve_broker(host, port, started=None):
+    """
+    Runs the live broker: every line a worker sends is relayed to every connected worker, each greeted with an
+    empty line once it is relayed to. A worker that does not read what is relayed to it is dropped once
+    `BROKER_MAX_BUFFER` bytes are pending. Calls `started(server)` once listening.
+    """
+    workers = set()
+
+    async def handle(reader, writer):
+        workers.add(writer)
+        writer.write(b'\n')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for worker in list(workers):
+                    if worker.transport.get_write_buffer_size() > BROKER_MAX_BUFFER:
+                        workers.discard(worker)
+                        worker.close()
+                    else:
+                        worker.write(line)
+        except (ConnectionError, asyncio.CancelledError):
+            # a worker going away, or the broker shutting down
+            pass
+        finally:
+            workers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if started is not None:
+        started(server)
+    async with server:
+        await server.serve_forever()
+
+
+def get_broadcaster():
+    """
+    Returns the broadcaster of this process, connected to `BTMS_LIVE_BROKER` when it is set.
+    """
+    global _broadcaster, _broker_client
+    if _broadcaster is None:
+        with _live_lock:
+            if _broadcaster is None:
+                broadcaster = Broadcaster()
+                broker = getattr(settings, 'BTMS_LIVE_BROKER', None)
+                _broker_client = BrokerClient(broker, broadcaster) if broker else None
+                _broadcaster = broadcaster
+    return _broadcaster
+
+
+def publish(channels, message):
+    get_broadcaster()
+    if _broker_client is not None:
+        _broker_client.publish(channels, message)
+    else:
+        _broadcaster.publish(channels, message)
+
+
+def publish_scores(matches):
+    """
+    Publishes the scores of saved matches on their match and round channels once the transaction commits. Each
+    message is encoded here, once, whatever the number of connections. Matches bulk created on a database that
+    does not return their ids are skipped.
+    """
+    messages = [([match_channel(match.id), round_channel(match.round_id)], score_message(match))
+                for match in matches if match.pk is not None]
+    if messages:
+        transaction.on_commit(lambda: [publish(channels, message) for channels, message in messages])
+
+
+def _authenticate(key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+def _current_scores(match_ids, round_ids):
+    matches = Match.objects.filter(Q(id__in=match_ids) | Q(round__in=round_ids)).order_by('id')
+    return [score_message(match) for match in matches]
+
+
+def _ids(values):
+    ids = [as_pk(value.strip()) for value in ','.join(values).split(',') if value.strip()]
+    if None in ids:
+        raise ValueError
+    return ids
+
+
+class LiveScoresApplication:
+    """
+    ASGI application streaming score changes as Server-Sent Events at `LIVE_PATH` (`?match=1,2` and/or
+    `?round=3`), and passing every other request to the Django application. Streams are served here because
+    Django 4.0 cannot stream a response asynchronously. Clients authenticate with their token, in the
+    `Authorization` header or, for `EventSource`, a `token` query param. Each stream starts with the current scores
+    of the matches subscribed to.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == LIVE_PATH:
+            await self.stream(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
+
+    async def respond(self, send, status_code, detail, headers=()):
+        body = json.dumps({'detail': detail}).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status_code,
+                    'headers': [(b'content-type', b'application/json')] + list(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, 'Method "%s" not allowed.' % scope['method'], [(b'allow', b'GET')])
+
+        query = parse_qs(scope['query_string'].decode('latin1'))
+        try:
+            match_ids, round_ids = _ids(query.get('match', [])), _ids(query.get('round', []))
+        except ValueError:
+            return await self.respond(send, 400, 'match and round take comma separated ids.')
+        if not match_ids and not round_ids:
+            return await self.respond(send, 400, 'Subscribe to at least one match or round.')
+
+        headers = dict(scope['headers'])
+        scheme, _, key = headers.get(b'authorization', b'').decode('latin1').partition(' ')
+        key = key.strip() if scheme.lower() == 'token' else (query.get('token') or [''])[0]
+        user = await run_in_db_executor(_authenticate, key) if key else None
+        if user is None or not user.is_active:
+            return await self.respond(send, 401, 'Invalid or missing token.', [(b'www-authenticate', b'Token')])
+
+        channels = [match_channel(pk) for pk in match_ids] + [round_channel(pk) for pk in round_ids]
+        subscription = get_broadcaster().subscribe(channels)
+        try:
+            current = await run_in_db_executor(_current_scores, match_ids, round_ids)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')]})
+            await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n' + b''.join(current),
+                        'more_body': True})
+            pump = asyncio.ensure_future(self.pump(subscription, send))
+            try:
+                while (await receive())['type'] != 'http.disconnect':
+                    pass
+            finally:
+                pump.cancel()
+        finally:
+            get_broadcaster().unsubscribe(subscription)
+
+    async def pump(self, subscription, send):
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                message = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': message, 'more_body': True})
@@ -0,0 +1,344 @@
+import asyncio
+import datetime
+import json
+import os
+import re
+import subprocess
+import tempfile
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import get_resolver, resolve
+from rest_framework.authtoken.models import Token
+
+from btms_api.authentication import get_token_cache
+from btms_api.benchmark import temporary_database, wsgi_request, asgi_request, run_load, run_async_load, \
+    summarize
+from btms_api.models import Team, Coach, Player, Round, Match, User, TeamStanding
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+SERVER_TIMING_QUERIES = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+
+
+def _resolve(value, index):
+    return value(index) if callable(value) else value
+
+
+def _upload(name, body, changes):
+    """
+    Returns a multipart body uploading a CSV file of `body` rows, one per dict of `changes`.
+    """
+    rows = [list(body)] + [list(dict(body, **row_changes).values()) for row_changes in changes]
+    content = ''.join(','.join(str(value) for value in row) + '\n' for row in rows)
+    return encode_multipart(BOUNDARY, {'file': SimpleUploadedFile(name, content.encode('utf-8'))})
+
+
+def _court_events(court_match, index):
+    # ten events of one match, numbered by the request index so every request records new ones
+    _, team, player = court_match
+    return [{'sequence': index * 10 + n, 'kind': 'foul' if n == 9 else 'basket', 'team': team, 'player': player,
+             'points': 0 if n == 9 else 2} for n in range(10)]
+
+
+def _endpoints(fixtures):
+    """
+    Takes the dataset fixtures, and returns one dict per benchmarked request: `name`, `method`, `path` and
+    optionally `body`, `content_type` and `token`. Values may be callables taking the request index, for requests
+    that must differ on every call. Reads come first so writes do not change the data they measure.
+    """
+    f = fixtures
+    player_body = {'name': 'Bench Player', 'position': 'guard', 'age': 25, 'number_of_games_played': 2,
+                   'penalty_count': 0, 'height': 190, 'weight': 90, 'average_score': 150, 'is_team_captain': False,
+                   'team': f['team']}
+    match_body = {'match_no': 1, 'date': '2022-01-01', 'time': '12:00', 'venue': 'Bench Arena', 'round': f['round'],
+                  'host_team': f['team'], 'guest_team': f['other_team'], 'winner_team': f['team'],
+                  'host_team_final_score': 90, 'guest_team_final_score': 80}
+    return [
+        {'name': 'api root', 'method': 'GET', 'path': '/btms_api/'},
+        {'name': 'teams list', 'method': 'GET', 'path': '/btms_api/teams/'},
+        {'name': 'teams detail', 'method': 'GET', 'path': '/btms_api/teams/%d/' % f['team']},
+        {'name': 'coaches list', 'method': 'GET', 'path': '/btms_api/coaches/'},
+        {'name': 'coaches list expand', 'method': 'GET', 'path': '/btms_api/coaches/?expand=team'},
+        {'name': 'coaches detail', 'method': 'GET', 'path': '/btms_api/coaches/%d/' % f['coach']},
+        {'name': 'players list', 'method': 'GET', 'path': '/btms_api/players/'},
+        {'name': 'players list team', 'method': 'GET', 'path': '/btms_api/players/?team=%d' % f['team']},
+        {'name': 'players list team percentile', 'method': 'GET',
+         'path': '/btms_api/players/?team=%d&percentile=90' % f['team']},
+        {'name': 'players list percentile', 'method': 'GET', 'path': '/btms_api/players/?percentile=90'},
+        {'name': 'players list ordering', 'method': 'GET', 'path': '/btms_api/players/?ordering=-average_score'},
+        {'name': 'players list expand', 'method': 'GET', 'path': '/btms_api/players/?expand=team'},
+        {'name': 'players detail', 'method': 'GET', 'path': '/btms_api/players/%d/' % f['player']},
+        {'name': 'rounds list', 'method': 'GET', 'path': '/btms_api/rounds/'},
+        {'name': 'rounds detail', 'method': 'GET', 'path': '/btms_api/rounds/%d/' % f['round']},
+        {'name': 'matches list', 'method': 'GET', 'path': '/btms_api/matches/'},
+        {'name': 'matches list round', 'method': 'GET', 'path': '/btms_api/matches/?round=%d' % f['round']},
+        {'name': 'matches list ordering', 'method': 'GET', 'path': '/btms_api/matches/?ordering=date'},
+        {'name': 'matches list expand', 'method': 'GET',
+         'path': '/btms_api/matches/?expand=round,host_team,guest_team,winner_team'},
+        {'name': 'matches detail', 'method': 'GET', 'path': '/btms_api/matches/%d/' % f['match']},
+        {'name': 'users list', 'method': 'GET', 'path': '/btms_api/users/'},
+        {'name': 'users detail', 'method': 'GET', 'path': '/btms_api/users/%d/' % f['user']},
+        {'name': 'standings list', 'method': 'GET', 'path': '/btms_api/standings/'},
+        {'name': 'standings detail', 'method': 'GET', 'path': '/btms_api/standings/%d/' % f['standing']},
+        {'name': 'bracket', 'method': 'GET', 'path': '/btms_api/bracket/'},
+        {'name': 'cache stats', 'method': 'GET', 'path': '/btms_api/cache-stats/'},
+        {'name': 'metrics', 'method': 'GET', 'path': '/btms_api/metrics/'},
+        {'name': 'players stats', 'method': 'GET', 'path': '/btms_api/players/stats/'},
+        {'name': 'leaderboards', 'method': 'GET', 'path': '/btms_api/leaderboards/'},
+        {'name': 'leaderboards team', 'method': 'GET', 'path': '/btms_api/leaderboards/?team=%d' % f['team']},
+        {'name': 'leaderboard score', 'method': 'GET', 'path': '/btms_api/leaderboards/average_score/'},
+        {'name': 'leaderboard penalties team', 'method': 'GET',
+         'path': '/btms_api/leaderboards/penalty_count/?team=%d&limit=5' % f['team']},
+        {'name': 'export players csv', 'method': 'GET', 'path': '/btms_api/export/players/'},
+        {'name': 'export players ndjson', 'method': 'GET', 'path': '/btms_api/export/players/?format=ndjson'},
+        {'name': 'export matches csv', 'method': 'GET', 'path': '/btms_api/export/matches/?round=%d' % f['round']},
+        {'name': 'teams create', 'method': 'POST', 'path': '/btms_api/teams/',
+         'body': lambda i: {'name': 'bench-team-%d' % i, 'average_score': 150}},
+        {'name': 'teams bulk create', 'method': 'POST', 'path': '/btms_api/teams/',
+         'body': lambda i: [{'name': 'bench-team-%d-%d' % (i, n), 'average_score': 150} for n in range(10)]},
+        {'name': 'teams update', 'method': 'PATCH', 'path': '/btms_api/teams/%d/' % f['team'],
+         'body': lambda i: {'average_score': 100 + i % 100}},
+        {'name': 'teams delete', 'method': 'DELETE', 'path': lambda i: '/btms_api/teams/%d/' % f['spare_teams'][i]},
+        {'name': 'players create', 'method': 'POST', 'path': '/btms_api/players/', 'body': player_body},
+        {'name': 'players bulk create', 'method': 'POST', 'path': '/btms_api/players/', 'body': [player_body] * 10},
+        {'name': 'players update', 'method': 'PATCH', 'path': '/btms_api/players/%d/' % f['player'],
+         'body': lambda i: {'penalty_count': i % 5}},
+        {'name': 'players bulk update', 'method': 'PATCH', 'path': '/btms_api/players/',
+         'body': lambda i: [{'id': pk, 'penalty_count': i % 5} for pk in f['players']]},
+        {'name': 'matches create', 'method': 'POST', 'path': '/btms_api/matches/', 'body': match_body},
+        {'name': 'matches update', 'method': 'PATCH', 'path': '/btms_api/matches/%d/' % f['match'],
+         'body': lambda i: {'venue': 'Bench Arena %d' % i}},
+        {'name': 'users create', 'method': 'POST', 'path': '/btms_api/users/',
+         'body': lambda i: {'first_name': 'Bench', 'last_name': 'User', 'username': 'bench-user-%d' % i,
+                            'email': 'bench-user-%d@example.com' % i, 'password': BENCHMARK_PASSWORD,
+                            'groups': f['admin_group']}},
+        {'name': 'match events', 'method': 'POST',
+         'path': lambda i: '/btms_api/matches/%d/events/' % f['court_matches'][i % len(f['court_matches'])][0],
+         'body': lambda i: _court_events(f['court_matches'][i % len(f['court_matches'])], i)},
+        {'name': 'import players', 'method': 'POST', 'path': '/btms_api/import/players/',
+         'content_type': MULTIPART_CONTENT,
+         'body': lambda i: _upload('players.csv', player_body, [{'name': 'bench-import-%d-%d' % (i, n)}
+                                                                for n in range(100)])},
+        {'name': 'import matches', 'method': 'POST', 'path': '/btms_api/import/matches/',
+         'content_type': MULTIPART_CONTENT,
+         'body': lambda i: _upload('matches.csv', match_body, [{'match_no': n, 'venue': 'Bench Import %d' % i}
+                                                               for n in range(10)])},
+        {'name': 'login', 'method': 'POST', 'path': '/btms_api/login/', 'token': None,
+         'body': {'username': f['username'], 'password': BENCHMARK_PASSWORD}},
+        {'name': 'logout', 'method': 'GET', 'path': '/btms_api/logout/', 'token': lambda i: f['spare_tokens'][i]},
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _route_names(resolver=None):
+    """
+    Returns the names of every route served by the API URLconf.
+    """
+    names = set()
+    for pattern in (resolver or get_resolver('btms_api.urls')).url_patterns:
+        if hasattr(pattern, 'url_patterns'):
+            names |= _route_names(pattern)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Load test every API route through the WSGI (or ASGI) application against a temporary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=64, help='Number of teams, a power of two')
+        parser.add_argument('--players-per-team', type=int, default=20)
+        parser.add_argument('--tournaments', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes generating the dataset')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Threads issuing requests, or requests in flight with --asgi')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Drive the ASGI application from an event loop instead of the WSGI application')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Only run endpoints whose name contains this text, may be repeated')
+        parser.add_argument('--output', default='-', help='JSON results file, - for standard output')
+        parser.add_argument('--compare', help='A previous JSON results file to compare against')
+
+    def create_fixtures(self, options, spare_count):
+        call_command('generate_data', teams=options['teams'], players_per_team=options['players_per_team'],
+                     tournaments=options['tournaments'], seed=options['seed'], workers=options['workers'],
+                     stdout=open(os.devnull, 'w'))
+
+        admin_group, _ = Group.objects.get_or_create(name='admin')
+        admin = User(first_name='Bench', last_name='Admin', username='bench-admin', email='bench-admin@example.com',
+                     groups=admin_group)
+        admin.set_password(BENCHMARK_PASSWORD)
+        admin.save()
+
+        # throwaway rows for the requests that consume one on every call
+        Team.objects.bulk_create([Team(name='spare-team-%d' % i, average_score=150) for i in range(spare_count)])
+        User.objects.bulk_create([User(username='spare-user-%d' % i, email='spare-user-%d@example.com' % i,
+                                       groups=admin_group) for i in range(spare_count)])
+        spare_users = User.objects.filter(username__startswith='spare-user-').order_by('id')
+        Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in spare_users])
+
+        team_ids = list(Team.objects.exclude(name__startswith='spare-team-').order_by('id')
+                        .values_list('id', flat=True))
+        return {
+            'admin_group': admin_group.id,
+            'username': admin.username,
+            'token': Token.objects.create(user=admin).key,
+            'team': team_ids[0],
+            'other_team': team_ids[1],
+            'coach': Coach.objects.order_by('id').values_list('id', flat=True).first(),
+            'player': Player.objects.order_by('id').values_list('id', flat=True).first(),
+            'players': list(Player.objects.order_by('id').values_list('id', flat=True)[:10]),
+            'round': Round.objects.order_by('id').values_list('id', flat=True).first(),
+            'match': Match.objects.order_by('id').values_list('id', flat=True).first(),
+            # (match, host team, a host player) of matches played on different courts at once
+            'court_matches': [(match_id, host_team_id, Player.objects.filter(team=host_team_id).values_list(
+                'id', flat=True).first()) for match_id, host_team_id in Match.objects.order_by('id').values_list(
+                'id', 'host_team')[:16]],
+            'standing': TeamStanding.objects.filter(played__gt=0).values_list('team_id', flat=True).first(),
+            'user': admin.id,
+            'spare_teams': list(Team.objects.filter(name__startswith='spare-team-').order_by('id')
+                                .values_list('id', flat=True)),
+            'spare_tokens': list(Token.objects.filter(user__in=spare_users).order_by('user_id')
+                                 .values_list('key', flat=True)),
+        }
+
+    def request_args(self, endpoint, fixtures, index):
+        token = _resolve(endpoint.get('token', fixtures['token']), index)
+        headers = {'Authorization': 'Token %s' % token} if token else None
+        return (endpoint['method'], _resolve(endpoint['path'], index), _resolve(endpoint.get('body'), index),
+                headers, endpoint.get('content_type', 'application/json'))
+
+    def run_wsgi(self, application, endpoint, fixtures, options):
+        def call(index):
+            status_code, _ = wsgi_request(application, *self.request_args(endpoint, fixtures, index))
+            return status_code
+
+        warmup = options['warmup']
+        run_load(call, range(warmup), 1)
+        return run_load(call, range(warmup, warmup + options['requests']), options['concurrency'])
+
+    def run_asgi(self, application, endpoint, fixtures, options):
+        # queries run in executor threads, so they are read back from the Server-Timing header
+        async def call(index):
+            status_code, headers, _ = await asgi_request(application, *self.request_args(endpoint, fixtures, index))
+            match = SERVER_TIMING_QUERIES.search(headers.get('server-timing', ''))
+            return status_code, int(match.group(1)) if match else 0
+
+        async def run():
+            warmup = options['warmup']
+            await run_async_load(call, range(warmup), 1)
+            return await run_async_load(call, range(warmup, warmup + options['requests']), options['concurrency'])
+
+        return asyncio.run(run())
+
+    def benchmark_endpoint(self, application, endpoint, fixtures, options):
+        run = self.run_asgi if options['asgi'] else self.run_wsgi
+        wall_time, samples = run(application, endpoint, fixtures, options)
+
+        latencies = [latency for latency, _, _ in samples]
+        queries = [query_count for _, _, query_count in samples]
+        status_codes = Counter(status_code for _, status_code, _ in samples)
+        result = {
+            'name': endpoint['name'],
+            'method': endpoint['method'],
+            'path': _resolve(endpoint['path'], 0),
+            'throughput_rps': round(len(samples) / wall_time, 2),
+            'status_codes': {str(code): count for code, count in sorted(status_codes.items())},
+            'errors': sum(count for code, count in status_codes.items() if code >= 400),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+        result.update(summarize(latencies))
+        return result
+
+    def compare(self, results, baseline_path, stream):
+        with open(baseline_path) as baseline_file:
+            baseline = {endpoint['name']: endpoint for endpoint in json.load(baseline_file)['endpoints']}
+        stream.write('Compared with %s' % baseline_path)
+        for endpoint in results['endpoints']:
+            previous = baseline.get(endpoint['name'])
+            if previous is None:
+                continue
+            stream.write('%-30s p50 %8.2f -> %8.2f ms (%+.0f%%)  rps %8.1f -> %8.1f  queries %5.1f -> %5.1f' % (
+                endpoint['name'], previous['p50_ms'], endpoint['p50_ms'],
+                (endpoint['p50_ms'] - previous['p50_ms']) / max(previous['p50_ms'], 0.001) * 100,
+                previous['throughput_rps'], endpoint['throughput_rps'],
+                previous['queries_mean'], endpoint['queries_mean']))
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests and --concurrency must be positive, --warmup not negative')
+
+        spare_count = options['warmup'] + options['requests']
+        with tempfile.TemporaryDirectory() as directory, \
+                temporary_database(name=os.path.join(directory, 'benchmark.sqlite3')), \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1']):
+            fixtures = self.create_fixtures(options, spare_count)
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            get_token_cache().clear()
+
+            endpoints = _endpoints(fixtures)
+            covered = {resolve(_resolve(endpoint['path'], 0).partition('?')[0]).url_name for endpoint in endpoints}
+            uncovered = sorted(_route_names() - covered)
+            if options['endpoint']:
+                endpoints = [endpoint for endpoint in endpoints
+                             if any(text in endpoint['name'] for text in options['endpoint'])]
+                if not endpoints:
+                    raise CommandError('No endpoint matches %s' % ', '.join(options['endpoint']))
+
+            # a fresh handler per run, after the settings above are in place
+            application = get_asgi_application() if options['asgi'] else get_wsgi_application()
+            results = {
+                'commit': _git_commit(),
+                'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'django': django.get_version(),
+                'dataset': {'teams': options['teams'], 'players': Player.objects.count(),
+                            'matches': Match.objects.count(), 'seed': options['seed']},
+                'interface': 'asgi' if options['asgi'] else 'wsgi',
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'uncovered_routes': uncovered,
+                'endpoints': [self.benchmark_endpoint(application, endpoint, fixtures, options)
+                              for endpoint in endpoints],
+            }
+
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+            stream = self.stderr
+        else:
+            with open(options['output'], 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+            stream = self.stdout
+            for endpoint in results['endpoints']:
+                stream.write('%-30s %8.1f rps  p50 %8.2f  p95 %8.2f  p99 %8.2f ms  %5.1f queries  %d errors' % (
+                    endpoint['name'], endpoint['throughput_rps'], endpoint['p50_ms'], endpoint['p95_ms'],
+                    endpoint['p99_ms'], endpoint['queries_mean'], endpoint['errors']))
+
+        if uncovered:
+            stream.write('Routes not benchmarked: %s' % ', '.join(uncovered))
+        if options['compare']:
+            self.compare(results, options['compare'], stream)
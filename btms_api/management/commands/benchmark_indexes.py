@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from btms_api.benchmark import temporary_database, populate, measure, summarize
+from btms_api.models import Player, Round, Match
+from btms_api.percentile import filter_queryset_by_percentile
+
+INDEXED_MODELS = [Player, Round, Match]
+
+
+def _scenarios(team_id, round_id, percentile, page_size):
+    """
+    Returns `(label, queryset factory)` pairs reproducing the queries issued by the list endpoints, which always
+    return one keyset page.
+    """
+    middle = Player.objects.order_by('average_score', 'id').values_list('average_score', 'id')[
+        Player.objects.count() // 2]
+    return [
+        ('players ?team=&percentile=',
+         lambda: filter_queryset_by_percentile(Player.objects.filter(team__id=team_id), 'average_score', percentile)
+         .order_by('id')[:page_size]),
+        ('players ?percentile=',
+         lambda: filter_queryset_by_percentile(Player.objects.all(), 'average_score', percentile)
+         .order_by('id')[:page_size]),
+        ('players ?team=&ordering=-average_score',
+         lambda: Player.objects.filter(team__id=team_id).order_by('-average_score', '-id')[:page_size]),
+        ('players ?ordering=average_score&cursor=',
+         lambda: Player.objects.filter(Q(average_score__gt=middle[0]) | Q(average_score=middle[0], id__gt=middle[1]))
+         .order_by('average_score', 'id')[:page_size]),
+        ('matches ?round=',
+         lambda: Match.objects.filter(round=round_id).order_by('date', 'time', 'id')[:page_size]),
+        ('matches ?ordering=date',
+         lambda: Match.objects.order_by('date', 'time', 'id')[:page_size]),
+        ('rounds by round_no',
+         lambda: Round.objects.order_by('round_no')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the list endpoint queries with and without the query indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=64)
+        parser.add_argument('--players', type=int, default=200000, help='Total number of players')
+        parser.add_argument('--rounds', type=int, default=16)
+        parser.add_argument('--matches', type=int, default=100000)
+        parser.add_argument('--percentile', type=float, default=90)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--explain', action='store_true', help='Print the query plans')
+
+    def run_scenarios(self, scenarios, repeat, explain):
+        results = {}
+        for label, make_queryset in scenarios:
+            timings, rows = measure(lambda: list(make_queryset()), repeat)
+            results[label] = (timings, [obj.pk for obj in rows])
+            if explain:
+                self.stdout.write('  %s: %s' % (label, make_queryset().explain()))
+        return results
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1 or options['teams'] < 2:
+            raise CommandError('--rounds must be positive and --teams at least 2')
+
+        with temporary_database() as connection:
+            team_ids = populate(options['teams'], options['players'], options['seed'], rounds=options['rounds'],
+                                matches=options['matches'])
+            if connection.vendor == 'sqlite':
+                # give the planner row statistics, as a long-lived database would have
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            scenarios = _scenarios(team_ids[0], Round.objects.values_list('id', flat=True).first(),
+                                   options['percentile'], options['page_size'])
+
+            self.stdout.write('with indexes')
+            indexed = self.run_scenarios(scenarios, options['repeat'], options['explain'])
+
+            with connection.schema_editor() as schema_editor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        schema_editor.remove_index(model, index)
+            self.stdout.write('without indexes')
+            unindexed = self.run_scenarios(scenarios, options['repeat'], options['explain'])
+
+            self.stdout.write('%d players, %d matches' % (Player.objects.count(), Match.objects.count()))
+            for label, _ in scenarios:
+                indexed_timings, indexed_rows = indexed[label]
+                unindexed_timings, unindexed_rows = unindexed[label]
+                if indexed_rows != unindexed_rows:
+                    raise CommandError('Result mismatch for %s' % label)
+                with_summary = summarize(indexed_timings)
+                without_summary = summarize(unindexed_timings)
+                self.stdout.write('%s (%d rows)' % (label, len(indexed_rows)))
+                self.stdout.write('  without: %s' % without_summary)
+                self.stdout.write('  with:    %s' % with_summary)
+                self.stdout.write('  p50 speedup: %.1fx'
+                                  % (without_summary['p50_ms'] / max(with_summary['p50_ms'], 0.001)))
@@ -0,0 +1,41 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from btms_api.benchmark import temporary_database, populate, measure, summarize
+from btms_api.models import Player
+from btms_api.percentile import percentile_cutoff
+
+
+def _numpy_cutoff(queryset, percentile):
+    # the previous implementation: materialize every score and call NumPy
+    arr = list(queryset.values_list('average_score', flat=True))
+    return np.percentile(arr, float(percentile))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the database percentile engine against the NumPy implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=16)
+        parser.add_argument('--players', type=int, default=100000, help='Total number of players')
+        parser.add_argument('--percentile', type=float, default=90)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        percentile = options['percentile']
+        with temporary_database():
+            team_ids = populate(options['teams'], options['players'], options['seed'])
+            scenarios = [('all teams', Player.objects.all()),
+                         ('single team', Player.objects.filter(team__id=team_ids[0]))]
+
+            for label, queryset in scenarios:
+                numpy_timings, expected = measure(lambda: _numpy_cutoff(queryset, percentile), options['repeat'])
+                engine_timings, actual = measure(lambda: percentile_cutoff(queryset, 'average_score', percentile),
+                                                 options['repeat'])
+                if expected != actual:
+                    raise CommandError('Cutoff mismatch for %s: numpy=%r engine=%r' % (label, expected, actual))
+
+                self.stdout.write('%s (%d rows, cutoff %r)' % (label, queryset.count(), actual))
+                self.stdout.write('  numpy:  %s' % summarize(numpy_timings))
+                self.stdout.write('  engine: %s' % summarize(engine_timings))
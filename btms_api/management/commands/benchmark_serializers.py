@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from btms_api.authentication import get_token_cache
+from btms_api.benchmark import temporary_database, populate, wsgi_request, measure, summarize
+from btms_api.models import User
+
+
+def _urls(page_size):
+    return [
+        '/btms_api/players/?page_size=%d' % page_size,
+        '/btms_api/players/?page_size=%d&ordering=-average_score' % page_size,
+        '/btms_api/players/?page_size=%d&fields=name,average_score' % page_size,
+        '/btms_api/matches/?page_size=%d' % page_size,
+        '/btms_api/teams/',
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark list responses built by the serializers against the values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=256)
+        parser.add_argument('--players', type=int, default=50000)
+        parser.add_argument('--matches', type=int, default=20000)
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='-', help='JSON results file, - for standard output')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+
+        results = []
+        with tempfile.TemporaryDirectory() as directory, \
+                temporary_database(name=os.path.join(directory, 'benchmark.sqlite3')), \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1']):
+            populate(options['teams'], options['players'], options['seed'], rounds=16, matches=options['matches'])
+            admin_group, _ = Group.objects.get_or_create(name='admin')
+            admin = User.objects.create(username='bench-admin', email='bench-admin@example.com', groups=admin_group)
+            headers = {'Authorization': 'Token %s' % Token.objects.create(user=admin).key}
+            get_token_cache().clear()
+            application = get_wsgi_application()
+
+            for url in _urls(options['page_size']):
+                timings, contents = {}, {}
+                for fast in (False, True):
+                    def call():
+                        # measure the response, not the response cache
+                        caches[settings.BTMS_RESPONSE_CACHE_ALIAS].clear()
+                        return wsgi_request(application, 'GET', url, headers=headers)
+
+                    with override_settings(BTMS_FAST_LIST=fast):
+                        call()
+                        timings[fast], (status_code, contents[fast]) = measure(call, options['repeat'])
+                    if status_code != 200:
+                        raise CommandError('%s answered %d' % (url, status_code))
+                serializer, fast_path = summarize(timings[False]), summarize(timings[True])
+                results.append({
+                    'url': url,
+                    'bytes': len(contents[True]),
+                    'identical': contents[True] == contents[False],
+                    'serializer': serializer,
+                    'fast_path': fast_path,
+                    'speedup': round(serializer['p50_ms'] / fast_path['p50_ms'], 2),
+                })
+
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+            stream = self.stderr
+        else:
+            with open(options['output'], 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+            stream = self.stdout
+        for result in results:
+            stream.write('%-62s serializer p50 %8.2f ms  fast path p50 %8.2f ms  x%.2f  %s' % (
+                result['url'], result['serializer']['p50_ms'], result['fast_path']['p50_ms'], result['speedup'],
+                'identical' if result['identical'] else 'DIFFERENT'))
+        if not all(result['identical'] for result in results):
+            raise CommandError('The fast path changed a response')
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from btms_api.authentication import get_token_cache
+from btms_api.benchmark import temporary_database, populate, wsgi_request, run_load, summarize
+from btms_api.models import Player, Match, User
+
+
+def _requests(fixtures, write_every):
+    """
+    Returns `call(index)` issuing the mixed load: a write (a player's penalty count or a match score, which also
+    updates the standings) every `write_every` requests, list and detail reads otherwise.
+    """
+    players, matches, teams = fixtures['players'], fixtures['matches'], fixtures['teams']
+
+    def request(index):
+        if index % write_every == 0:
+            if index // write_every % 2:
+                return True, 'PATCH', '/btms_api/players/%d/' % players[index % len(players)], \
+                    {'penalty_count': index % 5}
+            return True, 'PATCH', '/btms_api/matches/%d/' % matches[index % len(matches)], \
+                {'host_team_final_score': 100 + index % 50}
+        if index % 2:
+            return False, 'GET', '/btms_api/players/?team=%d' % teams[index % len(teams)], None
+        return False, 'GET', '/btms_api/matches/%d/' % matches[index % len(matches)], None
+
+    return request
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent mixed reads and writes against each SQLite database profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(settings.DATABASE_PROFILES),
+                            help='Profile to benchmark, may be repeated (default: all)')
+        parser.add_argument('--teams', type=int, default=64)
+        parser.add_argument('--players', type=int, default=20000)
+        parser.add_argument('--matches', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--write-every', type=int, default=5, help='One request in this many is a write')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='-', help='JSON results file, - for standard output')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['write_every'] < 1:
+            raise CommandError('--requests, --concurrency and --write-every must be positive')
+
+        profiles = options['profile'] or sorted(settings.DATABASE_PROFILES)
+        if profiles == [settings.BTMS_DATABASE_PROFILE]:
+            results = [self.run_profile(options)]
+        else:
+            # the database backend is fixed once settings are loaded, so every profile runs in a process of its own
+            results = [self.run_subprocess(profile, options) for profile in profiles]
+
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+            stream = self.stderr
+        else:
+            with open(options['output'], 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+            stream = self.stdout
+        for result in results:
+            stream.write('%-12s %8.1f rps  reads p50 %7.2f p99 %7.2f ms  writes p50 %7.2f p99 %7.2f ms  %d errors' % (
+                result['profile'], result['throughput_rps'], result['reads']['p50_ms'], result['reads']['p99_ms'],
+                result['writes']['p50_ms'], result['writes']['p99_ms'], result['errors']))
+
+    def run_subprocess(self, profile, options):
+        arguments = [sys.executable, '-m', 'django', 'benchmark_sqlite', '--profile', profile]
+        for name in ['teams', 'players', 'matches', 'requests', 'concurrency', 'write_every', 'seed']:
+            arguments += ['--%s' % name.replace('_', '-'), str(options[name])]
+        environment = dict(os.environ, BTMS_DATABASE_PROFILE=profile,
+                           DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'BTMSystem.settings'))
+        completed = subprocess.run(arguments, env=environment, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError('The %s profile failed:\n%s' % (profile, completed.stderr))
+        return json.loads(completed.stdout)[0]
+
+    def create_fixtures(self, options):
+        team_ids = populate(options['teams'], options['players'], options['seed'], rounds=16,
+                            matches=options['matches'])
+        admin_group, _ = Group.objects.get_or_create(name='admin')
+        admin = User.objects.create(username='bench-admin', email='bench-admin@example.com', groups=admin_group)
+        return {
+            'token': Token.objects.create(user=admin).key,
+            'teams': team_ids,
+            'players': list(Player.objects.order_by('id').values_list('id', flat=True)[:1000]),
+            'matches': list(Match.objects.order_by('id').values_list('id', flat=True)[:1000]),
+        }
+
+    def run_profile(self, options):
+        # a database file, shared by the request threads as it is in production
+        with tempfile.TemporaryDirectory() as directory, \
+                temporary_database(name=os.path.join(directory, 'benchmark.sqlite3')), \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1']):
+            fixtures = self.create_fixtures(options)
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            get_token_cache().clear()
+
+            application = get_wsgi_application()
+            request = _requests(fixtures, options['write_every'])
+            headers = {'Authorization': 'Token %s' % fixtures['token']}
+
+            def call(index):
+                _, method, path, body = request(index)
+                status_code, _ = wsgi_request(application, method, path, body, headers)
+                return status_code
+
+            run_load(call, range(options['concurrency']), 1)
+            indexes = range(options['concurrency'], options['concurrency'] + options['requests'])
+            wall_time, samples = run_load(call, indexes, options['concurrency'])
+
+        writes = [request(index)[0] for index in indexes]
+        status_codes = Counter(status_code for _, status_code, _ in samples)
+        return {
+            'profile': settings.BTMS_DATABASE_PROFILE,
+            'engine': settings.DATABASES['default']['ENGINE'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'write_every': options['write_every'],
+            'throughput_rps': round(len(samples) / wall_time, 2),
+            'status_codes': {str(code): count for code, count in sorted(status_codes.items())},
+            'errors': sum(count for code, count in status_codes.items() if code >= 400),
+            'reads': summarize([latency for (latency, _, _), write in zip(samples, writes) if not write]),
+            'writes': summarize([latency for (latency, _, _), write in zip(samples, writes) if write]),
+        }
@@ -1,118 +1,164 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+import os
+import random
+
 from django.core.management.base import BaseCommand, CommandError
-from faker import Faker
+from django.db import transaction
+from btms_api import fake_data
 from btms_api.models import Team, Round, Coach, Player, Match
-import random
+from btms_api.standings import rebuild_standings
 
 
-class Command(BaseCommand):
-    help = 'Generate Dummy Data'
+def _is_power_of_two(number):
+    return number >= 2 and number & (number - 1) == 0
 
-    def create_teams(self, fake):
 
-        for t in range(16):
-            try:
-                team = Team(name=fake.slug(), average_score=round(random.uniform(100, 200), 2))
-                team.save()
-            except Exception:
-                raise CommandError('Error creating team data')
+def _chunks(total):
+    """
+    Yields `(chunk_index, start, count)` covering `range(total)` in `fake_data.CHUNK_SIZE` steps.
+    """
+    for chunk_index, start in enumerate(range(0, total, fake_data.CHUNK_SIZE)):
+        yield chunk_index, start, min(fake_data.CHUNK_SIZE, total - start)
 
-    def create_rounds(self):
 
+class Command(BaseCommand):
+    help = 'Generate Dummy Data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=16, help='Number of teams, a power of two')
+        parser.add_argument('--players-per-team', type=int, default=10)
+        parser.add_argument('--tournaments', type=int, default=1, help='Number of knockout brackets to generate')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='The same seed always generates the same dataset (random when omitted)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes generating fake data, 1 to generate in this process')
+
+    def generate(self, func, total):
+        """
+        Runs `func(chunk_index, start, count)` for every chunk of `total` rows and yields the results in chunk order.
+        Chunks are generated by a process pool when workers are enabled, keeping at most two chunks per worker in
+        flight so memory stays bounded.
+        """
+        chunks = list(_chunks(total))
+        if self.workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield func(*chunk)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(func, *chunk))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def bulk_insert(self, model, batches):
+        """
+        Takes a model and an iterable of lists of unsaved instances, inserts them `--batch-size` rows at a time and
+        returns the primary keys in insertion order.
+        """
+        pks = []
+        buffer = []
+        for batch in batches:
+            buffer.extend(batch)
+            while len(buffer) >= self.batch_size:
+                pks.extend(obj.pk for obj in model.objects.bulk_create(buffer[:self.batch_size]))
+                buffer = buffer[self.batch_size:]
+        if buffer:
+            pks.extend(obj.pk for obj in model.objects.bulk_create(buffer))
+
+        if None in pks:
+            # backends that cannot return primary keys from bulk inserts
+            pks = list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(pks)])[::-1]
+        return pks
+
+    def create_teams(self, team_count):
         try:
-            round_of_sixteen = Round(round_no=1, round_code='R16', round_name='Round of Sixteen')
-            round_qf = Round(round_no=2, round_code='QF', round_name='Quater Finals')
-            round_sf = Round(round_no=3, round_code='SF', round_name='Semi Finals')
-            round_gf = Round(round_no=4, round_code='GF', round_name='Grand Final')
-            round_of_sixteen.save()
-            round_qf.save()
-            round_sf.save()
-            round_gf.save()
+            batches = ([Team(name=name, average_score=score) for name, score in rows]
+                       for rows in self.generate(partial(fake_data.team_rows, self.seed), team_count))
+            return self.bulk_insert(Team, batches)
         except Exception:
-            raise CommandError('Error creating Round data')
+            raise CommandError('Error creating team data')
 
-    def create_coaches(self, fake):
-        teams = Team.objects.all()
+    def create_rounds(self, team_count):
+        try:
+            rounds = [Round(round_no=round_no, round_code=code, round_name=name)
+                      for round_no, code, name in fake_data.bracket_rounds(team_count)]
+            return self.bulk_insert(Round, [rounds])
+        except Exception:
+            raise CommandError('Error creating Round data')
 
+    def create_coaches(self, team_ids):
         try:
-            for team in teams:
-                coach = Coach(name=fake.name(), team=team)
-                coach.save()
+            names = chain.from_iterable(self.generate(partial(fake_data.coach_rows, self.seed), len(team_ids)))
+            self.bulk_insert(Coach, [[Coach(name=name, team_id=team_id) for name, team_id in zip(names, team_ids)]])
         except Exception:
             raise CommandError('Error creating Coach data')
 
-    def create_players(self, fake):
-        teams = Team.objects.all()
+    def create_players(self, team_ids, players_per_team):
+        chunk_players = partial(fake_data.player_rows, self.seed, players_per_team=players_per_team)
         try:
-            for team in teams:
-                for t in range(10):
-                    player = Player(name=fake.name(), position=fake.slug(), age=random.randint(10, 80),
-                                    number_of_games_played=random.randint(0, 4), penalty_count=random.randint(0, 4),
-                                    height=round(random.uniform(50, 300), 2), weight=round(random.uniform(15, 200), 2),
-                                    average_score=round(random.uniform(100, 200), 2), is_team_captain=False, team=team)
-                    player.save()
-
+            batches = ([Player(name=name, position=position, age=age, number_of_games_played=games,
+                               penalty_count=penalties, height=height, weight=weight, average_score=average_score,
+                               is_team_captain=is_captain, team_id=team_ids[team_position])
+                        for team_position, name, position, age, games, penalties, height, weight, average_score,
+                        is_captain in rows]
+                       for rows in self.generate(chunk_players, len(team_ids) * players_per_team))
+            self.bulk_insert(Player, batches)
         except Exception:
             raise CommandError('Error creating Player data')
 
-    def create_matches(self, fake):
-        #  round 1 matches
-        teams = Team.objects.all()
-        rounds = Round.objects.all()
-        round_one_winners = []
-        for t in range(8):
-            match = Match(match_no=random.randint(1, 100), date=fake.date(), time=fake.time(),
-                          venue=fake.city(), round=rounds[0],
-                          host_team=teams[(t * 2)], guest_team=teams[(t * 2 + 1)], winner_team=teams[(t * 2 + 1)],
-                          host_team_final_score=round(random.uniform(100, 200), 2),
-                          guest_team_final_score=round(random.uniform(100, 200), 2))
-            match.save()
-            round_one_winners.append(teams[(t * 2 + 1)])
-
-        round_two_winners = []
-        for t in range(4):
-            match = Match(match_no=random.randint(1, 100), date=fake.date(), time=fake.time(),
-                          venue=fake.city(), round=rounds[1],
-                          host_team=round_one_winners[(t * 2)], guest_team=round_one_winners[(t * 2 + 1)],
-                          winner_team=round_one_winners[(t * 2 + 1)],
-                          host_team_final_score=round(random.uniform(100, 200), 2),
-                          guest_team_final_score=round(random.uniform(100, 200), 2))
-            match.save()
-            round_two_winners.append(round_one_winners[(t * 2 + 1)])
-
-        round_three_winners = []
-        for t in range(2):
-            match = Match(match_no=random.randint(1, 100), date=fake.date(), time=fake.time(),
-                          venue=fake.city(), round=rounds[2],
-                          host_team=round_two_winners[(t * 2)], guest_team=round_two_winners[(t * 2 + 1)],
-                          winner_team=round_two_winners[(t * 2 + 1)],
-                          host_team_final_score=round(random.uniform(100, 200), 2),
-                          guest_team_final_score=round(random.uniform(100, 200), 2))
-            match.save()
-            round_three_winners.append(round_two_winners[(t * 2 + 1)])
-
-        for t in range(1):
-            match = Match(match_no=random.randint(1, 100), date=fake.date(), time=fake.time(),
-                          venue=fake.city(), round=rounds[3],
-                          host_team=round_three_winners[(t * 2)], guest_team=round_three_winners[(t * 2 + 1)],
-                          winner_team=round_three_winners[(t * 2 + 1)],
-                          host_team_final_score=round(random.uniform(100, 200), 2),
-                          guest_team_final_score=round(random.uniform(100, 200), 2))
-            match.save()
+    def create_matches(self, team_ids, round_ids, tournaments):
+        try:
+            for tournament in range(tournaments):
+                rounds = fake_data.bracket_matches(self.seed, tournament, range(len(team_ids)))
+                matches = [Match(match_no=match_no, date=date, time=time, venue=venue, round_id=round_id,
+                                 host_team_id=team_ids[host], guest_team_id=team_ids[guest],
+                                 winner_team_id=team_ids[winner], host_team_final_score=host_score,
+                                 guest_team_final_score=guest_score)
+                           for round_id, round_matches in zip(round_ids, rounds)
+                           for match_no, date, time, venue, host, guest, winner, host_score, guest_score
+                           in round_matches]
+                self.bulk_insert(Match, [matches])
+        except Exception:
+            raise CommandError('Error creating Match data')
 
     def handle(self, *args, **kwargs):
-        fake = Faker()
+        team_count = kwargs['teams']
+        players_per_team = kwargs['players_per_team']
+        if not _is_power_of_two(team_count):
+            raise CommandError('--teams must be a power of two (2, 4, 8, 16, ...)')
+        if players_per_team < 1 or kwargs['batch_size'] < 1 or kwargs['tournaments'] < 0:
+            raise CommandError('--players-per-team and --batch-size must be positive, --tournaments not negative')
+
+        self.seed = kwargs['seed'] if kwargs['seed'] is not None else random.randrange(2 ** 32)
+        self.batch_size = kwargs['batch_size']
+        self.workers = kwargs['workers']
+
+        with transaction.atomic():
+            # Generates list of teams
+            team_ids = self.create_teams(team_count)
+
+            # Generates list of rounds
+            round_ids = self.create_rounds(team_count)
 
-        # Generates list of teams
-        self.create_teams(fake)
+            # Generate list of coaches
+            self.create_coaches(team_ids)
 
-        # Generates list of rounds
-        self.create_rounds()
+            # Generate list of players
+            self.create_players(team_ids, players_per_team)
 
-        # Generate list of coaches
-        self.create_coaches(fake)
+            # Generate list of matches
+            self.create_matches(team_ids, round_ids, kwargs['tournaments'])
 
-        # Generate list of players
-        self.create_players(fake)
+            # Matches are bulk inserted, so standings are rebuilt once at the end
+            rebuild_standings()
 
-        # Generate list of matches
-        self.create_matches(fake)
+        self.stdout.write('Generated %d teams, %d players and %d tournament(s) with seed %d'
+                          % (team_count, team_count * players_per_team, kwargs['tournaments'], self.seed))
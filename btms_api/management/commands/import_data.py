@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from btms_api.importer import IMPORTERS, IMPORT_BATCH_SIZE, detect_format, parse_rows
+
+
+def _write_checkpoint(path, checkpoint):
+    # replaced atomically, an interrupted write never leaves a truncated checkpoint
+    with open(path + '.tmp', 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(path + '.tmp', path)
+
+
+class Command(BaseCommand):
+    help = 'Import players or matches from a CSV or NDJSON file, in the format of the export endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help='Format of the file, from its extension when omitted')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Rows validated and written per transaction')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Progress file updated after every batch (default: PATH.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows already imported according to the checkpoint')
+        parser.add_argument('--errors', default=None, help='Write the row errors to this file as NDJSON')
+
+    def load_checkpoint(self, path, source, options):
+        if not os.path.exists(path):
+            if options['resume']:
+                raise CommandError('No checkpoint at %s' % path)
+            return None
+        if not options['resume']:
+            raise CommandError('%s exists from an interrupted import, pass --resume to continue it or delete it'
+                               % path)
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if {key: checkpoint.get(key) for key in source} != source:
+            raise CommandError('%s belongs to another import or the file changed since, delete it to start over'
+                               % path)
+        return checkpoint
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            stat = os.stat(path)
+        except OSError as exc:
+            raise CommandError('Cannot read %s: %s' % (path, exc))
+
+        checkpoint_path = options['checkpoint'] or path + '.checkpoint'
+        source = {'path': os.path.abspath(path), 'kind': options['kind'], 'size': stat.st_size,
+                  'mtime': stat.st_mtime}
+        checkpoint = self.load_checkpoint(checkpoint_path, source, options) or \
+            dict(source, rows=0, created=0, updated=0, failed=0)
+
+        importer = IMPORTERS[options['kind']](batch_size=options['batch_size'])
+        errors_file = open(options['errors'], 'a' if options['resume'] else 'w') if options['errors'] else None
+        started = time.perf_counter()
+        imported_rows = reported_errors = 0
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                rows = parse_rows(stream, options['format'] or detect_format(path))
+                for result in importer.import_rows(islice(rows, checkpoint['rows'], None)):
+                    checkpoint['rows'] += result.rows
+                    checkpoint['created'] += result.created
+                    checkpoint['updated'] += result.updated
+                    checkpoint['failed'] += len(result.errors)
+                    imported_rows += result.rows
+                    for error in result.errors:
+                        if errors_file:
+                            errors_file.write(json.dumps(error) + '\n')
+                        elif reported_errors < 20:
+                            self.stderr.write('row %(row)d: %(errors)s' % error)
+                            reported_errors += 1
+                    _write_checkpoint(checkpoint_path, checkpoint)
+                    if options['verbosity'] > 1:
+                        self.stdout.write('%d rows' % checkpoint['rows'])
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError('Stopped after row %d: %s' % (checkpoint['rows'], exc))
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write('Imported %(rows)d %(kind)s rows: %(created)d created, %(updated)d updated, '
+                          '%(failed)d failed' % checkpoint)
+        self.stdout.write('%d rows in %.1fs (%.0f rows/s)'
+                          % (imported_rows, elapsed, imported_rows / elapsed if elapsed else 0))
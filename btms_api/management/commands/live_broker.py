@@ -0,0 +1,23 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from btms_api.live import serve_broker
+
+
+class Command(BaseCommand):
+    help = 'Relay live score changes between the workers of a deployment (set BTMS_LIVE_BROKER to its address)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8765', help='host:port to listen on')
+
+    def handle(self, *args, **kwargs):
+        host, _, port = kwargs['bind'].rpartition(':')
+
+        def started(server):
+            self.stdout.write('Live broker listening on %s' % kwargs['bind'])
+
+        try:
+            asyncio.run(serve_broker(host or '127.0.0.1', int(port), started))
+        except KeyboardInterrupt:
+            pass
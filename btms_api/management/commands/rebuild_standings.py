@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from btms_api.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored team standings from all matches'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_standings()
+        self.stdout.write('Rebuilt standings for %d teams' % count)
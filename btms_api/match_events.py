@@ -0,0 +1,199 @@
+import copy
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import standings
+from .bulk import as_pk, preload_related, _indexed_errors
+from .live import publish_scores
+from .models import Match, MatchEvent, Player
+from .serializers import MatchEventSerializer
+
+# Events the writer thread commits together in one transaction, as many queued batches as fit
+EVENT_WRITER_MAX_EVENTS = 5000
+
+_event_writer = None
+_event_writer_lock = threading.Lock()
+
+
+def _match_state(match):
+    return {'host_team_final_score': match.host_team_final_score,
+            'guest_team_final_score': match.guest_team_final_score,
+            'winner_team': match.winner_team_id}
+
+
+def apply_event_batches(batches):
+    """
+    Takes `[(match_id, [validated event data])]`, and in one transaction inserts the events whose `(match,
+    sequence)` is not stored yet with `bulk_create`, adds their points to the match scores, derives each winner
+    from the scores (a tie keeps the current one), and adds fouls to the players' `penalty_count`. Standings follow
+    the matches. Returns `{'created', 'duplicates', 'match'}` for every batch, in order.
+    """
+    match_ids = {match_id for match_id, _ in batches}
+    sequences = {event['sequence'] for _, events in batches for event in events}
+    with transaction.atomic():
+        stored = set(MatchEvent.objects.filter(match__in=match_ids, sequence__in=sequences)
+                     .values_list('match_id', 'sequence'))
+
+        created, counts = [], []
+        for match_id, events in batches:
+            batch_created = 0
+            for event in events:
+                key = (match_id, event['sequence'])
+                if key not in stored:
+                    stored.add(key)
+                    created.append(MatchEvent(match_id=match_id, **event))
+                    batch_created += 1
+            counts.append((batch_created, len(events) - batch_created))
+        MatchEvent.objects.bulk_create(created)
+
+        points = Counter()
+        fouls = Counter()
+        for event in created:
+            if event.points:
+                points[event.match_id, event.team_id] += event.points
+            if event.kind == MatchEvent.FOUL:
+                fouls[event.player_id] += 1
+
+        matches = Match.objects.select_for_update().in_bulk(match_ids)
+        changed, previous = [], []
+        for match in matches.values():
+            host_points = points[match.id, match.host_team_id]
+            guest_points = points[match.id, match.guest_team_id]
+            if not host_points and not guest_points:
+                continue
+            previous.append(copy.copy(match))
+            match.host_team_final_score += host_points
+            match.guest_team_final_score += guest_points
+            if match.host_team_final_score != match.guest_team_final_score:
+                match.winner_team_id = match.host_team_id \
+                    if match.host_team_final_score > match.guest_team_final_score else match.guest_team_id
+            changed.append(match)
+        if changed:
+            Match.objects.bulk_update(changed, ['host_team_final_score', 'guest_team_final_score', 'winner_team'])
+            standings.update_standings(added=changed, removed=previous)
+            publish_scores(changed)
+
+        if fouls:
+            players = list(Player.objects.select_for_update().in_bulk(list(fouls)).values())
+            for player in players:
+                player.penalty_count += fouls[player.id]
+            Player.objects.bulk_update(players, ['penalty_count'])
+
+    return [{'created': batch_created, 'duplicates': duplicates, 'match': _match_state(matches[match_id])}
+            for (match_id, _), (batch_created, duplicates) in zip(batches, counts)]
+
+
+class EventWriter:
+    """
+    Group commit for event ingestion: requests queue their validated batches and wait, while one writer thread
+    commits everything queued so far (up to `max_events`) in a single transaction. Bursts from many courts then
+    cost one SQLite write lock per group instead of one per request, and request threads never wait on each
+    other's locks. A group that fails is retried batch by batch, so only the offending batch fails.
+    """
+
+    def __init__(self, max_events=EVENT_WRITER_MAX_EVENTS):
+        self.max_events = max_events
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, match_id, events):
+        """
+        Queues a batch, and returns a future resolved with its `apply_event_batches` result once committed.
+        """
+        future = Future()
+        self._queue.put((match_id, events, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='btms-event-writer', daemon=True)
+                    self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            event_count = len(jobs[0][1])
+            while event_count < self.max_events:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                event_count += len(jobs[-1][1])
+            close_old_connections()
+            try:
+                self._write(jobs)
+            finally:
+                close_old_connections()
+
+    def _write(self, jobs):
+        try:
+            results = apply_event_batches([(match_id, events) for match_id, events, _ in jobs])
+        except Exception as exc:
+            if len(jobs) > 1:
+                for job in jobs:
+                    self._write([job])
+            else:
+                jobs[0][2].set_exception(exc)
+            return
+        for (_, _, future), result in zip(jobs, results):
+            future.set_result(result)
+
+
+def get_event_writer():
+    """
+    Returns the process-wide event writer.
+    """
+    global _event_writer
+    if _event_writer is None:
+        with _event_writer_lock:
+            if _event_writer is None:
+                _event_writer = EventWriter()
+    return _event_writer
+
+
+def record_events(match_id, events):
+    """
+    Stores a validated batch of events of one match, through the event writer unless `BTMS_EVENT_GROUP_COMMIT` is
+    off, and returns its `apply_event_batches` result.
+    """
+    if getattr(settings, 'BTMS_EVENT_GROUP_COMMIT', True):
+        return get_event_writer().submit(match_id, events).result()
+    return apply_event_batches([(match_id, events)])[0]
+
+
+class MatchEventsMixin:
+    """
+    `GET` lists the events of a match in sequence order; `POST` takes a list of events, validates them all, and
+    records them with `record_events`. Resubmitted sequences are counted as duplicates and ignored, so a scorer can
+    safely retry a batch.
+    """
+
+    def list_events(self, request, match):
+        events = MatchEvent.objects.filter(match=match).order_by('sequence')
+        return Response(MatchEventSerializer(events, many=True).data)
+
+    def create_events(self, request, match):
+        items = request.data
+        self.check_bulk_payload(items)
+
+        serializer = MatchEventSerializer(context={**self.get_serializer_context(), 'match': match})
+        serializer.context['preloaded_related'] = preload_related(serializer, items)
+        validated_data, errors = self.validate_items(serializer, items, [None] * len(items))
+
+        seen = set()
+        for item, item_errors in zip(items, errors):
+            sequence = as_pk(item.get('sequence')) if isinstance(item, dict) else None
+            if sequence is not None and sequence in seen:
+                item_errors['sequence'] = ['Duplicate sequence %d.' % sequence]
+            seen.add(sequence)
+        if any(errors):
+            return Response({'errors': _indexed_errors(errors)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(record_events(match.id, validated_data), status=status.HTTP_201_CREATED)
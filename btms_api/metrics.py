@@ -0,0 +1,316 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from rest_framework.renderers import BaseRenderer
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Order of the phases in the Server-Timing header, other phases follow in the order they were recorded
+PHASES = ['auth', 'permission', 'queryset', 'serialize', 'handler', 'render']
+
+_current_timings = contextvars.ContextVar('btms_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Phase durations, SQL query count and SQL time of one request, in seconds.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.query_count = 0
+        self.query_time = 0.0
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing every query of the request.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_time += time.perf_counter() - started
+
+    def server_timing(self, total):
+        """
+        Takes the request duration, and returns the `Server-Timing` header value (durations in milliseconds).
+        """
+        names = [name for name in PHASES if name in self.phases] + \
+                [name for name in self.phases if name not in PHASES]
+        entries = ['%s;dur=%.2f' % (name, self.phases[name] * 1000) for name in names]
+        entries.append('sql;dur=%.2f;desc="%d queries"' % (self.query_time * 1000, self.query_count))
+        entries.append('total;dur=%.2f' % (total * 1000))
+        return ', '.join(entries)
+
+
+def record_phase(name, seconds):
+    """
+    Adds `seconds` to a phase of the current request, if it is being measured.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def track_queries():
+    """
+    Counts and times the queries run by this thread's connection during the block for the current request. Blocks
+    running in other threads on behalf of a request (async views) use it to report their queries.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    with connections[DEFAULT_DB_ALIAS].execute_wrapper(timings.record_query):
+        yield
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Times the block as a phase of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def _format_labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return ','.join('%s="%s"' % (name, value) for (name, _), value in zip(labels, escaped))
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus histogram. Not locked; `MetricsRegistry` serializes access.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '%s_bucket{%s}' % (name, _format_labels(labels + (('le', _format_number(bound)),))), cumulative
+        yield '%s_bucket{%s}' % (name, _format_labels(labels + (('le', '+Inf'),))), self.count
+        yield '%s_sum{%s}' % (name, _format_labels(labels)), self.sum
+        yield '%s_count{%s}' % (name, _format_labels(labels)), self.count
+
+
+class MetricsRegistry:
+    """
+    Process-wide per-route request metrics, rendered in the Prometheus text format. Every worker process keeps its
+    own registry, scrape each of them.
+    """
+    metrics = {
+        'btms_http_request_duration_seconds': ('histogram', 'Request duration.', DURATION_BUCKETS),
+        'btms_http_request_phase_seconds': ('histogram', 'Time spent in each request phase.', DURATION_BUCKETS),
+        'btms_http_request_sql_queries': ('histogram', 'SQL queries per request.', QUERY_COUNT_BUCKETS),
+        'btms_http_request_sql_seconds': ('histogram', 'SQL time per request.', DURATION_BUCKETS),
+        'btms_http_responses_total': ('counter', 'Responses by status code.', None),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {name: {} for name in self.metrics}
+
+    def _observe(self, name, labels, value):
+        series = self._series[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self.metrics[name][2])
+        histogram.observe(value)
+
+    def record(self, route, method, status_code, total, timings):
+        labels = (('route', route), ('method', method))
+        with self._lock:
+            self._observe('btms_http_request_duration_seconds', labels, total)
+            self._observe('btms_http_request_sql_queries', labels, timings.query_count)
+            self._observe('btms_http_request_sql_seconds', labels, timings.query_time)
+            for name, seconds in timings.phases.items():
+                self._observe('btms_http_request_phase_seconds', labels + (('phase', name),), seconds)
+            responses = self._series['btms_http_responses_total']
+            status_labels = labels + (('status', str(status_code)),)
+            responses[status_labels] = responses.get(status_labels, 0) + 1
+
+    def render(self, extra_lines=()):
+        lines = []
+        with self._lock:
+            for name, (kind, description, _) in self.metrics.items():
+                lines.append('# HELP %s %s' % (name, description))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for labels, value in sorted(self._series[name].items()):
+                    samples = value.samples(name, labels) if kind == 'histogram' \
+                        else [('%s{%s}' % (name, _format_labels(labels)), value)]
+                    lines.extend('%s %s' % (sample, _format_number(number)) for sample, number in samples)
+        lines.extend(extra_lines)
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._series = {name: {} for name in self.metrics}
+
+
+registry = MetricsRegistry()
+
+
+def response_cache_lines(snapshot):
+    """
+    Takes a `response_cache_stats` snapshot, and returns it as Prometheus counter lines.
+    """
+    lines = ['# HELP btms_response_cache_requests_total Response cache lookups by view and result.',
+             '# TYPE btms_response_cache_requests_total counter']
+    for view_name, counters in sorted(snapshot['views'].items()):
+        for result, counter in (('hit', 'hits'), ('miss', 'misses')):
+            lines.append('btms_response_cache_requests_total{%s} %d'
+                         % (_format_labels((('view', view_name), ('result', result))), counters[counter]))
+    return lines
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Renders the Prometheus text exposition format; error details are rendered as a comment.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            data = '# %s\n' % (data.get('detail', data) if isinstance(data, dict) else data)
+        return data.encode(self.charset)
+
+
+class MetricsMiddleware:
+    """
+    Measures every request: total time, SQL count and time, and the phases recorded by the views. Sends them in a
+    `Server-Timing` header (unless `BTMS_SERVER_TIMING` is off) and rolls them into `registry`, labelled by URL
+    name. Keep it first in `MIDDLEWARE` so the other middleware is measured too.
+
+    Under ASGI the database runs in other threads, so the queries are counted by the async views with
+    `track_queries` instead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            # mark the instance as a coroutine function, as Django's MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        context_token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(context_token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        context_token = _current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(context_token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def finish(self, request, response, timings, total):
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.view_name if resolver_match else 'unmatched'
+        registry.record(route, request.method, response.status_code, total, timings)
+        if getattr(settings, 'BTMS_SERVER_TIMING', True):
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+    def process_template_response(self, request, response):
+        # called right before the response is rendered, the callback right after
+        render_started = time.perf_counter()
+        timings = _current_timings.get()
+        if timings is not None:
+            response.add_post_render_callback(
+                lambda rendered: timings.add('render', time.perf_counter() - render_started))
+        return response
+
+
+class TimedViewMixin:
+    """
+    Records the auth, permission, queryset and serialize phases of a view for `MetricsMiddleware`. `queryset` runs
+    from the end of `initial()` to the first `get_serializer()` (or `start_serialize()`) call, `serialize` from there
+    to the end of the handler; handlers that never build a serializer (cached responses, plain views) are recorded
+    as `handler`.
+    """
+    _handler_started = None
+    _serializer_started = None
+
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with phase('permission'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with phase('permission'):
+            super().check_object_permissions(request, obj)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._handler_started = time.perf_counter()
+
+    def start_serialize(self):
+        """
+        Ends the `queryset` phase and starts `serialize`, for handlers that serialize without `get_serializer()`.
+        """
+        if self._handler_started is not None and self._serializer_started is None:
+            self._serializer_started = time.perf_counter()
+            record_phase('queryset', self._serializer_started - self._handler_started)
+
+    def get_serializer(self, *args, **kwargs):
+        self.start_serialize()
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._serializer_started is not None:
+            record_phase('serialize', time.perf_counter() - self._serializer_started)
+        elif self._handler_started is not None:
+            record_phase('handler', time.perf_counter() - self._handler_started)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btms_api', '0003_model_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['round', 'date', 'time', 'id'], name='btms_match_round_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['date', 'time', 'id'], name='btms_match_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['team', 'average_score'], name='btms_player_team_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['average_score', 'id'], name='btms_player_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(fields=['round_no'], name='btms_round_no_idx'),
+        ),
+    ]
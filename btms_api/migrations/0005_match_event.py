@@ -0,0 +1,33 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btms_api', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('basket', 'Basket'), ('foul', 'Foul'), ('substitution', 'Substitution')], max_length=20)),
+                ('period', models.PositiveSmallIntegerField(default=1)),
+                ('points', models.PositiveSmallIntegerField(default=0)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='btms_api.match')),
+                ('player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='btms_api.player')),
+                ('substituted_player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='btms_api.player')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='btms_api.team')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='matchevent',
+            constraint=models.UniqueConstraint(fields=('match', 'sequence'), name='btms_match_event_sequence_unique'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btms_api', '0006_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['team', 'penalty_count'], name='btms_player_team_penalty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['team', 'number_of_games_played'], name='btms_player_team_games_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def seed_standings(apps, schema_editor):
+    # the standings are kept up to date from here on; compute them once for the matches already stored
+    from btms_api.standings import rebuild_standings
+    rebuild_standings(team_model=apps.get_model('btms_api', 'Team'), match_model=apps.get_model('btms_api', 'Match'),
+                      standing_model=apps.get_model('btms_api', 'TeamStanding'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('btms_api', '0007_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ModelVersion
+
+
+def bump_model_version(sender, **kwargs):
+    """
+    Increments the write version of the sender model. Connected to saves, deletes and bulk writes.
+    """
+    label = sender._meta.label_lower
+    now = timezone.now()
+    if ModelVersion.objects.filter(label=label).update(version=F('version') + 1, modified_at=now):
+        return
+    try:
+        with transaction.atomic():
+            ModelVersion.objects.create(label=label, version=1, modified_at=now)
+    except IntegrityError:
+        # created concurrently
+        ModelVersion.objects.filter(label=label).update(version=F('version') + 1, modified_at=now)
+
+
+def get_model_versions(models):
+    """
+    Takes model classes, and returns `{label: (version, modified_at)}` read with one query on the version table.
+    Models that were never written have version 0 and no modification time.
+    """
+    labels = [model._meta.label_lower for model in models]
+    versions = {label: (0, None) for label in labels}
+    for label, version, modified_at in ModelVersion.objects.filter(label__in=labels) \
+            .values_list('label', 'version', 'modified_at'):
+        versions[label] = (version, modified_at)
+    return versions
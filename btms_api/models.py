@@ -1,11 +1,38 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group
+from .signals import bulk_write
+
+
+class WriteTrackingQuerySet(models.QuerySet):
+    """
+    Sends `bulk_write` for the writes that bypass model signals, so caches keyed on model writes stay exact.
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            bulk_write.send(sender=self.model, instances=None)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            bulk_write.send(sender=self.model, instances=objs)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        rows = super().bulk_update(objs, *args, **kwargs)
+        if rows:
+            bulk_write.send(sender=self.model, instances=objs)
+        return rows
 
 
 class Team(models.Model):
     name = models.CharField(max_length=100)
     average_score = models.FloatField()
 
+    objects = WriteTrackingQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -14,6 +41,8 @@ class Coach(models.Model):
     name = models.CharField(max_length=255)
     team = models.ForeignKey(Team, on_delete=models.RESTRICT)
 
+    objects = WriteTrackingQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -33,6 +62,27 @@ class Player(models.Model):
     is_team_captain = models.BooleanField()
     team = models.ForeignKey(Team, on_delete=models.RESTRICT)
 
+    objects = WriteTrackingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # ?team= filtered by ?percentile= / ordered by average_score
+            models.Index(fields=['team', 'average_score'], name='btms_player_team_score_idx'),
+            # ?percentile= across all teams, ?ordering=average_score
+            models.Index(fields=['average_score', 'id'], name='btms_player_score_idx'),
+            # /leaderboards/: the top players of every team
+            models.Index(fields=['team', 'penalty_count'], name='btms_player_team_penalty_idx'),
+            models.Index(fields=['team', 'number_of_games_played'], name='btms_player_team_games_idx'),
+            # PlayerFilterSet: every filter leads an index, ordered by id within equal values
+            models.Index(fields=['position'], name='btms_player_position_idx'),
+            models.Index(fields=['age'], name='btms_player_age_idx'),
+            models.Index(fields=['number_of_games_played'], name='btms_player_games_idx'),
+            models.Index(fields=['penalty_count'], name='btms_player_penalty_idx'),
+            # ?is_team_captain=true, which Django writes as a bare column that only a partial index serves; the
+            # other players are most of the table, so PlayerFilterSet rejects ?is_team_captain=false
+            models.Index(fields=['team'], condition=models.Q(is_team_captain=True), name='btms_player_captain_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -42,6 +92,13 @@ class Round(models.Model):
     round_code = models.CharField(max_length=10)
     round_name = models.CharField(max_length=50)
 
+    objects = WriteTrackingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['round_no'], name='btms_round_no_idx'),
+        ]
+
     def __str__(self):
         return self.round_code
 
@@ -60,10 +117,84 @@ class Match(models.Model):
     host_team_final_score = models.IntegerField()
     guest_team_final_score = models.IntegerField()
 
+    objects = WriteTrackingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # ?round= ordered by (date, time, id)
+            models.Index(fields=['round', 'date', 'time', 'id'], name='btms_match_round_date_idx'),
+            # unfiltered lists ordered by (date, time, id)
+            models.Index(fields=['date', 'time', 'id'], name='btms_match_date_time_idx'),
+            # MatchFilterSet: ?venue=
+            models.Index(fields=['venue'], name='btms_match_venue_idx'),
+        ]
+
     def __str__(self):
         return self.match_no
 
 
+class MatchEvent(models.Model):
+    BASKET = 'basket'
+    FOUL = 'foul'
+    SUBSTITUTION = 'substitution'
+    KIND_CHOICES = [(BASKET, 'Basket'), (FOUL, 'Foul'), (SUBSTITUTION, 'Substitution')]
+
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='events')
+    # numbered by the scorer within the match, a resubmitted event is recognised by it
+    sequence = models.PositiveIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    period = models.PositiveSmallIntegerField(default=1)
+
+    team = models.ForeignKey(Team, on_delete=models.RESTRICT, related_name='+')
+    # the scorer, the player fouling, or the player coming in
+    player = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # the player going out
+    substituted_player = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='+')
+    points = models.PositiveSmallIntegerField(default=0)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WriteTrackingQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'sequence'], name='btms_match_event_sequence_unique'),
+        ]
+
+    def __str__(self):
+        return '%s #%d' % (self.match_id, self.sequence)
+
+
+class TeamStanding(models.Model):
+    # aggregate of the team's matches, maintained incrementally by btms_api.standings
+    team = models.OneToOneField(Team, on_delete=models.CASCADE, primary_key=True, related_name='standing')
+
+    played = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    points_for = models.IntegerField(default=0)
+    points_against = models.IntegerField(default=0)
+    point_differential = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-wins', '-point_differential', 'team'], name='btms_standing_rank_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.team_id)
+
+
+class ModelVersion(models.Model):
+    # write counter per model label, bumped by btms_api.model_versions on every save/delete
+    label = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    modified_at = models.DateTimeField()
+
+    def __str__(self):
+        return '%s@%d' % (self.label, self.version)
+
+
 class User(AbstractUser):
     groups = models.ForeignKey(Group, on_delete=models.CASCADE)
     email = models.EmailField(max_length=50, unique=True)
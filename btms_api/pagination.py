@@ -0,0 +1,150 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _keyset_filter(ordering, position):
+    """
+    Takes an ordering such as `('date', 'time', 'id')` and the values of a row for those fields, and returns a `Q`
+    matching every row that comes strictly after that row in the ordering.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{'%s__%s' % (name, lookup): value})
+        equal[name] = value
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a fixed set of unique orderings declared on the view as `keyset_orderings`,
+    e.g. `{'average_score': ('average_score', 'id')}`. Each page is fetched with a `WHERE <after cursor> ... LIMIT`
+    query, so its cost does not depend on how deep the client pages.
+
+    The response body stays a plain list; navigation is sent in an RFC 5988 `Link` header with `next` and
+    `previous` relations carrying an opaque `cursor` query param.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    default_orderings = {'id': ('id',)}
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_orderings(self, view):
+        return getattr(view, 'keyset_orderings', None) or self.default_orderings
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        orderings = self.get_orderings(view)
+
+        cursor = self.decode_cursor(request, queryset.model, orderings)
+        if cursor is None:
+            ordering_name = request.query_params.get(self.ordering_query_param) or next(iter(orderings))
+            if ordering_name not in orderings:
+                raise ValidationError({self.ordering_query_param: 'Ordering must be one of: %s'
+                                                                  % ', '.join(orderings)})
+            position, reverse = None, False
+        else:
+            ordering_name, position, reverse = cursor
+
+        self.ordering_name = ordering_name
+        self.ordering = orderings[ordering_name]
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+
+        if position is not None:
+            queryset = queryset.filter(_keyset_filter(ordering, position))
+        results = list(queryset.order_by(*ordering)[:self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_position(self, instance):
+        # pages of `values()` rows are dicts
+        if isinstance(instance, dict):
+            return [instance[field.lstrip('-')] for field in self.ordering]
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps([self.ordering_name, [_encode_value(value) for value in position], reverse],
+                             separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model, orderings):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            ordering_name, values, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            fields = orderings[ordering_name]
+            if len(values) != len(fields):
+                raise ValueError
+            position = [model._meta.get_field(field.lstrip('-')).to_python(value)
+                        for field, value in zip(fields, values)]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return ordering_name, position, bool(reverse)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+    def get_paginated_response(self, data):
+        links = []
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+        if next_link:
+            links.append('<%s>; rel="next"' % next_link)
+        if previous_link:
+            links.append('<%s>; rel="previous"' % previous_link)
+
+        headers = {'Link': ', '.join(links)} if links else None
+        return Response(data, headers=headers)
@@ -0,0 +1,46 @@
+import math
+
+
+def _lerp(a, b, t):
+    """
+    Linear interpolation between `a` and `b`, evaluated the same way as NumPy so results match bit for bit.
+    """
+    diff_b_a = b - a
+    if t >= 0.5:
+        return b - diff_b_a * (1 - t)
+    return a + diff_b_a * t
+
+
+def percentile_cutoff(queryset, field, percentile):
+    """
+    Takes a queryset, a numeric field name and a percentile in the range [0, 100], and returns the value of
+    `np.percentile(<all values of field>, percentile)` (linear method) computed with a count and an ordered offset
+    query instead of loading every value. Returns `None` if the queryset is empty.
+    """
+    quantile = float(percentile) / 100
+    if not 0 <= quantile <= 1:
+        raise ValueError('Percentiles must be in the range [0, 100]')
+
+    count = queryset.count()
+    if count == 0:
+        return None
+
+    ordered_values = queryset.order_by(field).values_list(field, flat=True)
+    virtual_index = (count - 1) * quantile
+    if virtual_index >= count - 1:
+        return ordered_values[count - 1]
+
+    previous_index = math.floor(virtual_index)
+    neighbours = list(ordered_values[previous_index:previous_index + 2])
+    return _lerp(neighbours[0], neighbours[1], virtual_index - previous_index)
+
+
+def filter_queryset_by_percentile(queryset, field, percentile):
+    """
+    Takes a queryset, a numeric field name and a percentile, and returns the rows whose value is at or above the
+    percentile cutoff.
+    """
+    cutoff = percentile_cutoff(queryset, field, percentile)
+    if cutoff is None:
+        return queryset
+    return queryset.filter(**{'%s__gte' % field: cutoff})
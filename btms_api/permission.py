@@ -1,19 +1,12 @@
-from django.contrib.auth.models import Group
 from rest_framework import permissions
+from .roles import get_request_role
 
 
-def _is_in_group(user, group_name):
+def _has_group_permission(request, required_groups):
     """
-    Takes a user and a group name, and returns `True` if the user is in that group.
+    Takes a request and a list of group names, and returns `True` if the requesting user is in one of those groups.
     """
-    try:
-        return Group.objects.get(name=group_name).user_set.filter(id=user.id).exists()
-    except Group.DoesNotExist:
-        return None
-
-
-def _has_group_permission(user, required_groups):
-    return any([_is_in_group(user, group_name) for group_name in required_groups])
+    return get_request_role(request) in required_groups
 
 
 class IsAdminUser(permissions.BasePermission):
@@ -21,11 +14,11 @@ class IsAdminUser(permissions.BasePermission):
     required_groups = ['admin']
 
     def has_permission(self, request, view):
-        has_group_permission = _has_group_permission(request.user, self.required_groups)
+        has_group_permission = _has_group_permission(request, self.required_groups)
         return request.user and has_group_permission
 
     def has_object_permission(self, request, view, obj):
-        has_group_permission = _has_group_permission(request.user, self.required_groups)
+        has_group_permission = _has_group_permission(request, self.required_groups)
         return request.user and has_group_permission
 
 
@@ -33,7 +26,7 @@ class IsAdminOrCoachUser(permissions.BasePermission):
     required_groups = ['admin', 'coach']
 
     def has_permission(self, request, view):
-        has_group_permission = _has_group_permission(request.user, self.required_groups)
+        has_group_permission = _has_group_permission(request, self.required_groups)
         return request.user and has_group_permission
 
 
@@ -41,5 +34,5 @@ class IsPlayerUser(permissions.BasePermission):
     required_groups = ['player']
 
     def has_permission(self, request, view):
-        has_group_permission = _has_group_permission(request.user, self.required_groups)
+        has_group_permission = _has_group_permission(request, self.required_groups)
         return request.user and has_group_permission
@@ -0,0 +1,168 @@
+import numpy as np
+from django.db import connections
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from .generations import bump_generation_on_write, get_generations, get_aggregate_cache
+from .models import Team, Player
+
+PLAYER_STATS_CACHE_KEY = 'btms_api:player_stats:%d'
+PLAYER_STATS_GENERATION = 'player_stats'
+
+# Player columns summarized, followed by the derived `bmi`
+STAT_FIELDS = ['average_score', 'height', 'weight', 'age', 'penalty_count']
+HISTOGRAM_BINS = 10
+QUARTILES = (0.25, 0.5, 0.75)
+
+# Rows fetched per database round trip while filling the array
+STATS_CHUNK_SIZE = 10000
+
+
+def invalidate_player_stats(**kwargs):
+    """
+    Moves the cached player statistics to a new generation. Connected to Team and Player writes.
+    """
+    bump_generation_on_write(get_aggregate_cache(), PLAYER_STATS_GENERATION)
+
+
+def load_player_columns():
+    """
+    Returns `(team_ids, values)`: the team of every player and a `(players, len(STAT_FIELDS) + 1)` float array of
+    `STAT_FIELDS` and BMI. The columns come from one query, cast to floats by the database so no `Decimal` is built,
+    and are fetched a chunk at a time straight into arrays, skipping the per-row work of the queryset iterator.
+    """
+    columns = ['team_id'] + STAT_FIELDS
+    queryset = Player.objects.order_by().values_list(*[Cast(F(field), FloatField()) for field in columns])
+    sql, params = queryset.query.sql_with_params()
+    chunks = [np.empty((0, len(columns)))]
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        for rows in iter(lambda: cursor.fetchmany(STATS_CHUNK_SIZE), []):
+            chunks.append(np.array(rows, dtype=np.float64))
+    array = np.concatenate(chunks)
+
+    team_ids = array[:, 0].astype(np.int64)
+    values = array[:, 1:]
+    # height in centimetres, weight in kilograms; BMI is left out (NaN) for a zero height
+    height = values[:, STAT_FIELDS.index('height')] / 100
+    bmi = np.divide(values[:, STAT_FIELDS.index('weight')], height * height,
+                    out=np.full(len(values), np.nan), where=height > 0)
+    return team_ids, np.column_stack([values, bmi])
+
+
+def _histogram_edges(values):
+    # the edges of np.histogram(column, bins=HISTOGRAM_BINS) for every column at once, NaNs left out: np.linspace
+    # over the range, widened by 0.5 when flat. A column without values gets the edges of 0, so it can still be binned
+    values = np.where(np.isnan(values).all(axis=0), 0, values)
+    low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+    flat = low == high
+    low, high = np.where(flat, low - 0.5, low), np.where(flat, high + 0.5, high)
+    return np.linspace(low, high, HISTOGRAM_BINS + 1)
+
+
+def grouped_statistics(team_ids, values):
+    """
+    Takes the team of every row and a `(rows, columns)` array, and returns `(teams, stats, edges)`: the sorted team
+    ids, a dict of `(teams, columns)` arrays (`count` of values, `mean`, `std`, `min`, `q1`, `median`, `q3`, `max`)
+    plus the `(teams, columns, HISTOGRAM_BINS)` `histogram` counts, and the `(HISTOGRAM_BINS + 1, columns)` histogram
+    edges shared by every team, NaN for a column without values. All teams and columns are computed together. NaNs
+    are left out; standard deviations are population ones and quantiles interpolate linearly, as NumPy does by
+    default.
+    """
+    teams, groups = np.unique(team_ids, return_inverse=True)
+    group_count, column_count = len(teams), values.shape[1]
+    sizes = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    missing = np.isnan(values)
+
+    # sort every column by value, then stably by team: each team is a contiguous sorted run, with its NaNs last.
+    # Two passes beat np.lexsort, and the team pass is a radix sort when the team index fits 16 bits
+    order = np.argsort(values, axis=0)
+    team_order = np.argsort(groups.astype(np.min_scalar_type(group_count))[order], axis=0, kind='stable')
+    order = np.take_along_axis(order, team_order, axis=0)
+    grouped = np.take_along_axis(values, order, axis=0)
+    grouped_missing = np.take_along_axis(missing, order, axis=0)
+    counts = np.add.reduceat(~grouped_missing, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(np.where(grouped_missing, 0, grouped), starts, axis=0) / counts
+        deviations = np.where(grouped_missing, 0, grouped - np.repeat(mean, sizes, axis=0))
+        std = np.sqrt(np.add.reduceat(deviations * deviations, starts, axis=0) / counts)
+
+    def at(positions):
+        # values at fractional positions of each team's sorted run, NaN for a team without values
+        below = np.floor(positions).astype(np.int64)
+        above = np.minimum(below + 1, starts[:, np.newaxis] + counts - 1)
+        low = np.take_along_axis(grouped, np.maximum(below, 0), axis=0)
+        high = np.take_along_axis(grouped, np.maximum(above, 0), axis=0)
+        return np.where(counts > 0, low + (high - low) * (positions - below), np.nan)
+
+    first = np.broadcast_to(starts[:, np.newaxis], counts.shape).astype(np.float64)
+    stats = {'players': sizes, 'count': counts, 'mean': mean, 'std': std, 'min': at(first),
+             'max': at(first + counts - 1)}
+    for name, quantile in zip(['q1', 'median', 'q3'], QUARTILES):
+        stats[name] = at(first + (counts - 1) * quantile)
+
+    edges = _histogram_edges(values)
+    present = np.where(missing, edges[0], values)
+    # np.histogram's binning: scale to a bin index, then correct it against the edges for rounding
+    bins = np.clip(np.floor((present - edges[0]) * (HISTOGRAM_BINS / (edges[-1] - edges[0]))).astype(np.int64),
+                   0, HISTOGRAM_BINS - 1)
+    bins -= present < np.take_along_axis(edges, bins, axis=0)
+    bins += (present >= np.take_along_axis(edges, bins + 1, axis=0)) & (bins != HISTOGRAM_BINS - 1)
+    cells = (groups[:, np.newaxis] * column_count + np.arange(column_count)) * HISTOGRAM_BINS + bins
+    stats['histogram'] = np.bincount(cells[~missing], minlength=group_count * column_count * HISTOGRAM_BINS) \
+        .reshape(group_count, column_count, HISTOGRAM_BINS)
+    return teams, stats, np.where(missing.all(axis=0), np.nan, edges)
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def build_player_stats():
+    """
+    Returns the per-team statistics of `STAT_FIELDS` and BMI, with the histogram bin edges of every field.
+    """
+    fields = STAT_FIELDS + ['bmi']
+    team_ids, values = load_player_columns()
+    if not len(values):
+        return {'fields': fields, 'bins': {}, 'teams': []}
+
+    teams, stats, edges = grouped_statistics(team_ids, values)
+    names = dict(Team.objects.filter(pk__in=teams.tolist()).values_list('id', 'name'))
+    return {
+        'fields': fields,
+        # a field without values, such as BMI when every height is 0, has no edges
+        'bins': {field: [_number(edge) for edge in edges[:, column]] for column, field in enumerate(fields)},
+        'teams': [
+            {
+                'team': int(team),
+                'team_name': names.get(int(team)),
+                'players': int(stats['players'][index]),
+                'stats': {
+                    field: {
+                        'count': int(stats['count'][index, column]),
+                        **{name: _number(stats[name][index, column])
+                           for name in ['mean', 'std', 'min', 'q1', 'median', 'q3', 'max']},
+                        'histogram': stats['histogram'][index, column].tolist(),
+                    }
+                    for column, field in enumerate(fields)
+                },
+            }
+            for index, team in enumerate(teams)
+        ],
+    }
+
+
+def get_player_stats():
+    """
+    Returns the player statistics from the cache, building them if a write has happened since they were cached or
+    they expired.
+    """
+    cache = get_aggregate_cache()
+    key = PLAYER_STATS_CACHE_KEY % get_generations(cache, [PLAYER_STATS_GENERATION])
+    player_stats = cache.get(key)
+    if player_stats is None:
+        player_stats = build_player_stats()
+        cache.set(key, player_stats)
+    return player_stats
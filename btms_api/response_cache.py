@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conditional import get_response_models
+from .generations import bump_generation_on_write, get_generations
+from .roles import get_request_role
+
+RESPONSE_CACHE_KEY = 'btms_api:response:%s'
+
+
+def get_response_cache():
+    """
+    Returns the Django cache holding cached responses, selected with the `BTMS_RESPONSE_CACHE_ALIAS` setting.
+    """
+    return caches[getattr(settings, 'BTMS_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def invalidate_responses(sender, **kwargs):
+    """
+    Invalidates every cached response built from the sender model. Connected to saves, deletes and bulk writes.
+    """
+    bump_generation_on_write(get_response_cache(), sender._meta.label_lower)
+
+
+class ResponseCacheStats:
+    """
+    Process-wide hit/miss counters per view.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, view_name, hit):
+        with self._lock:
+            self._counters[view_name]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            views = {name: dict(counters) for name, counters in self._counters.items()}
+        hits = sum(counters['hits'] for counters in views.values())
+        misses = sum(counters['misses'] for counters in views.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'views': views,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+class ResponseCacheMixin:
+    """
+    Read-through cache for list and detail responses, keyed by absolute URL (the cached `Link` header names the
+    scheme and host), accepted media type and role. Keys embed the write generation of every model the response is
+    built from, so a write to one of those models (through the API or the ORM) makes exactly the affected entries
+    unreachable. Eviction is left to the bounded cache backend (`MAX_ENTRIES`).
+    """
+    cached_headers = ['Link']
+
+    def get_response_cache_key(self, request):
+        labels = sorted(model._meta.label_lower for model in get_response_models(self))
+        generations = get_generations(get_response_cache(), labels)
+        key = '|'.join([request.build_absolute_uri(), request.accepted_media_type or '', str(get_request_role(request))]
+                       + ['%s:%s' % item for item in zip(labels, generations)])
+        return RESPONSE_CACHE_KEY % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        response_cache = get_response_cache()
+        key = self.get_response_cache_key(request)
+        view_name = self.basename if getattr(self, 'basename', None) else self.__class__.__name__
+
+        cached = response_cache.get(key)
+        if cached is not None:
+            response_cache_stats.record(view_name, hit=True)
+            data, headers = cached
+            return Response(data, headers=headers)
+
+        response_cache_stats.record(view_name, hit=False)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {header: response[header] for header in self.cached_headers if response.has_header(header)}
+            response_cache.set(key, (response.data, headers))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,73 @@
+import threading
+
+from django.contrib.auth.models import Group
+
+# Process-wide group name <-> id maps. Rebuilt lazily and dropped whenever a Group is saved or deleted.
+_group_maps = None
+_group_maps_lock = threading.Lock()
+
+_REQUEST_ROLE_ATTR = '_btms_role'
+
+
+def _load_group_maps():
+    name_to_id = dict(Group.objects.values_list('name', 'id'))
+    id_to_name = {group_id: name for name, group_id in name_to_id.items()}
+    return name_to_id, id_to_name
+
+
+def get_group_maps(refresh=False):
+    """
+    Returns the cached `(name -> id, id -> name)` group maps, loading them from the database if required.
+    """
+    global _group_maps
+    group_maps = _group_maps
+    if group_maps is None or refresh:
+        with _group_maps_lock:
+            group_maps = _load_group_maps()
+            _group_maps = group_maps
+    return group_maps
+
+
+def get_group_id(group_name):
+    """
+    Takes a group name, and returns its id or `None` if the group does not exist.
+    """
+    return get_group_maps()[0].get(group_name)
+
+
+def invalidate_group_maps(**kwargs):
+    """
+    Drops the cached group maps. Connected to Group save/delete signals.
+    """
+    global _group_maps
+    with _group_maps_lock:
+        _group_maps = None
+
+
+def resolve_role(user):
+    """
+    Takes a user, and returns the name of the group the user belongs to or `None` if it cannot be resolved.
+    """
+    group_id = getattr(user, 'groups_id', None)
+    if group_id is None:
+        return None
+
+    id_to_name = get_group_maps()[1]
+    if group_id not in id_to_name:
+        # group may have been created by another process since the maps were loaded
+        id_to_name = get_group_maps(refresh=True)[1]
+    return id_to_name.get(group_id)
+
+
+def get_request_role(request):
+    """
+    Takes a request, and returns the role of the requesting user. The role is resolved once and kept on the request.
+    """
+    try:
+        return getattr(request, _REQUEST_ROLE_ATTR)
+    except AttributeError:
+        pass
+
+    role = resolve_role(request.user)
+    setattr(request, _REQUEST_ROLE_ATTR, role)
+    return role
@@ -0,0 +1,12 @@
+import copy
+
+from rest_framework.routers import DefaultRouter
+
+
+class BulkRouter(DefaultRouter):
+    """
+    `DefaultRouter` that also maps `PATCH` on list routes to a viewset's `bulk_partial_update` action, when the
+    viewset defines one.
+    """
+    routes = copy.deepcopy(DefaultRouter.routes)
+    routes[0].mapping['patch'] = 'bulk_partial_update'
@@ -1,43 +1,215 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
-from .models import Team, Coach, Player, Round, Match, User
-
-
-class TeamSerializer(serializers.ModelSerializer):
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from .bulk import as_pk
+from .models import Team, Coach, Player, Round, Match, MatchEvent, User, TeamStanding
+
+EXPAND_QUERY_PARAM = 'expand'
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def get_expanded_fields(request, expandable_fields):
+    """
+    Takes a request and the expandable fields of a serializer, and returns the list of field names requested with
+    the `expand` query param. Expansion only applies to read requests.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return []
+
+    expand = request.query_params.get(EXPAND_QUERY_PARAM)
+    if not expand:
+        return []
+
+    fields = [field.strip() for field in expand.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in expandable_fields]
+    if unknown:
+        raise ValidationError({EXPAND_QUERY_PARAM: 'Cannot expand %s. Expandable fields are: %s'
+                                                   % (', '.join(unknown), ', '.join(expandable_fields))})
+    return fields
+
+
+def get_selected_fields(request, readable_fields):
+    """
+    Takes a request and the readable fields of a serializer, and returns the list of field names requested with the
+    `fields` query param, or None when every field is wanted. Field selection only applies to read requests.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+
+    selected = request.query_params.get(FIELDS_QUERY_PARAM)
+    if selected is None:
+        return None
+
+    fields = [field.strip() for field in selected.split(',') if field.strip()]
+    if not fields:
+        raise ValidationError({FIELDS_QUERY_PARAM: 'Select at least one of: %s' % ', '.join(readable_fields)})
+    unknown = [field for field in fields if field not in readable_fields]
+    if unknown:
+        raise ValidationError({FIELDS_QUERY_PARAM: 'Unknown field(s) %s. Fields are: %s'
+                                                   % (', '.join(unknown), ', '.join(readable_fields))})
+    return fields
+
+
+def get_field_columns(serializer):
+    """
+    Takes a model serializer, and returns `{field name: model field}` for its readable fields, or None if one of them
+    is not read straight from a column of the model (a method, a related attribute or the whole instance).
+    """
+    model = serializer.Meta.model
+    columns = {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        columns[name] = model_field
+    return columns
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves ids from the instances a bulk request preloaded into the context, and only queries on a miss.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded_related', {}).get(self.queryset.model)
+        if preloaded:
+            instance = preloaded.get(as_pk(data))
+            if instance is not None:
+                return instance
+        return super().to_internal_value(data)
+
+
+class ExpandableFieldsMixin:
+    """
+    Replaces foreign key ids with nested read only representations for the fields listed in `?expand=`.
+    `expandable_fields` maps a field name to the serializer class used to render it.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in get_expanded_fields(self.context.get('request'), self.expandable_fields):
+            self.fields[field] = self.expandable_fields[field](read_only=True)
+
+
+class SelectableFieldsMixin:
+    """
+    Keeps only the fields listed in `?fields=`. List it before `ExpandableFieldsMixin` in the bases, so fields are
+    expanded first and an expanded field that is not selected is dropped too.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        readable_fields = [name for name, field in self.fields.items() if not field.write_only]
+        selected = get_selected_fields(self.context.get('request'), readable_fields)
+        if selected is not None:
+            for name in set(readable_fields) - set(selected):
+                self.fields.pop(name)
+
+
+class TeamSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Team
         fields = '__all__'
 
 
-class CoachSerializer(serializers.ModelSerializer):
+class CoachSerializer(SelectableFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+    expandable_fields = {'team': TeamSerializer}
 
     class Meta:
         model = Coach
         fields = ['name', 'team']
 
 
-class PlayerSerializer(serializers.ModelSerializer):
+class PlayerSerializer(SelectableFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+    expandable_fields = {'team': TeamSerializer}
 
     class Meta:
         model = Player
         fields = '__all__'
 
 
-class RoundSerializer(serializers.ModelSerializer):
+class RoundSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Round
         fields = '__all__'
 
 
-class MatchSerializer(serializers.ModelSerializer):
+class MatchSerializer(SelectableFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+    expandable_fields = {
+        'round': RoundSerializer,
+        'host_team': TeamSerializer,
+        'guest_team': TeamSerializer,
+        'winner_team': TeamSerializer,
+    }
 
     class Meta:
         model = Match
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class MatchEventSerializer(serializers.ModelSerializer):
+    """
+    An event of the match in `context['match']`, checked against the teams of the match and the players of its team.
+    """
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        model = MatchEvent
+        fields = ['id', 'sequence', 'kind', 'period', 'team', 'player', 'substituted_player', 'points',
+                  'recorded_at']
+
+    def validate(self, data):
+        match = self.context['match']
+        team = data['team']
+        kind = data['kind']
+        points = data.get('points', 0)
+        player = data.get('player')
+        substituted_player = data.get('substituted_player')
+
+        errors = {}
+        if team.pk not in (match.host_team_id, match.guest_team_id):
+            errors['team'] = ['Team %d does not play in this match.' % team.pk]
+        for field, value in (('player', player), ('substituted_player', substituted_player)):
+            if value is not None and value.team_id != team.pk:
+                errors[field] = ['Player %d does not play for team %d.' % (value.pk, team.pk)]
+
+        if kind == MatchEvent.BASKET and not 1 <= points <= 3:
+            errors['points'] = ['A basket scores 1, 2 or 3 points.']
+        elif kind != MatchEvent.BASKET and points:
+            errors['points'] = ['Only baskets score points.']
+        if kind in (MatchEvent.FOUL, MatchEvent.SUBSTITUTION) and player is None:
+            errors['player'] = ['This field is required for a %s.' % kind]
+        if kind == MatchEvent.SUBSTITUTION and substituted_player is None:
+            errors['substituted_player'] = ['This field is required for a substitution.']
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+
+class TeamStandingSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    team_name = serializers.CharField(source='team.name', read_only=True)
+
+    class Meta:
+        model = TeamStanding
+        fields = ['team', 'team_name', 'played', 'wins', 'losses', 'points_for', 'points_against',
+                  'point_differential']
+
+
+class UserSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'first_name', 'last_name', 'username', 'password', 'groups', 'email')
         model = User
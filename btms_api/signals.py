@@ -0,0 +1,57 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
+
+# Sent by WriteTrackingQuerySet after update / bulk_create / bulk_update, which do not send post_save.
+# Arguments: sender (the model class), instances (the written instances, or None for update()).
+bulk_write = Signal()
+
+
+def revoke_deleted_token(sender, instance, **kwargs):
+    from .authentication import revoke_token
+    revoke_token(instance.key)
+
+
+def revoke_user_tokens(sender, instance, **kwargs):
+    from rest_framework.authtoken.models import Token
+    from .authentication import revoke_token
+    # covers deactivation and group changes; the cached user would otherwise be stale until the TTL expires
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        revoke_token(key)
+
+
+def connect_model_write_receiver(receiver, models, dispatch_uid):
+    """
+    Connects `receiver` to post_save, post_delete and bulk_write of every model in `models`.
+    """
+    for model in models:
+        uid = '%s.%s' % (dispatch_uid, model._meta.label_lower)
+        post_save.connect(receiver, sender=model, dispatch_uid=uid + '.saved')
+        post_delete.connect(receiver, sender=model, dispatch_uid=uid + '.deleted')
+        bulk_write.connect(receiver, sender=model, dispatch_uid=uid + '.bulk')
+
+
+def connect_signals():
+    # imported here: models.py imports this module for bulk_write
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Group
+    from rest_framework.authtoken.models import Token
+    from .bracket import invalidate_bracket
+    from .leaderboards import invalidate_leaderboards
+    from .model_versions import bump_model_version
+    from .player_stats import invalidate_player_stats
+    from .models import Team, Coach, Player, Round, Match
+    from .response_cache import invalidate_responses
+    from .roles import invalidate_group_maps
+
+    post_save.connect(invalidate_group_maps, sender=Group, dispatch_uid='btms_api.roles.group_saved')
+    post_delete.connect(invalidate_group_maps, sender=Group, dispatch_uid='btms_api.roles.group_deleted')
+    post_delete.connect(revoke_deleted_token, sender=Token, dispatch_uid='btms_api.authentication.token_deleted')
+    post_save.connect(revoke_user_tokens, sender=get_user_model(),
+                      dispatch_uid='btms_api.authentication.user_saved')
+    connect_model_write_receiver(invalidate_bracket, [Team, Round, Match], 'btms_api.bracket.invalidate')
+    connect_model_write_receiver(invalidate_player_stats, [Team, Player], 'btms_api.player_stats.invalidate')
+    connect_model_write_receiver(invalidate_leaderboards, [Team, Player], 'btms_api.leaderboards.invalidate')
+    connect_model_write_receiver(bump_model_version, [Team, Coach, Player, Round, Match],
+                                 'btms_api.model_versions.bump')
+    connect_model_write_receiver(invalidate_responses, [Team, Coach, Player, Round, Match],
+                                 'btms_api.response_cache.invalidate')
@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Team, Match, TeamStanding
+
+STANDING_FIELDS = ['played', 'wins', 'losses', 'points_for', 'points_against', 'point_differential']
+
+
+def _match_rows(match):
+    """
+    Takes a match, and returns one `(team_id, deltas)` pair for each of its two teams, where `deltas` follows
+    `STANDING_FIELDS`.
+    """
+    host_score = match.host_team_final_score
+    guest_score = match.guest_team_final_score
+    host_won = match.winner_team_id == match.host_team_id
+    guest_won = match.winner_team_id == match.guest_team_id
+    return [
+        (match.host_team_id, (1, int(host_won), int(not host_won), host_score, guest_score, host_score - guest_score)),
+        (match.guest_team_id,
+         (1, int(guest_won), int(not guest_won), guest_score, host_score, guest_score - host_score)),
+    ]
+
+
+def standing_deltas(added=(), removed=()):
+    """
+    Takes the matches being added to and removed from the standings, and returns `{team_id: [deltas]}` for every
+    team whose standing changes.
+    """
+    deltas = defaultdict(lambda: [0] * len(STANDING_FIELDS))
+    for sign, matches in ((1, added), (-1, removed)):
+        for match in matches:
+            for team_id, row in _match_rows(match):
+                team_deltas = deltas[team_id]
+                for index, value in enumerate(row):
+                    team_deltas[index] += sign * value
+    return {team_id: team_deltas for team_id, team_deltas in deltas.items() if any(team_deltas)}
+
+
+def update_standings(added=(), removed=()):
+    """
+    Applies matches being added and removed (an update is the previous match removed and the new one added) to the
+    stored standings, with one `UPDATE ... SET wins = wins + ?` per affected team.
+    """
+    with transaction.atomic():
+        for team_id, team_deltas in standing_deltas(added, removed).items():
+            changes = {field: F(field) + delta for field, delta in zip(STANDING_FIELDS, team_deltas) if delta}
+            if not TeamStanding.objects.filter(team_id=team_id).update(**changes):
+                TeamStanding.objects.create(team_id=team_id, **dict(zip(STANDING_FIELDS, team_deltas)))
+
+
+def rebuild_standings(batch_size=2000, team_model=Team, match_model=Match, standing_model=TeamStanding):
+    """
+    Recomputes every team's standing from scratch by scanning all matches, and returns the number of standings.
+    Data migrations pass their historical models.
+    """
+    match_fields = ['host_team_id', 'guest_team_id', 'winner_team_id', 'host_team_final_score',
+                    'guest_team_final_score']
+    totals = {team_id: [0] * len(STANDING_FIELDS) for team_id in team_model.objects.values_list('id', flat=True)}
+    for values in match_model.objects.values_list(*match_fields).iterator(chunk_size=batch_size):
+        match = match_model(**dict(zip(match_fields, values)))
+        for team_id, row in _match_rows(match):
+            team_totals = totals[team_id]
+            for index, value in enumerate(row):
+                team_totals[index] += value
+
+    with transaction.atomic():
+        standing_model.objects.all().delete()
+        standing_model.objects.bulk_create(
+            [standing_model(team_id=team_id, **dict(zip(STANDING_FIELDS, team_totals)))
+             for team_id, team_totals in totals.items()],
+            batch_size=batch_size)
+    return len(totals)
@@ -1,7 +1,45 @@
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Team, Coach, Round, Match, Player, User
+from rest_framework.test import APITestCase, APITransactionTestCase
+from .models import Team, Coach, Round, Match, MatchEvent, Player, User, TeamStanding
+from . import async_views
+from .live import Broadcaster, BrokerClient, LiveScoresApplication, serve_broker
+from .benchmark import percentile_of
+from .generations import get_aggregate_cache
+from .authentication import get_token_cache, token_digest, TokenCache
+from .backends.sqlite3.base import DatabaseWrapper as ProfileDatabaseWrapper
+from .match_events import EventWriter, apply_event_batches
+from .fast_list import RowConverter
+from .filters import PlayerFilterSet, MatchFilterSet, check_filter_indexes
+from .leaderboards import build_leaderboards
+from .metrics import registry as metrics_registry
+from .percentile import percentile_cutoff
+from .response_cache import response_cache_stats
+from .standings import rebuild_standings
+from django.apps import apps as django_apps
+from django.conf import settings
 from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, IntegrityError, OperationalError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from asgiref.testing import ApplicationCommunicator
+import asyncio
+import csv
+import io
+import json
+import numpy as np
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from importlib import import_module
+from unittest import mock
 
 
 class TeamAPITests(APITestCase):
@@ -431,3 +469,1927 @@ class PlayerAPITests(APITestCase):
         self.assertEqual(response.data['position'], 'Attack')
 
 
+class PermissionRoleTests(APITestCase):
+
+    def setUp(self):
+        admin_group = Group(name='admin')
+        admin_group.save()
+        coach_group = Group(name='coach')
+        coach_group.save()
+        admin = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com',
+                     groups=admin_group)
+        admin.save()
+        coach = User(first_name='Test', last_name='Coach', username='testcoach', email='coach@gmail.com',
+                     groups=coach_group)
+        coach.save()
+        team = Team(name='Team A', average_score=145.6)
+        team.save()
+
+    def testPermissionCheckRunsNoGroupQueries(self):
+        """
+        Ensure permission checks do not query groups once the group map is loaded.
+        """
+        user = User.objects.get(username='testuser')
+        self.client.force_authenticate(user=user)
+        self.client.get('/btms_api/players/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/btms_api/players/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def testCoachIsNotAdmin(self):
+        """
+        Ensure a coach can list players but cannot access admin only endpoints.
+        """
+        user = User.objects.get(username='testcoach')
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/btms_api/players/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def testGroupRenameInvalidatesRoles(self):
+        """
+        Ensure renaming a group is picked up by subsequent permission checks.
+        """
+        user = User.objects.get(username='testcoach')
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        Group.objects.filter(name='admin').delete()
+        group = Group.objects.get(name='coach')
+        group.name = 'admin'
+        group.save()
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PercentileTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team_1 = Team(name='Team A', average_score=145.6)
+        team_2 = Team(name='Team B', average_score=145.6)
+        team_1.save()
+        team_2.save()
+        rng = random.Random(7)
+        for i in range(37):
+            player = Player(name='Player %d' % i, position='Defence', age=27, number_of_games_played=3,
+                            penalty_count=2, height=176.80, weight=81.350,
+                            average_score=round(rng.uniform(10, 60), 2), is_team_captain=False,
+                            team=team_1 if i % 3 else team_2)
+            player.save()
+
+    def testCutoffMatchesNumpy(self):
+        """
+        Ensure the database percentile cutoff equals np.percentile for the same scores.
+        """
+        for queryset in [Player.objects.all(), Player.objects.filter(team__id=1), Player.objects.filter(team__id=2)]:
+            scores = list(queryset.values_list('average_score', flat=True))
+            for percentile in [0, 1, 12.5, 25, 33.3, 50, 66.7, 90, 99, 100]:
+                self.assertEqual(percentile_cutoff(queryset, 'average_score', percentile),
+                                 np.percentile(scores, percentile))
+
+    def testGetPlayerWithPercentileFilterAcrossTeams(self):
+        """
+        Ensure the percentile query param is applied across all teams when no team is given.
+        """
+        user = User.objects.get(username='testuser')
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/btms_api/players/?percentile=75')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cutoff = np.percentile(list(Player.objects.values_list('average_score', flat=True)), 75)
+        self.assertEqual(len(response.data), Player.objects.filter(average_score__gte=cutoff).count())
+
+    def testGetPlayerWithInvalidPercentile(self):
+        """
+        Ensure out of range percentiles are rejected.
+        """
+        user = User.objects.get(username='testuser')
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/btms_api/players/?team=1&percentile=101')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaginationTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team_1 = Team(name='Team A', average_score=145.6)
+        team_2 = Team(name='Team B', average_score=125.1)
+        team_1.save()
+        team_2.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        for i in range(11):
+            player = Player(name='Player %d' % i, position='Defence', age=27, number_of_games_played=3,
+                            penalty_count=2, height=176.80, weight=81.350, average_score=float(i % 4),
+                            is_team_captain=False, team=team_1 if i % 2 else team_2)
+            player.save()
+            match = Match(match_no=i, date='2022-03-0%d' % (i % 3 + 1), time='1%d:00:00' % (i % 2), venue='Stadium',
+                          host_team_final_score=120, guest_team_final_score=128, round=round_obj, host_team=team_1,
+                          guest_team=team_2, winner_team=team_2)
+            match.save()
+        self.client.force_authenticate(user=user)
+
+    def walk(self, url, rel='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            links = dict((name, link) for link, name in
+                         re.findall(r'<([^>]+)>; rel="(\w+)"', response.headers.get('Link', '')))
+            url = links.get(rel)
+        return pages
+
+    def testPlayersPagedByAverageScore(self):
+        """
+        Ensure walking the cursor pages returns every player once in (average_score, id) order.
+        """
+        pages = self.walk('/btms_api/players/?ordering=-average_score&page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        ids = [player['id'] for page in pages for player in page]
+        expected = list(Player.objects.order_by('-average_score', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def testPlayersPagedWithTeamFilter(self):
+        """
+        Ensure cursor pages keep the team filter.
+        """
+        pages = self.walk('/btms_api/players/?team=1&page_size=2')
+        players = [player for page in pages for player in page]
+        self.assertEqual(len(players), Player.objects.filter(team__id=1).count())
+        for player in players:
+            self.assertEqual(player['team'], 1)
+
+    def testMatchesPagedByDateAndTime(self):
+        """
+        Ensure matches are paged in (date, time, id) order and previous links walk back.
+        """
+        pages = self.walk('/btms_api/matches/?round=1&page_size=4')
+        ids = [match['id'] for page in pages for match in page]
+        expected = list(Match.objects.order_by('date', 'time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+        response = self.client.get('/btms_api/matches/?page_size=4')
+        next_url = re.search(r'<([^>]+)>; rel="next"', response.headers['Link']).group(1)
+        response = self.client.get(next_url)
+        previous_url = re.search(r'<([^>]+)>; rel="previous"', response.headers['Link']).group(1)
+        self.assertEqual([match['id'] for match in self.client.get(previous_url).data], expected[:4])
+
+    def testDeepPageQueryCount(self):
+        """
+        Ensure a deep page costs the same number of queries as the first.
+        """
+        pages = self.walk('/btms_api/players/?page_size=1')
+        self.assertEqual(len(pages), 11)
+        response = self.client.get('/btms_api/players/?page_size=1')
+        cursor_url = re.search(r'<([^>]+)>; rel="next"', response.headers['Link']).group(1)
+        with self.assertNumQueries(2):
+            self.client.get(cursor_url)
+
+    def testInvalidCursorAndOrdering(self):
+        """
+        Ensure invalid cursors and orderings are rejected.
+        """
+        response = self.client.get('/btms_api/players/?cursor=xyz')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/btms_api/players/?ordering=age')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExpandTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        team_1 = Team(name='Team A', average_score=145.6)
+        team_2 = Team(name='Team B', average_score=125.1)
+        team_1.save()
+        team_2.save()
+        coach = Coach(name='Coach A', team=team_1)
+        coach.save()
+        player = Player(name='Player A', position='Defence', age=27, number_of_games_played=3, penalty_count=2,
+                        height=176.80, weight=81.350, average_score=34.9, is_team_captain=True, team=team_1)
+        player.save()
+        self.client.force_authenticate(user=user)
+
+    def createMatches(self, count):
+        for i in range(count):
+            match = Match(match_no=i, date='2022-03-01', time='10:00:00', venue='Stadium A',
+                          host_team_final_score=120, guest_team_final_score=128, round_id=1, host_team_id=1,
+                          guest_team_id=2, winner_team_id=2)
+            match.save()
+
+    def testExpandMatches(self):
+        """
+        Ensure matches inline expanded relations with a fixed number of queries.
+        """
+        self.createMatches(2)
+        url = '/btms_api/matches/?expand=round,host_team,guest_team,winner_team'
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['round']['round_code'], 'QF')
+        self.assertEqual(response.data[0]['winner_team']['name'], 'Team B')
+
+        self.createMatches(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 7)
+
+    def testExpandMatchDetail(self):
+        """
+        Ensure detail routes honour expand and unexpanded fields stay ids.
+        """
+        self.createMatches(1)
+        response = self.client.get('/btms_api/matches/1/?expand=host_team')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['host_team']['name'], 'Team A')
+        self.assertEqual(response.data['guest_team'], 2)
+
+    def testExpandPlayerAndCoachTeam(self):
+        """
+        Ensure players and coaches can expand their team.
+        """
+        response = self.client.get('/btms_api/players/?expand=team')
+        self.assertEqual(response.data[0]['team']['name'], 'Team A')
+        response = self.client.get('/btms_api/coaches/1/?expand=team')
+        self.assertEqual(response.data['team']['name'], 'Team A')
+
+    def testExpandUnknownField(self):
+        """
+        Ensure unknown expand fields are rejected.
+        """
+        response = self.client.get('/btms_api/matches/?expand=venue')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FieldsTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        self.team_1 = Team(name='Team A', average_score=145.6)
+        self.team_2 = Team(name='Team B', average_score=125.1)
+        self.team_1.save()
+        self.team_2.save()
+        for index in range(3):
+            Player(name='Player %d' % index, position='Defence', age=27, number_of_games_played=3, penalty_count=2,
+                   height=176.80, weight=81.350, average_score=30 + index, is_team_captain=index == 0,
+                   team=self.team_1).save()
+        Match(match_no=1, date='2022-03-01', time='10:00:00', venue='Stadium A', host_team_final_score=120,
+              guest_team_final_score=128, round=round_obj, host_team=self.team_1, guest_team=self.team_2,
+              winner_team=self.team_2).save()
+        self.client.force_authenticate(user=user)
+
+    def testFieldsNarrowOutputAndSelect(self):
+        """
+        Ensure only the selected fields are rendered and their columns read.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/btms_api/players/?fields=name,average_score')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'name': 'Player %d' % index, 'average_score': 30 + index}
+                                         for index in range(3)])
+        select = [query['sql'] for query in queries.captured_queries if 'btms_api_player' in query['sql']][-1]
+        self.assertIn('"name"', select)
+        self.assertNotIn('"height"', select)
+
+        response = self.client.get('/btms_api/teams/%d/?fields=name' % self.team_1.id)
+        self.assertEqual(response.data, {'name': 'Team A'})
+
+    def testFieldsWithExpandAndPagination(self):
+        """
+        Ensure selected fields combine with expand and keyset pagination without extra queries.
+        """
+        response = self.client.get('/btms_api/matches/?fields=id,winner_team&expand=winner_team,host_team')
+        self.assertEqual(response.data, [{'id': 1, 'winner_team': {'id': self.team_2.id, 'name': 'Team B',
+                                                                   'average_score': 125.1}}])
+
+        url = '/btms_api/players/?fields=name&ordering=-average_score&page_size=2'
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual([player['name'] for player in response.data], ['Player 2', 'Player 1'])
+        response = self.client.get(re.search(r'<([^>]+)>; rel="next"', response.headers['Link']).group(1))
+        self.assertEqual(response.data, [{'name': 'Player 0'}])
+
+    def testUnknownFieldsRejected(self):
+        """
+        Ensure unknown, write only or empty field selections are rejected.
+        """
+        for url in ['/btms_api/players/?fields=name,salary', '/btms_api/users/?fields=password',
+                    '/btms_api/rounds/?fields=']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('fields', response.data)
+
+    def testWritesIgnoreFields(self):
+        """
+        Ensure writes render every field whatever the fields query param.
+        """
+        response = self.client.patch('/btms_api/teams/%d/?fields=name' % self.team_1.id, {'average_score': 150})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id', 'name', 'average_score'})
+
+
+class FastListTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        team_1 = Team(name='Team Ä', average_score=145.6)
+        team_2 = Team(name='Team B', average_score=125)
+        team_1.save()
+        team_2.save()
+        for index in range(5):
+            Player(name='Player \u2028%d' % index, position='Defence', age=27, number_of_games_played=3,
+                   penalty_count=index, height=176.8 + index / 3, weight=81.355, average_score=30 + index / 7,
+                   is_team_captain=index == 0, team=team_1 if index % 2 else team_2).save()
+            Match(match_no=index, date='2022-03-0%d' % (index + 1), time='10:%02d:00' % index, venue='Stadium A',
+                  host_team_final_score=120, guest_team_final_score=128, round=round_obj, host_team=team_1,
+                  guest_team=team_2, winner_team=team_2).save()
+        self.client.force_authenticate(user=user)
+
+    def assertSameResponse(self, url):
+        with override_settings(BTMS_FAST_LIST=False):
+            expected = self.client.get(url)
+        caches['responses'].clear()
+        with mock.patch('btms_api.fast_list.RowConverter.__call__', autospec=True,
+                        side_effect=RowConverter.__call__) as convert:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.headers.get('Link'), expected.headers.get('Link'))
+        return response, convert.called
+
+    def testListsIdentical(self):
+        """
+        Ensure list responses served from values() rows are byte for byte those of the serializers.
+        """
+        for url in ['/btms_api/players/', '/btms_api/matches/', '/btms_api/teams/', '/btms_api/rounds/',
+                    '/btms_api/coaches/', '/btms_api/users/', '/btms_api/players/?ordering=-average_score',
+                    '/btms_api/players/?page_size=2&fields=name,height', '/btms_api/matches/?fields=date,time']:
+            _, converted = self.assertSameResponse(url)
+            self.assertTrue(converted, url)
+
+    def testPagesIdentical(self):
+        """
+        Ensure cursors built from values() rows walk the same pages, the ordering field selected or not.
+        """
+        url = '/btms_api/players/?fields=name&ordering=-average_score&page_size=2'
+        for _ in range(3):
+            response, _ = self.assertSameResponse(url)
+            match = re.search(r'<([^>]+)>; rel="next"', response.headers.get('Link', ''))
+            if match is None:
+                break
+            url = match.group(1)
+        self.assertEqual(len(response.json()), 1)
+
+    def testSerializerFallback(self):
+        """
+        Ensure responses the converters cannot build, like expanded relations, are left to the serializers.
+        """
+        for url in ['/btms_api/players/?expand=team', '/btms_api/standings/']:
+            _, converted = self.assertSameResponse(url)
+            self.assertFalse(converted, url)
+
+
+class FilterTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        self.team_1 = Team(name='Team A', average_score=145.6)
+        self.team_2 = Team(name='Team B', average_score=125.1)
+        self.team_1.save()
+        self.team_2.save()
+        for index, (position, age) in enumerate([('Guard', 21), ('Center', 25), ('Forward', 29), ('Guard', 33)]):
+            Player(name='Player %d' % index, position=position, age=age, number_of_games_played=index * 2,
+                   penalty_count=index, height=176.80, weight=81.350, average_score=30 + index,
+                   is_team_captain=index == 1, team=self.team_1 if index % 2 else self.team_2).save()
+        for index, (date, venue) in enumerate([('2022-03-01', 'Stadium A'), ('2022-03-15', 'Stadium B'),
+                                               ('2022-04-02', 'Stadium A')]):
+            Match(match_no=index + 1, date=date, time='10:00:00', venue=venue, host_team_final_score=120,
+                  guest_team_final_score=128, round=round_obj, host_team=self.team_1, guest_team=self.team_2,
+                  winner_team=self.team_2).save()
+        self.client.force_authenticate(user=user)
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row.get('name', row.get('match_no')) for row in response.data]
+
+    def testFilterPlayers(self):
+        """
+        Ensure players are filtered by equality, in, range and boolean filters combined with AND.
+        """
+        self.assertEqual(self.names('/btms_api/players/?age__gte=25&position__in=Guard,Center'),
+                         ['Player 1', 'Player 3'])
+        self.assertEqual(self.names('/btms_api/players/?age__range=22,30&number_of_games_played__lt=4'),
+                         ['Player 1'])
+        self.assertEqual(self.names('/btms_api/players/?is_team_captain=true'), ['Player 1'])
+        self.assertEqual(self.names('/btms_api/players/?is_team_captain=1&team=%d' % self.team_1.id),
+                         ['Player 1'])
+        self.assertEqual(self.names('/btms_api/players/?position=Guard&penalty_count__gt=0&percentile=0'),
+                         ['Player 3'])
+        self.assertEqual(self.names('/btms_api/players/?position='), ['Player %d' % index for index in range(4)])
+
+    def testFilterMatchesAndExports(self):
+        """
+        Ensure matches are filtered by date range and venue, and exports are filtered like the lists.
+        """
+        self.assertEqual(self.names('/btms_api/matches/?date__range=2022-03-01,2022-03-31&venue=Stadium A'), [1])
+        self.assertEqual(self.names('/btms_api/matches/?date__gt=2022-03-01&winner_team__in=%d' % self.team_2.id),
+                         [2, 3])
+        response = self.client.get('/btms_api/export/players/?format=ndjson&age__lte=25')
+        self.assertEqual([json.loads(line)['name'] for line in b''.join(response.streaming_content).splitlines()],
+                         ['Player 0', 'Player 1'])
+
+    def testInvalidFiltersRejected(self):
+        """
+        Ensure unsupported fields and lookups and invalid values are rejected with a message per query param.
+        """
+        for url, param in [('/btms_api/players/?height__gte=170', 'height__gte'),
+                           ('/btms_api/players/?position__gte=Guard', 'position__gte'),
+                           ('/btms_api/players/?team__name=Team A', 'team__name'),
+                           ('/btms_api/players/?age__gte=old', 'age__gte'),
+                           ('/btms_api/players/?is_team_captain=maybe', 'is_team_captain'),
+                           ('/btms_api/players/?is_team_captain=false', 'is_team_captain'),
+                           ('/btms_api/players/?percentile=150', 'percentile'),
+                           ('/btms_api/players/?team__in=' + ','.join(['1'] * 101), 'team__in'),
+                           ('/btms_api/matches/?date__range=2022-03-01', 'date__range'),
+                           ('/btms_api/matches/?round=abc', 'round'),
+                           ('/btms_api/export/matches/?time=10:00', 'time')]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn(param, response.data, url)
+
+    def testFiltersUseIndexes(self):
+        """
+        Ensure every supported filter leads an index and is read through one.
+        """
+        self.assertEqual(check_filter_indexes(), [])
+        values = {'position': 'Guard', 'venue': 'Stadium A', 'date': '2022-03-01', 'is_team_captain': True}
+        for filterset in [PlayerFilterSet, MatchFilterSet]:
+            for name in filterset.filters:
+                plan = filterset.model.objects.filter(**{name: values.get(name, 1)}).explain()
+                self.assertIn('USING INDEX', plan, name)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        get_token_cache().clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team = Team(name='Team A', average_score=145.6)
+        team.save()
+        self.token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def testRepeatedTokenSkipsDatabase(self):
+        """
+        Ensure a cached token authenticates without querying Token and User.
+        """
+        response = self.client.get('/btms_api/players/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):
+            response = self.client.get('/btms_api/players/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def testLogoutRevokesToken(self):
+        """
+        Ensure a token stops working right after logout.
+        """
+        self.client.get('/btms_api/teams/')
+        response = self.client.get('/btms_api/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def testDeactivationRevokesToken(self):
+        """
+        Ensure a token stops working right after its user is deactivated.
+        """
+        self.client.get('/btms_api/teams/')
+        user = User.objects.get(username='testuser')
+        user.is_active = False
+        user.save()
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def testCacheIsBoundedAndExpires(self):
+        """
+        Ensure the least recently used entries are evicted and expired entries are dropped.
+        """
+        token_cache = TokenCache(max_entries=2, ttl=60)
+        for key in ['a', 'b', 'c']:
+            token_cache.set(token_digest(key), None, key)
+        self.assertIsNone(token_cache.get(token_digest('a')))
+        self.assertEqual(token_cache.get(token_digest('c'))[1], 'c')
+
+        token_cache = TokenCache(max_entries=2, ttl=0)
+        token_cache.set(token_digest('a'), None, 'a')
+        self.assertIsNone(token_cache.get(token_digest('a')))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def testSharedRevocation(self):
+        """
+        Ensure a revocation written to the shared cache is seen by other processes' local caches.
+        """
+        worker_1 = TokenCache(shared_cache_alias='default')
+        worker_2 = TokenCache(shared_cache_alias='default')
+        digest = token_digest(self.token.key)
+        worker_1.set(digest, None, self.token)
+        worker_2.set(digest, None, self.token)
+        worker_1.revoke(digest)
+        self.assertIsNone(worker_2.get(digest))
+
+
+class BulkAPITests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        for name in ['Team A', 'Team B']:
+            team = Team(name=name, average_score=145.6)
+            team.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        self.client.force_authenticate(user=user)
+
+    def player(self, index, team=1):
+        return {'name': 'Player %d' % index, 'position': 'Defence', 'age': 27, 'number_of_games_played': 3,
+                'penalty_count': 2, 'height': 176.80, 'weight': 81.350, 'average_score': 34.9,
+                'is_team_captain': False, 'team': team}
+
+    def testBulkCreatePlayers(self):
+        """
+        Ensure a list payload creates every player with a fixed number of queries.
+        """
+        self.client.get('/btms_api/players/')
+        players = [self.player(i, team=i % 2 + 1) for i in range(40)]
+        with self.assertNumQueries(8):
+            response = self.client.post('/btms_api/players/', players, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 40)
+        self.assertEqual(Player.objects.count(), 40)
+        self.assertEqual(Player.objects.filter(team__id=2).count(), 20)
+
+    def testBulkCreateReportsErrorsByIndex(self):
+        """
+        Ensure invalid items are reported by index and nothing is written.
+        """
+        players = [self.player(0), self.player(1, team=99), self.player(2)]
+        del players[2]['age']
+        response = self.client.post('/btms_api/players/', players, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('team', response.data['errors'][0]['errors'])
+        self.assertIn('age', response.data['errors'][1]['errors'])
+        self.assertEqual(Player.objects.count(), 0)
+
+    @override_settings(BTMS_BULK_MAX_ITEMS=2)
+    def testBulkCreateMaxItems(self):
+        """
+        Ensure payloads above the configured maximum are rejected.
+        """
+        response = self.client.post('/btms_api/teams/', [{'name': 'T', 'average_score': 1}] * 3, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Team.objects.count(), 2)
+
+    def testBulkPartialUpdateMatches(self):
+        """
+        Ensure a list payload partially updates matches in one request.
+        """
+        matches = [{'match_no': i, 'date': '2022-03-01', 'time': '10:00:00', 'venue': 'Stadium A',
+                    'host_team_final_score': 120, 'guest_team_final_score': 128, 'round': 1, 'host_team': 1,
+                    'guest_team': 2, 'winner_team': 2} for i in range(3)]
+        response = self.client.post('/btms_api/matches/', matches, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = [match['id'] for match in response.data]
+
+        updates = [{'id': ids[0], 'host_team_final_score': 130, 'winner_team': 1}, {'id': ids[2], 'venue': 'B'}]
+        response = self.client.patch('/btms_api/matches/', updates, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Match.objects.get(id=ids[0]).winner_team_id, 1)
+        self.assertEqual(Match.objects.get(id=ids[0]).host_team_final_score, 130)
+        self.assertEqual(Match.objects.get(id=ids[1]).venue, 'Stadium A')
+        self.assertEqual(Match.objects.get(id=ids[2]).venue, 'B')
+
+    def testBulkPartialUpdateUnknownId(self):
+        """
+        Ensure unknown and duplicate ids are reported by index.
+        """
+        response = self.client.patch('/btms_api/teams/', [{'id': 1, 'name': 'X'}, {'id': 1}, {'id': 50}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(Team.objects.get(id=1).name, 'Team A')
+
+
+class BenchmarkTests(APITestCase):
+
+    def testPercentileOfUsesNearestRank(self):
+        """
+        Ensure percentiles are the nearest-rank sample, the ceiling of p / 100 * n.
+        """
+        self.assertEqual(percentile_of(list(range(1, 21)), 95), 19)
+        self.assertEqual(percentile_of(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile_of(list(range(1, 11)), 50), 5)
+        self.assertEqual(percentile_of(list(range(10, 0, -1)), 100), 10)
+        self.assertEqual(percentile_of(list(range(1, 11)), 0), 1)
+        self.assertEqual(percentile_of([7], 50), 7)
+
+
+class GenerateDataTests(APITestCase):
+
+    def generate(self, **options):
+        call_command('generate_data', stdout=io.StringIO(), workers=1, **options)
+        return (list(Team.objects.order_by('id').values_list('name', 'average_score')),
+                list(Player.objects.order_by('id').values_list('name', 'team__name', 'average_score', 'height')),
+                list(Match.objects.order_by('id').values_list('round__round_code', 'host_team__name',
+                                                              'winner_team__name', 'date', 'time')))
+
+    def testGeneratesBracketForPowerOfTwoTeams(self):
+        """
+        Ensure the generated bracket has one round per halving and winners advance.
+        """
+        self.generate(teams=8, players_per_team=3, tournaments=2, seed=1)
+        self.assertEqual(Team.objects.count(), 8)
+        self.assertEqual(Coach.objects.count(), 8)
+        self.assertEqual(Player.objects.count(), 24)
+        self.assertEqual(Player.objects.filter(is_team_captain=True).count(), 8)
+        self.assertEqual(list(Round.objects.order_by('round_no').values_list('round_code', flat=True)),
+                         ['QF', 'SF', 'GF'])
+        self.assertEqual(Match.objects.count(), 14)
+        semi_final_teams = set(Match.objects.filter(round__round_code='SF').values_list('host_team', flat=True))
+        quarter_final_winners = set(Match.objects.filter(round__round_code='QF').values_list('winner_team', flat=True))
+        self.assertTrue(semi_final_teams <= quarter_final_winners)
+
+    def testSameSeedSameDataset(self):
+        """
+        Ensure the same seed generates the same dataset regardless of batch size.
+        """
+        first = self.generate(teams=4, players_per_team=5, seed=42, batch_size=3)
+        for model in [Match, Player, Coach, Round, Team]:
+            model.objects.all().delete()
+        second = self.generate(teams=4, players_per_team=5, seed=42)
+        self.assertEqual(first, second)
+
+    def testRejectsTeamCountNotPowerOfTwo(self):
+        """
+        Ensure team counts that cannot form a knockout bracket are rejected.
+        """
+        with self.assertRaises(CommandError):
+            call_command('generate_data', teams=12, workers=1)
+
+
+class StandingsAPITests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        round_obj = Round(round_no=1, round_code='SF', round_name='Semi Final')
+        round_obj.save()
+        for name in ['Team A', 'Team B', 'Team C']:
+            team = Team(name=name, average_score=145.6)
+            team.save()
+        self.client.force_authenticate(user=user)
+
+    def match(self, host, guest, winner, host_score, guest_score):
+        return {'match_no': 1, 'date': '2022-03-01', 'time': '10:00:00', 'venue': 'Stadium A',
+                'host_team_final_score': host_score, 'guest_team_final_score': guest_score, 'round': 1,
+                'host_team': host, 'guest_team': guest, 'winner_team': winner}
+
+    def standings(self):
+        return list(TeamStanding.objects.order_by('team').values_list(
+            'team', 'played', 'wins', 'losses', 'points_for', 'points_against', 'point_differential'))
+
+    def testStandingsFollowMatchWrites(self):
+        """
+        Ensure standings are updated incrementally on match create, update and delete.
+        """
+        self.client.post('/btms_api/matches/', self.match(1, 2, 1, 100, 90), format='json')
+        self.client.post('/btms_api/matches/', [self.match(2, 3, 3, 80, 85), self.match(1, 3, 1, 70, 60)],
+                         format='json')
+        response = self.client.get('/btms_api/standings/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['team_name'] for row in response.data], ['Team A', 'Team C', 'Team B'])
+        self.assertEqual(response.data[0]['wins'], 2)
+        self.assertEqual(response.data[0]['point_differential'], 20)
+
+        self.client.put('/btms_api/matches/1/', self.match(1, 2, 2, 90, 100), format='json')
+        self.client.patch('/btms_api/matches/', [{'id': 2, 'guest_team_final_score': 75, 'winner_team': 2}],
+                          format='json')
+        self.client.delete('/btms_api/matches/3/')
+        incremental = self.standings()
+        rebuild_standings()
+        self.assertEqual(self.standings(), incremental)
+        self.assertEqual(incremental[1], (2, 2, 2, 0, 180, 165, 15))
+
+    def testStandingsSingleQuery(self):
+        """
+        Ensure reading standings is a single query.
+        """
+        self.client.post('/btms_api/matches/', self.match(1, 2, 1, 100, 90), format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get('/btms_api/standings/')
+        self.assertEqual(len(response.data), 2)
+
+    def testMigrationSeedsStandings(self):
+        """
+        Ensure the data migration computes the standings of the matches stored before them.
+        """
+        self.client.post('/btms_api/matches/', [self.match(1, 2, 1, 100, 90), self.match(2, 3, 3, 80, 85)],
+                         format='json')
+        expected = self.standings()
+        TeamStanding.objects.all().delete()
+        import_module('btms_api.migrations.0008_seed_standings').seed_standings(django_apps, None)
+        self.assertEqual(self.standings(), expected)
+
+
+class BracketAPITests(APITestCase):
+
+    def setUp(self):
+        get_aggregate_cache().clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        call_command('generate_data', stdout=io.StringIO(), teams=8, players_per_team=1, seed=3, workers=1)
+        self.client.force_authenticate(user=user)
+
+    def testBracketTree(self):
+        """
+        Ensure the bracket is nested by round and every winner advances into its next match.
+        """
+        response = self.client.get('/btms_api/bracket/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rounds = response.data['rounds']
+        self.assertEqual([round_obj['round_code'] for round_obj in rounds], ['QF', 'SF', 'GF'])
+        self.assertEqual([len(round_obj['matches']) for round_obj in rounds], [4, 2, 1])
+
+        matches = {match['id']: match for round_obj in rounds for match in round_obj['matches']}
+        for round_obj in rounds[:-1]:
+            for match in round_obj['matches']:
+                next_match = matches[match['next_match']]
+                self.assertIn(match['winner_team']['id'],
+                              [next_match['host_team']['id'], next_match['guest_team']['id']])
+        self.assertIsNone(rounds[-1]['matches'][0]['next_match'])
+
+    def testBracketCachedUntilMatchWrite(self):
+        """
+        Ensure the bracket is served from the cache and rebuilt after a match write.
+        """
+        self.client.get('/btms_api/bracket/')
+        with self.assertNumQueries(0):
+            self.client.get('/btms_api/bracket/')
+
+        final = Match.objects.get(round__round_code='GF')
+        response = self.client.patch('/btms_api/matches/%d/' % final.id, {'venue': 'Center Court'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/bracket/')
+        self.assertEqual(response.data['rounds'][-1]['matches'][0]['venue'], 'Center Court')
+
+        response = self.client.patch('/btms_api/matches/', [{'id': final.id, 'venue': 'Arena'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/bracket/')
+        self.assertEqual(response.data['rounds'][-1]['matches'][0]['venue'], 'Arena')
+
+    def testBracketExpiresAfterMissedWrite(self):
+        """
+        Ensure a bracket cached by a worker that did not see a write is rebuilt once the cache timeout passes.
+        """
+        self.client.get('/btms_api/bracket/')
+        final = Match.objects.get(round__round_code='GF')
+        with connection.cursor() as cursor:
+            # a write made by another worker: this one's generation is not bumped
+            cursor.execute('UPDATE btms_api_match SET venue = %s WHERE id = %s', ['Arena', final.id])
+        response = self.client.get('/btms_api/bracket/')
+        self.assertNotEqual(response.data['rounds'][-1]['matches'][0]['venue'], 'Arena')
+
+        timeout = settings.CACHES[settings.BTMS_AGGREGATE_CACHE_ALIAS]['TIMEOUT']
+        with mock.patch('time.time', return_value=time.time() + timeout + 1):
+            response = self.client.get('/btms_api/bracket/')
+        self.assertEqual(response.data['rounds'][-1]['matches'][0]['venue'], 'Arena')
+
+
+class PlayerStatsTests(APITestCase):
+
+    def setUp(self):
+        get_aggregate_cache().clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        call_command('generate_data', stdout=io.StringIO(), teams=4, players_per_team=25, seed=5, workers=1)
+        self.client.force_authenticate(user=user)
+
+    def testStatsMatchNumPy(self):
+        """
+        Ensure the grouped statistics equal NumPy's, computed team by team.
+        """
+        response = self.client.get('/btms_api/players/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['fields'], ['average_score', 'height', 'weight', 'age', 'penalty_count', 'bmi'])
+        self.assertEqual([team['team'] for team in response.data['teams']],
+                         list(Team.objects.order_by('id').values_list('id', flat=True)))
+
+        for team in response.data['teams']:
+            players = Player.objects.filter(team=team['team'])
+            self.assertEqual(team['players'], players.count())
+            self.assertEqual(team['team_name'], Team.objects.get(pk=team['team']).name)
+            columns = {field: np.array([float(value) for value in players.values_list(field, flat=True)])
+                       for field in response.data['fields'][:-1]}
+            columns['bmi'] = columns['weight'] / (columns['height'] / 100) ** 2
+            for field, values in columns.items():
+                stats = team['stats'][field]
+                expected = [values.mean(), values.std(), values.min(), *np.percentile(values, [25, 50, 75]),
+                            values.max()]
+                np.testing.assert_allclose([stats[name] for name in ['mean', 'std', 'min', 'q1', 'median', 'q3',
+                                                                     'max']], expected, rtol=1e-12)
+        self.assertHistogramsMatchNumPy(response.data)
+
+    def assertHistogramsMatchNumPy(self, data):
+        # the edges are np.histogram's over all players, and every team is binned against them
+        players = Player.objects.order_by('id')
+        columns = {field: np.array([float(value) for value in players.values_list(field, flat=True)])
+                   for field in data['fields'][:-1]}
+        columns['bmi'] = columns['weight'] / (columns['height'] / 100) ** 2
+        teams = np.array(list(players.values_list('team', flat=True)))
+        for field, values in columns.items():
+            histogram, edges = np.histogram(values, bins=10)
+            self.assertEqual(data['bins'][field], edges.tolist())
+            self.assertEqual(np.sum([team['stats'][field]['histogram'] for team in data['teams']], axis=0).tolist(),
+                             histogram.tolist())
+            for team in data['teams']:
+                team_histogram, _ = np.histogram(values[teams == team['team']], bins=edges)
+                self.assertEqual(team['stats'][field]['histogram'], team_histogram.tolist())
+
+    def testStatsCachedUntilPlayerWrite(self):
+        """
+        Ensure the statistics are served from the cache and rebuilt after a player write.
+        """
+        self.client.get('/btms_api/players/stats/')
+        with self.assertNumQueries(0):
+            self.client.get('/btms_api/players/stats/')
+
+        player = Player.objects.order_by('id').first()
+        response = self.client.patch('/btms_api/players/', [{'id': player.id, 'age': 200}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/players/stats/')
+        team = next(team for team in response.data['teams'] if team['team'] == player.team_id)
+        self.assertEqual(team['stats']['age']['max'], 200)
+
+    def testStatsHistogramOnEdges(self):
+        """
+        Ensure values falling on the bin edges are counted in the same bins as NumPy's.
+        """
+        for index, player in enumerate(Player.objects.order_by('id')):
+            player.age = 10 + index % 71
+            player.save()
+        response = self.client.get('/btms_api/players/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bins']['age'], [10.0, 17.0, 24.0, 31.0, 38.0, 45.0, 52.0, 59.0, 66.0, 73.0,
+                                                        80.0])
+        self.assertHistogramsMatchNumPy(response.data)
+
+    def testStatsWithoutValues(self):
+        """
+        Ensure a field without any value, BMI when every height is 0, is rendered with empty statistics.
+        """
+        Player.objects.update(height=0)
+        response = self.client.get('/btms_api/players/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bins']['bmi'], [None] * 11)
+        for team in response.data['teams']:
+            self.assertEqual(team['stats']['bmi']['count'], 0)
+            self.assertIsNone(team['stats']['bmi']['mean'])
+            self.assertEqual(team['stats']['bmi']['histogram'], [0] * 10)
+
+    def testStatsForbiddenForOtherRoles(self):
+        """
+        Ensure users outside the admin and coach groups cannot read the statistics.
+        """
+        group = Group(name='player')
+        group.save()
+        user = User(first_name='Test', last_name='Player', username='testplayer', email='player@gmail.com',
+                    groups=group)
+        user.save()
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/btms_api/players/stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class LeaderboardTests(APITestCase):
+
+    def setUp(self):
+        get_aggregate_cache().clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        call_command('generate_data', stdout=io.StringIO(), teams=4, players_per_team=25, seed=5, workers=1)
+        self.client.force_authenticate(user=user)
+
+    def expected(self, players, field, limit):
+        descending = field != 'penalty_count'
+        ranked = sorted(players, key=lambda player: (-getattr(player, field) if descending else getattr(player, field),
+                                                     player.id))
+        return [(player.id, getattr(player, field)) for player in ranked[:limit]]
+
+    def testLeaderboardsMatchSorting(self):
+        """
+        Ensure the overall and per team leaderboards equal the players sorted in Python, built in one query.
+        """
+        with self.assertNumQueries(1):
+            build_leaderboards(3)
+
+        response = self.client.get('/btms_api/leaderboards/?limit=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        players = list(Player.objects.all())
+        self.assertEqual([team['team'] for team in response.data['teams']],
+                         list(Team.objects.order_by('id').values_list('id', flat=True)))
+        for field in ['average_score', 'penalty_count', 'number_of_games_played']:
+            board = response.data['overall'][field]
+            self.assertEqual([entry['rank'] for entry in board], [1, 2, 3])
+            self.assertEqual([(entry['id'], entry[field]) for entry in board], self.expected(players, field, 3))
+            for team in response.data['teams']:
+                self.assertEqual([(entry['id'], entry[field]) for entry in team[field]],
+                                 self.expected([player for player in players if player.team_id == team['team']],
+                                               field, 3))
+
+    def testSingleLeaderboardAndTeam(self):
+        """
+        Ensure one leaderboard can be read for one team, and invalid leaderboards, limits and teams are rejected.
+        """
+        team = Team.objects.order_by('id').last()
+        response = self.client.get('/btms_api/leaderboards/penalty_count/?team=%d' % team.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['overall']), 10)
+        self.assertEqual(response.data['teams'], [{
+            'team': team.id, 'name': team.name,
+            'penalty_count': self.client.get('/btms_api/leaderboards/').data['teams'][-1]['penalty_count']}])
+
+        self.assertEqual(self.client.get('/btms_api/leaderboards/height/').status_code, status.HTTP_404_NOT_FOUND)
+        for query in ['limit=0', 'limit=101', 'limit=ten', 'team=first']:
+            response = self.client.get('/btms_api/leaderboards/?%s' % query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+    def testLeaderboardsCachedUntilPlayerWrite(self):
+        """
+        Ensure the leaderboards are served from the cache and rebuilt after a player write.
+        """
+        self.client.get('/btms_api/leaderboards/')
+        with self.assertNumQueries(0):
+            self.client.get('/btms_api/leaderboards/average_score/')
+
+        player = Player.objects.order_by('average_score').first()
+        response = self.client.patch('/btms_api/players/', [{'id': player.id, 'average_score': 1000}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/btms_api/leaderboards/average_score/')
+        self.assertEqual(response.data['overall'][0]['id'], player.id)
+        team = next(team for team in response.data['teams'] if team['team'] == player.team_id)
+        self.assertEqual(team['average_score'][0], {'rank': 1, 'id': player.id, 'name': player.name,
+                                                    'position': player.position, 'team': player.team_id,
+                                                    'average_score': 1000})
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team = Team(name='Team A', average_score=145.6)
+        team.save()
+        self.client.force_authenticate(user=user)
+
+    def testNotModified(self):
+        """
+        Ensure a matching If-None-Match is answered with 304 without querying the team table.
+        """
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/btms_api/teams/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/btms_api/teams/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def testWritesChangeETag(self):
+        """
+        Ensure saves and deletes change the ETag of list and detail responses.
+        """
+        list_etag = self.client.get('/btms_api/teams/')['ETag']
+        detail_etag = self.client.get('/btms_api/teams/1/')['ETag']
+        self.assertNotEqual(list_etag, detail_etag)
+
+        self.client.post('/btms_api/teams/', {'name': 'Team B', 'average_score': 100.5}, format='json')
+        response = self.client.get('/btms_api/teams/', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+        detail_etag = self.client.get('/btms_api/teams/1/')['ETag']
+        Team.objects.get(id=2).delete()
+        response = self.client.get('/btms_api/teams/1/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def testExpandedModelsInETag(self):
+        """
+        Ensure expanded relations contribute to the ETag.
+        """
+        player = Player(name='Player A', position='Defence', age=27, number_of_games_played=3, penalty_count=2,
+                        height=176.80, weight=81.350, average_score=34.9, is_team_captain=True, team_id=1)
+        player.save()
+        etag = self.client.get('/btms_api/players/?expand=team')['ETag']
+        plain_etag = self.client.get('/btms_api/players/')['ETag']
+        self.client.put('/btms_api/teams/1/', {'name': 'Team Z', 'average_score': 1}, format='json')
+        response = self.client.get('/btms_api/players/?expand=team', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['team']['name'], 'Team Z')
+        response = self.client.get('/btms_api/players/', HTTP_IF_NONE_MATCH=plain_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        caches['responses'].clear()
+        response_cache_stats.reset()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team = Team(name='Team A', average_score=145.6)
+        team.save()
+        coach = Coach(name='Coach A', team=team)
+        coach.save()
+        round_obj = Round(round_no=1, round_code='QF', round_name='Quater Final')
+        round_obj.save()
+        self.client.force_authenticate(user=user)
+
+    def testCachedUntilWrite(self):
+        """
+        Ensure repeated reads are served from the cache until an ORM write to the model.
+        """
+        self.client.get('/btms_api/teams/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.data[0]['name'], 'Team A')
+
+        Team.objects.filter(id=1).update(name='Team B')
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.data[0]['name'], 'Team B')
+        team = Team.objects.get(id=1)
+        team.name = 'Team C'
+        team.save()
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.data[0]['name'], 'Team C')
+
+        stats = self.client.get('/btms_api/cache-stats/').data
+        self.assertEqual(stats['views']['teams'], {'hits': 1, 'misses': 3})
+
+    def testInvalidationIsPerModel(self):
+        """
+        Ensure a write only invalidates responses built from the written model.
+        """
+        self.client.get('/btms_api/rounds/')
+        self.client.get('/btms_api/coaches/')
+        self.client.get('/btms_api/coaches/?expand=team')
+        self.client.post('/btms_api/teams/', {'name': 'Team C', 'average_score': 100.5}, format='json')
+        response_cache_stats.reset()
+
+        self.client.get('/btms_api/rounds/')
+        self.client.get('/btms_api/coaches/')
+        self.client.get('/btms_api/coaches/?expand=team')
+        stats = response_cache_stats.snapshot()['views']
+        self.assertEqual(stats['rounds'], {'hits': 1, 'misses': 0})
+        self.assertEqual(stats['coaches'], {'hits': 1, 'misses': 1})
+
+    def testKeyedByRole(self):
+        """
+        Ensure a response cached for one role is not served to another.
+        """
+        self.client.get('/btms_api/teams/')
+        coach_group = Group(name='coach')
+        coach_group.save()
+        coach = User(first_name='Test', last_name='Coach', username='testcoach', email='coach@gmail.com',
+                     groups=coach_group)
+        coach.save()
+        self.client.force_authenticate(user=coach)
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+    def testKeyedByHost(self):
+        """
+        Ensure responses are cached per scheme and host, as a cached Link header is an absolute URL.
+        """
+        for host, secure in [('a.example', False), ('b.example', False), ('a.example', True), ('a.example', False)]:
+            response = self.client.get('/btms_api/teams/', HTTP_HOST=host, secure=secure)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_cache_stats.snapshot()['views']['teams'], {'hits': 1, 'misses': 3})
+
+    def testFileBasedBackend(self):
+        """
+        Ensure the response cache works with the file based backend.
+        """
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+                       'OPTIONS': {'MAX_ENTRIES': 10}}
+            with override_settings(CACHES={'default': backend, 'responses': backend}):
+                self.client.get('/btms_api/teams/1/')
+                with self.assertNumQueries(1):
+                    response = self.client.get('/btms_api/teams/1/')
+                self.assertEqual(response.data['name'], 'Team A')
+
+
+class QueryIndexTests(APITestCase):
+    def testIndexesCreated(self):
+        """
+        Ensure the query indexes are created by the migrations.
+        """
+        expected = {
+            'btms_api_player': {'btms_player_team_score_idx': ['team_id', 'average_score'],
+                                'btms_player_score_idx': ['average_score', 'id']},
+            'btms_api_round': {'btms_round_no_idx': ['round_no']},
+            'btms_api_match': {'btms_match_round_date_idx': ['round_id', 'date', 'time', 'id'],
+                               'btms_match_date_time_idx': ['date', 'time', 'id']},
+        }
+        with connection.cursor() as cursor:
+            for table, indexes in expected.items():
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for name, columns in indexes.items():
+                    self.assertIn(name, constraints)
+                    self.assertEqual(constraints[name]['columns'], columns)
+
+    def testPlayerPercentileUsesIndex(self):
+        """
+        Ensure the team percentile filter is answered from the (team, average_score) index.
+        """
+        team = Team.objects.create(name='Team A', average_score=100)
+        queryset = Player.objects.filter(team__id=team.id, average_score__gte=150).order_by('average_score')
+        self.assertIn('btms_player_team_score_idx', queryset.explain())
+
+
+class MetricsTests(APITestCase):
+
+    def setUp(self):
+        caches['responses'].clear()
+        metrics_registry.reset()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        team = Team(name='Team A', average_score=145.6)
+        team.save()
+        player = Player(name='Player A', position='guard', age=20, number_of_games_played=1, penalty_count=0,
+                        height=180, weight=80, average_score=150, is_team_captain=True, team=team)
+        player.save()
+        self.client.force_authenticate(user=user)
+
+    def testServerTimingHeader(self):
+        """
+        Ensure every phase of a list request, the SQL count and the total are sent in the Server-Timing header.
+        """
+        response = self.client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['auth', 'permission', 'queryset', 'serialize', 'render', 'sql', 'total'])
+        self.assertRegex(response['Server-Timing'], r'sql;dur=[\d.]+;desc="\d+ queries"')
+
+    def testPercentilePhase(self):
+        """
+        Ensure the percentile filter is timed as its own phase.
+        """
+        response = self.client.get('/btms_api/players/?percentile=50')
+        self.assertIn('percentile;dur=', response['Server-Timing'])
+
+    @override_settings(BTMS_SERVER_TIMING=False)
+    def testServerTimingDisabled(self):
+        """
+        Ensure the Server-Timing header can be turned off while metrics are still recorded.
+        """
+        response = self.client.get('/btms_api/teams/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('route="teams-list"', metrics_registry.render())
+
+    def testMetricsEndpoint(self):
+        """
+        Ensure per-route histograms are served in the Prometheus text format.
+        """
+        self.client.get('/btms_api/teams/')
+        self.client.get('/btms_api/teams/')
+        response = self.client.get('/btms_api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode('utf-8')
+        self.assertIn('# TYPE btms_http_request_duration_seconds histogram', body)
+        self.assertIn('btms_http_request_duration_seconds_count{route="teams-list",method="GET"} 2', body)
+        self.assertIn('btms_http_request_duration_seconds_bucket{route="teams-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('btms_http_responses_total{route="teams-list",method="GET",status="200"} 2', body)
+        # the second request is a response cache hit, which never builds a serializer
+        self.assertIn('btms_http_request_phase_seconds_count{route="teams-list",method="GET",phase="serialize"} 1',
+                      body)
+        self.assertIn('btms_http_request_phase_seconds_count{route="teams-list",method="GET",phase="handler"} 1', body)
+        self.assertIn('btms_response_cache_requests_total{view="teams",result="hit"}', body)
+
+    def testMetricsEndpointRequiresAdmin(self):
+        """
+        Ensure only admins can read the metrics.
+        """
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/btms_api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        self.team = Team(name='Team A', average_score=145.6)
+        self.team.save()
+        other_team = Team(name='Team B', average_score=120.5)
+        other_team.save()
+        for index, team in enumerate([self.team, self.team, other_team]):
+            Player(name='Player %d' % index, position='guard', age=20 + index, number_of_games_played=1,
+                   penalty_count=0, height=180.5, weight=80.25, average_score=100 + index * 10,
+                   is_team_captain=index == 0, team=team).save()
+        self.rounds = [Round(round_no=1, round_code='SF', round_name='Semi Finals'),
+                       Round(round_no=2, round_code='GF', round_name='Grand Final')]
+        for round_obj in self.rounds:
+            round_obj.save()
+            Match(match_no=round_obj.round_no, date='2022-03-0%d' % round_obj.round_no, time='10:30',
+                  venue='Arena', round=round_obj, host_team=self.team, guest_team=other_team,
+                  winner_team=self.team, host_team_final_score=80, guest_team_final_score=70).save()
+        self.client.force_authenticate(user=user)
+
+    def testPlayersCSV(self):
+        """
+        Ensure players are streamed as CSV, filtered by team.
+        """
+        response = self.client.get('/btms_api/export/players/?team=%d' % self.team.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="players.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'name', 'position', 'age', 'number_of_games_played', 'penalty_count',
+                                   'height', 'weight', 'average_score', 'is_team_captain', 'team'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Player 0', 'Player 1'])
+
+    def testPlayersNDJSONMatchesAPI(self):
+        """
+        Ensure NDJSON rows have the same representation as the players API.
+        """
+        response = self.client.get('/btms_api/export/players/?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.client.get('/btms_api/players/').json())
+
+    def testMatchesNDJSONMatchesAPI(self):
+        """
+        Ensure matches are streamed filtered by round, with the same representation as the matches API.
+        """
+        path = '?round=%d' % self.rounds[1].id
+        response = self.client.get('/btms_api/export/matches/%s&format=ndjson' % path)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.client.get('/btms_api/matches/%s' % path).json())
+        self.assertEqual(len(lines), 1)
+
+    def testConstantQueries(self):
+        """
+        Ensure the export is read with one query whatever the number of rows.
+        """
+        # loads the group maps
+        b''.join(self.client.get('/btms_api/export/players/').streaming_content)
+        with self.assertNumQueries(1):
+            response = self.client.get('/btms_api/export/players/')
+            b''.join(response.streaming_content)
+
+    def testInvalidFilter(self):
+        """
+        Ensure an invalid filter is reported in the requested format.
+        """
+        response = self.client.get('/btms_api/export/matches/?round=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+    def testPermissions(self):
+        """
+        Ensure only admins and coaches can export.
+        """
+        player_group = Group(name='player')
+        player_group.save()
+        player_user = User(first_name='Test', last_name='Player', username='testplayer', email='player@gmail.com',
+                           groups=player_group)
+        player_user.save()
+        self.client.force_authenticate(user=player_user)
+        response = self.client.get('/btms_api/export/players/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/btms_api/export/matches/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ImportTests(APITestCase):
+    header = 'name,position,age,number_of_games_played,penalty_count,height,weight,average_score,is_team_captain,team\n'
+
+    def setUp(self):
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        self.team = Team(name='Team A', average_score=145.6)
+        self.team.save()
+        self.other_team = Team(name='Team B', average_score=120.5)
+        self.other_team.save()
+        Round(round_no=1, round_code='GF', round_name='Grand Final').save()
+        self.client.force_authenticate(user=user)
+
+    def player_row(self, name, team, age=20):
+        return '%s,guard,%s,1,0,180.50,80.25,101.50,False,%s\n' % (name, age, team)
+
+    def upload(self, kind, name, content):
+        return self.client.post('/btms_api/import/%s/' % kind,
+                                {'file': SimpleUploadedFile(name, content.encode('utf-8'))}, format='multipart')
+
+    def testImportPlayersCSV(self):
+        """
+        Ensure players are imported from CSV, with teams referenced by id or by name.
+        """
+        content = self.header + self.player_row('Player 1', self.team.id) + self.player_row('Player 2', 'Team B')
+        response = self.upload('players', 'players.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'rows': 2, 'created': 2, 'updated': 0, 'failed': 0, 'errors': []})
+        self.assertEqual(list(Player.objects.order_by('name').values_list('name', 'team')),
+                         [('Player 1', self.team.id), ('Player 2', self.other_team.id)])
+
+    def testImportReportsRowErrors(self):
+        """
+        Ensure invalid rows are reported by row number while the valid rows are imported.
+        """
+        rows = [{'name': 'Player 1', 'position': 'guard', 'age': 20, 'number_of_games_played': 1,
+                 'penalty_count': 0, 'height': '180.50', 'weight': '80.25', 'average_score': '101.50',
+                 'is_team_captain': False, 'team': 'Team A'}]
+        rows.append(dict(rows[0], name='Player 2', team='Team C'))
+        rows.append(dict(rows[0], name='Player 3', age='old'))
+        content = '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+        response = self.upload('players', 'players.ndjson', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        self.assertEqual([(error['row'], sorted(error['errors'])) for error in response.data['errors']],
+                         [(2, ['team']), (3, ['age']), (4, ['non_field_errors'])])
+        self.assertEqual(list(Player.objects.values_list('name', flat=True)), ['Player 1'])
+
+    def testReimportExportUpdatesById(self):
+        """
+        Ensure importing an export updates the exported players instead of duplicating them.
+        """
+        self.upload('players', 'players.csv', self.header + self.player_row('Player 1', 'Team A'))
+        exported = b''.join(self.client.get('/btms_api/export/players/').streaming_content).decode('utf-8')
+        response = self.upload('players', 'players.csv', exported.replace('Player 1', 'Player One'))
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        self.assertEqual(list(Player.objects.values_list('name', flat=True)), ['Player One'])
+
+    def testImportMatchesUpdatesStandings(self):
+        """
+        Ensure imported matches resolve rounds by code and update the standings.
+        """
+        content = 'match_no,date,time,venue,host_team_final_score,guest_team_final_score,round,host_team,' \
+                  'guest_team,winner_team\n1,2022-03-01,10:30,Arena,80,70,GF,Team A,Team B,Team A\n'
+        response = self.upload('matches', 'matches.csv', content)
+        self.assertEqual(response.data['created'], 1)
+        standing = TeamStanding.objects.get(team=self.team)
+        self.assertEqual((standing.wins, standing.points_for), (1, 80))
+
+    def testImportRequiresAdmin(self):
+        """
+        Ensure only administrators can import.
+        """
+        coach_group = Group(name='coach')
+        coach_group.save()
+        coach = User(first_name='Test', last_name='Coach', username='testcoach', email='coach@gmail.com',
+                     groups=coach_group)
+        coach.save()
+        self.client.force_authenticate(user=coach)
+        response = self.upload('players', 'players.csv', self.header + self.player_row('Player 1', 'Team A'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Player.objects.count(), 0)
+
+    def testImportCommandResumesFromCheckpoint(self):
+        """
+        Ensure an interrupted import keeps its committed batches and resumes after them.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'players.csv')
+            with open(path, 'w') as players_file:
+                players_file.write(self.header + ''.join(self.player_row('Player %d' % index, 'Team A')
+                                                         for index in range(5)))
+            with mock.patch('btms_api.importer.PlayerImporter.after_batch',
+                            side_effect=[None, None, RuntimeError('interrupted')]):
+                with self.assertRaises(RuntimeError):
+                    call_command('import_data', 'players', path, batch_size=2, stdout=io.StringIO())
+            self.assertEqual(Player.objects.count(), 4)
+            with self.assertRaises(CommandError):
+                call_command('import_data', 'players', path, batch_size=2, stdout=io.StringIO())
+
+            call_command('import_data', 'players', path, batch_size=2, resume=True, stdout=io.StringIO())
+            self.assertEqual(Player.objects.count(), 5)
+            self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+@override_settings(BTMS_EVENT_GROUP_COMMIT=False)
+class MatchEventTests(APITestCase):
+
+    def setUp(self):
+        admin_group = Group(name='admin')
+        admin_group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com',
+                    groups=admin_group)
+        user.save()
+        self.host = Team(name='Team A', average_score=145.6)
+        self.host.save()
+        self.guest = Team(name='Team B', average_score=120.5)
+        self.guest.save()
+        self.players = {}
+        for team in [self.host, self.guest]:
+            for index in range(2):
+                player = Player(name='%s %d' % (team.name, index), position='guard', age=20,
+                                number_of_games_played=1, penalty_count=0, height=180, weight=80,
+                                average_score=100, is_team_captain=index == 0, team=team)
+                player.save()
+                self.players[team.name, index] = player
+        Round(round_no=1, round_code='GF', round_name='Grand Final').save()
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/btms_api/matches/', {
+            'match_no': 1, 'date': '2022-03-01', 'time': '10:00', 'venue': 'Arena', 'round': 1,
+            'host_team': self.host.id, 'guest_team': self.guest.id, 'winner_team': self.host.id,
+            'host_team_final_score': 0, 'guest_team_final_score': 0}, format='json')
+        self.match_id = response.data['id']
+
+    def event(self, sequence, kind, team, player=None, points=0, **kwargs):
+        return dict({'sequence': sequence, 'kind': kind, 'team': team.id, 'points': points,
+                     'player': player.id if player else None}, **kwargs)
+
+    def post_events(self, events):
+        return self.client.post('/btms_api/matches/%d/events/' % self.match_id, events, format='json')
+
+    def testEventsDeriveScoresAndPenalties(self):
+        """
+        Ensure posted events update the match scores, winner, standings and player penalty counts.
+        """
+        fouling = self.players['Team A', 1]
+        response = self.post_events([
+            self.event(1, 'basket', self.host, self.players['Team A', 0], points=2),
+            self.event(2, 'basket', self.guest, self.players['Team B', 0], points=3),
+            self.event(3, 'foul', self.host, fouling),
+            self.event(4, 'substitution', self.guest, self.players['Team B', 1],
+                       substituted_player=self.players['Team B', 0].id),
+            self.event(5, 'basket', self.guest, points=2),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'created': 5, 'duplicates': 0, 'match': {
+            'host_team_final_score': 2, 'guest_team_final_score': 5, 'winner_team': self.guest.id}})
+
+        fouling.refresh_from_db()
+        self.assertEqual(fouling.penalty_count, 1)
+        standing = TeamStanding.objects.get(team=self.guest)
+        self.assertEqual((standing.wins, standing.points_for), (1, 5))
+        incremental = list(TeamStanding.objects.order_by('team').values_list())
+        rebuild_standings()
+        self.assertEqual(list(TeamStanding.objects.order_by('team').values_list()), incremental)
+
+        response = self.client.get('/btms_api/matches/%d/events/' % self.match_id)
+        self.assertEqual([event['sequence'] for event in response.data], [1, 2, 3, 4, 5])
+
+    def testResubmittedEventsIgnored(self):
+        """
+        Ensure retrying a batch does not count its events twice.
+        """
+        events = [self.event(1, 'basket', self.host, points=3),
+                  self.event(2, 'foul', self.host, self.players['Team A', 0])]
+        self.post_events(events)
+        response = self.post_events(events + [self.event(3, 'basket', self.host, points=1)])
+        self.assertEqual((response.data['created'], response.data['duplicates']), (1, 2))
+        self.assertEqual(response.data['match']['host_team_final_score'], 4)
+        self.assertEqual(Player.objects.get(pk=self.players['Team A', 0].id).penalty_count, 1)
+
+    def testInvalidEventsRejected(self):
+        """
+        Ensure invalid events are reported by index and no event of the batch is stored.
+        """
+        response = self.post_events([
+            self.event(1, 'basket', self.host, points=2),
+            self.event(2, 'basket', self.host, self.players['Team B', 0], points=2),
+            self.event(3, 'basket', self.guest, points=5),
+            self.event(1, 'foul', self.guest),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([(error['index'], sorted(error['errors'])) for error in response.data['errors']],
+                         [(1, ['player']), (2, ['points']), (3, ['player', 'sequence'])])
+        self.assertEqual(MatchEvent.objects.count(), 0)
+
+    def testPostingEventsRequiresAdmin(self):
+        """
+        Ensure only administrators can post events, while other users can read them.
+        """
+        coach_group = Group(name='coach')
+        coach_group.save()
+        coach = User(first_name='Test', last_name='Coach', username='testcoach', email='coach@gmail.com',
+                     groups=coach_group)
+        coach.save()
+        self.client.force_authenticate(user=coach)
+        response = self.post_events([self.event(1, 'basket', self.host, points=2)])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/btms_api/matches/%d/events/' % self.match_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class EventWriterTests(APITransactionTestCase):
+    """
+    The writer thread uses its own connection, so the data is committed.
+    """
+
+    def setUp(self):
+        self.host = Team(name='Team A', average_score=145.6)
+        self.host.save()
+        self.guest = Team(name='Team B', average_score=120.5)
+        self.guest.save()
+        round_obj = Round(round_no=1, round_code='GF', round_name='Grand Final')
+        round_obj.save()
+        self.matches = []
+        for match_no in range(4):
+            match = Match(match_no=match_no, date='2022-03-01', time='10:00', venue='Arena', round=round_obj,
+                          host_team=self.host, guest_team=self.guest, winner_team=self.host,
+                          host_team_final_score=0, guest_team_final_score=0)
+            match.save()
+            self.matches.append(match)
+
+    def testConcurrentBatchesGroupCommitted(self):
+        """
+        Ensure batches submitted concurrently are all committed, grouped into fewer transactions.
+        """
+        writer = EventWriter()
+        with mock.patch('btms_api.match_events.apply_event_batches', wraps=apply_event_batches) as apply:
+            futures = [writer.submit(match.id, [{'sequence': sequence, 'kind': 'basket', 'team': self.guest,
+                                                 'points': 2}])
+                       for sequence in range(25) for match in self.matches]
+            results = [future.result(timeout=10) for future in futures]
+        self.assertEqual(sum(result['created'] for result in results), 100)
+        self.assertLess(apply.call_count, 100)
+        for match in self.matches:
+            match.refresh_from_db()
+            self.assertEqual((match.guest_team_final_score, match.winner_team_id), (50, self.guest.id))
+
+    def testFailingBatchIsolated(self):
+        """
+        Ensure a batch failing in a group only fails its own request.
+        """
+        writer = EventWriter()
+        event = {'sequence': 1, 'kind': 'basket', 'team': self.host, 'points': 3}
+        release = threading.Event()
+
+        def held(batches):
+            # hold the writer on its first group so the other batches queue up together
+            release.wait(10)
+            return apply_event_batches(batches)
+
+        with mock.patch('btms_api.match_events.apply_event_batches', side_effect=held) as apply:
+            first = writer.submit(self.matches[0].id, [event])
+            futures = [writer.submit(match_id, [event]) for match_id in [self.matches[1].id, 0, self.matches[2].id]]
+            release.set()
+            first.result(timeout=10)
+            for future in futures:
+                future.exception(timeout=10)
+        # each group once plus the batches of the failing group one by one, however the batches were grouped
+        self.assertEqual(apply.call_count, 5)
+        self.assertEqual(futures[0].result(timeout=10)['created'], 1)
+        self.assertIsInstance(futures[1].exception(), IntegrityError)
+        self.assertEqual(futures[2].result(timeout=10)['match']['host_team_final_score'], 3)
+        self.assertEqual(MatchEvent.objects.count(), 3)
+
+
+class AsyncReadTests(APITransactionTestCase):
+    """
+    Requests through the async (ASGI) handler. Executor threads use their own connections, so the data is committed.
+    """
+
+    def setUp(self):
+        get_token_cache().clear()
+        caches['responses'].clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        self.headers = {'authorization': 'Token %s' % Token.objects.create(user=user).key}
+        self.team = Team(name='Team A', average_score=145.6)
+        self.team.save()
+        for index in range(4):
+            Player(name='Player %d' % index, position='guard', age=20, number_of_games_played=1, penalty_count=0,
+                   height=180, weight=80, average_score=100 + index * 10, is_team_captain=index == 0,
+                   team=self.team).save()
+        round_obj = Round(round_no=1, round_code='GF', round_name='Grand Final')
+        round_obj.save()
+        Match(match_no=1, date='2022-03-01', time='10:00', venue='Arena', round=round_obj, host_team=self.team,
+              guest_team=self.team, winner_team=self.team, host_team_final_score=80,
+              guest_team_final_score=70).save()
+
+    async def testReadsRunInExecutor(self):
+        """
+        Ensure list and detail reads run in the database executor with the same filters as the sync views.
+        """
+        with mock.patch.object(async_views, 'run_in_db_executor', wraps=async_views.run_in_db_executor) as run:
+            response = await self.async_client.get('/btms_api/players/?team=%d&percentile=50' % self.team.id,
+                                                   **self.headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([player['average_score'] for player in response.json()], [120, 130])
+            response = await self.async_client.get('/btms_api/matches/?round=0', **self.headers)
+            self.assertEqual(response.json(), [])
+            response = await self.async_client.get('/btms_api/teams/%d/' % self.team.id, **self.headers)
+            self.assertEqual(response.json()['name'], 'Team A')
+            self.assertEqual(run.call_count, 3)
+
+    async def testQueriesReported(self):
+        """
+        Ensure queries run in the executor are reported in the Server-Timing header.
+        """
+        response = await self.async_client.get('/btms_api/rounds/', **self.headers)
+        self.assertRegex(response['Server-Timing'], r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    async def testPermissions(self):
+        """
+        Ensure the async views keep the authentication and permission checks.
+        """
+        response = await self.async_client.get('/btms_api/teams/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get('/btms_api/players/', authorization='Token invalid')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def testWritesThreadSensitive(self):
+        """
+        Ensure writes on the async URLs are served outside the database executor.
+        """
+        with mock.patch.object(async_views, 'run_in_db_executor') as run:
+            response = await self.async_client.post('/btms_api/teams/', {'name': 'Team B', 'average_score': 120},
+                                                    content_type='application/json', **self.headers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            run.assert_not_called()
+
+    async def testExportSpooled(self):
+        """
+        Ensure exports are produced in the database executor and streamed whole.
+        """
+        response = await self.async_client.get('/btms_api/export/players/?format=ndjson', **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Player %d' % index for index in range(4)])
+
+    async def testConcurrentReads(self):
+        """
+        Ensure many concurrent reads are served by the bounded executor.
+        """
+        responses = await asyncio.gather(*[self.async_client.get('/btms_api/players/', **self.headers)
+                                           for _ in range(3 * async_views.get_db_executor()._max_workers)])
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_200_OK})
+        self.assertEqual({len(response.json()) for response in responses}, {4})
+
+
+class LiveScoresTests(APITransactionTestCase):
+    """
+    Score streams through the ASGI application. Writes run in other threads, so the data is committed.
+    """
+
+    def setUp(self):
+        get_token_cache().clear()
+        group = Group(name='admin')
+        group.save()
+        user = User(first_name='Test', last_name='User', username='testuser', email='test@gmail.com', groups=group)
+        user.save()
+        self.token = Token.objects.create(user=user).key
+        self.host = Team(name='Team A', average_score=145.6)
+        self.host.save()
+        self.guest = Team(name='Team B', average_score=120.5)
+        self.guest.save()
+        self.round = Round(round_no=1, round_code='GF', round_name='Grand Final')
+        self.round.save()
+        self.match = Match(match_no=1, date='2022-03-01', time='10:00', venue='Arena', round=self.round,
+                           host_team=self.host, guest_team=self.guest, winner_team=self.host,
+                           host_team_final_score=80, guest_team_final_score=70)
+        self.match.save()
+
+    def open_stream(self, query, headers=()):
+        communicator = ApplicationCommunicator(LiveScoresApplication(None), {
+            'type': 'http', 'method': 'GET', 'path': '/btms_api/live/', 'query_string': query.encode('latin1'),
+            'headers': list(headers)})
+        return communicator
+
+    async def read_event(self, communicator):
+        message = await communicator.receive_output(5)
+        return message['body'].decode('utf-8')
+
+    async def testStreamsScoreChanges(self):
+        """
+        Ensure a stream starts with the current score and receives the scores written afterwards.
+        """
+        communicator = self.open_stream('match=%d' % self.match.id,
+                                        [(b'authorization', b'Token ' + self.token.encode())])
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertIn('"host_team_final_score":80,"guest_team_final_score":70', await self.read_event(communicator))
+
+        response = await self.async_client.patch('/btms_api/matches/%d/' % self.match.id,
+                                                 {'guest_team_final_score': 90, 'winner_team': self.guest.id},
+                                                 content_type='application/json',
+                                                 authorization='Token %s' % self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        event = await self.read_event(communicator)
+        self.assertTrue(event.startswith('event: score\ndata: '))
+        self.assertEqual(json.loads(event.split('data: ')[1]),
+                         {'match': self.match.id, 'round': self.round.id, 'host_team': self.host.id,
+                          'guest_team': self.guest.id, 'host_team_final_score': 80, 'guest_team_final_score': 90,
+                          'winner_team': self.guest.id})
+
+        # a write leaving the score alone is not published
+        await self.async_client.patch('/btms_api/matches/%d/' % self.match.id, {'venue': 'Hall'},
+                                      content_type='application/json', authorization='Token %s' % self.token)
+        self.assertTrue(await communicator.receive_nothing(0.2))
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def testRoundStreamAndErrors(self):
+        """
+        Ensure round streams accept the token as a query param, and bad subscriptions are refused.
+        """
+        for query, status_code in [('round=%d' % self.round.id, status.HTTP_401_UNAUTHORIZED),
+                                   ('round=%d&token=invalid' % self.round.id, status.HTTP_401_UNAUTHORIZED),
+                                   ('token=%s' % self.token, status.HTTP_400_BAD_REQUEST),
+                                   ('round=one&token=%s' % self.token, status.HTTP_400_BAD_REQUEST)]:
+            communicator = self.open_stream(query)
+            await communicator.send_input({'type': 'http.request'})
+            self.assertEqual((await communicator.receive_output(5))['status'], status_code)
+            await communicator.wait(5)
+
+        communicator = self.open_stream('round=%d&token=%s' % (self.round.id, self.token))
+        await communicator.send_input({'type': 'http.request'})
+        self.assertEqual((await communicator.receive_output(5))['status'], status.HTTP_200_OK)
+        self.assertIn('"match":%d' % self.match.id, await self.read_event(communicator))
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def testBroadcasterDropsOldest(self):
+        """
+        Ensure a subscription that is not read keeps the latest messages, and unsubscribing stops delivery.
+        """
+        broadcaster = Broadcaster(queue_size=2)
+        subscription = broadcaster.subscribe(['match:1', 'round:1'])
+        for index in range(3):
+            self.assertEqual(broadcaster.publish(['match:1', 'round:1'], b'%d' % index), 1)
+        await asyncio.sleep(0)
+        self.assertEqual([subscription.queue.get_nowait() for _ in range(2)], [b'1', b'2'])
+        broadcaster.unsubscribe(subscription)
+        self.assertEqual(broadcaster.publish(['match:1'], b'3'), 0)
+
+    async def testBrokerRelaysBetweenWorkers(self):
+        """
+        Ensure a message published by one worker reaches the subscribers of every worker through the broker.
+        """
+        started = threading.Event()
+        servers = []
+
+        def run_broker():
+            try:
+                asyncio.run(serve_broker('127.0.0.1', 0, lambda server: (servers.append(server), started.set())))
+            except asyncio.CancelledError:
+                pass
+
+        threading.Thread(target=run_broker, daemon=True).start()
+        self.assertTrue(started.wait(5))
+        address = '127.0.0.1:%d' % servers[0].sockets[0].getsockname()[1]
+        workers = [Broadcaster(), Broadcaster()]
+        clients = [BrokerClient(address, broadcaster) for broadcaster in workers]
+        try:
+            self.assertTrue(all(client.wait_connected(5) for client in clients))
+            subscriptions = [broadcaster.subscribe(['match:1']) for broadcaster in workers]
+            clients[0].publish(['match:1'], b'event: score\ndata: {}\n\n')
+            for subscription in subscriptions:
+                self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 5), b'event: score\ndata: {}\n\n')
+        finally:
+            servers[0].get_loop().call_soon_threadsafe(servers[0].close)
+
+
+class SQLiteProfileTests(APITestCase):
+    """
+    The production SQLite backend, on connections of its own to a database file.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'profile.sqlite3')
+
+    def open(self, **options):
+        settings_dict = dict(connection.settings_dict, ENGINE='btms_api.backends.sqlite3', NAME=self.path,
+                             OPTIONS=options)
+        wrapper = ProfileDatabaseWrapper(settings_dict, alias='profile')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def testPragmasApplied(self):
+        """
+        Ensure every connection is set up with the pragmas, WAL and a busy timeout by default.
+        """
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        wrapper = self.open(pragmas={'busy_timeout': 0, 'cache_size': -1000})
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 0)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -1000)
+
+    def testTransactionsTakeWriteLock(self):
+        """
+        Ensure transactions begin immediately, so a second writer is refused at BEGIN after its retries.
+        """
+        first = self.open(pragmas={'journal_mode': 'WAL', 'busy_timeout': 0})
+        second = self.open(pragmas={'busy_timeout': 0}, lock_retries=2, lock_retry_backoff=0.001)
+        first.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.assertTrue(first.connection.in_transaction)
+        with mock.patch('btms_api.backends.sqlite3.base.time.sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                second.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.assertEqual(sleep.call_count, 2)
+        first.rollback()
+        first.set_autocommit(True)
+
+    def testLockErrorsRetried(self):
+        """
+        Ensure a write outside a transaction waits out a lock held longer than the busy timeout.
+        """
+        first = self.open(pragmas={'journal_mode': 'WAL', 'busy_timeout': 0})
+        second = self.open(pragmas={'busy_timeout': 0}, lock_retries=8, lock_retry_backoff=0.01)
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE score (points integer)')
+        first.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        with first.cursor() as cursor:
+            cursor.execute('INSERT INTO score VALUES (1)')
+        release = threading.Timer(0.05, first.connection.commit)
+        release.start()
+        with second.cursor() as cursor:
+            cursor.execute('INSERT INTO score VALUES (%s)', [2])
+            cursor.execute('SELECT points FROM score ORDER BY points')
+            self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+        release.join()
+        first.set_autocommit(True)
@@ -1,21 +1,32 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
 from .views import TeamViewSet, CoachViewSet, PlayerViewSet, RoundViewSet, MatchViewSet, UserViewSet, \
-    LogoutView
+    StandingViewSet, BracketView, LeaderboardView, ResponseCacheStatsView, MetricsView, PlayerExportView, \
+    MatchExportView, PlayerImportView, MatchImportView, LogoutView
 from rest_framework.authtoken.views import obtain_auth_token
+from .routers import BulkRouter
 
-router = DefaultRouter()
+router = BulkRouter()
 router.register('teams', TeamViewSet, basename='teams')
 router.register('coaches', CoachViewSet, basename='coaches')
 router.register('players', PlayerViewSet, basename='players')
 router.register('rounds', RoundViewSet, basename='rounds')
 router.register('matches', MatchViewSet, basename='matches')
 router.register('users', UserViewSet, basename='user-list')
+router.register('standings', StandingViewSet, basename='standings')
 # router.register('login', LoginView, basename='login')
 
 
 urlpatterns = [
     path('btms_api/', include(router.urls)),
+    path('btms_api/bracket/', BracketView.as_view(), name='bracket'),
+    path('btms_api/leaderboards/', LeaderboardView.as_view(), name='leaderboards'),
+    path('btms_api/leaderboards/<str:board>/', LeaderboardView.as_view(), name='leaderboard'),
+    path('btms_api/cache-stats/', ResponseCacheStatsView.as_view(), name='cache-stats'),
+    path('btms_api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('btms_api/export/players/', PlayerExportView.as_view(), name='export-players'),
+    path('btms_api/export/matches/', MatchExportView.as_view(), name='export-matches'),
+    path('btms_api/import/players/', PlayerImportView.as_view(), name='import-players'),
+    path('btms_api/import/matches/', MatchImportView.as_view(), name='import-matches'),
     path('btms_api/logout/', LogoutView.as_view(), name='logout'),
     path('btms_api/login/', obtain_auth_token, name='btms_api/login/')
 ]
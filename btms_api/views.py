@@ -1,110 +1,353 @@
+from django.db import transaction
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
+from .authentication import CachedTokenAuthentication
+from .bulk import BulkModelMixin, as_pk
+from .conditional import ConditionalGetMixin
+from .export import ExportView
+from .fast_list import FastListMixin
+from .filters import PlayerFilterSet, MatchFilterSet
+from .importer import ImportView, PlayerImporter, MatchImporter
+from .live import publish_scores, score_changed
+from .match_events import MatchEventsMixin
+from .metrics import TimedViewMixin, PrometheusRenderer, registry as metrics_registry, response_cache_lines, \
+    phase
+from .response_cache import ResponseCacheMixin, response_cache_stats
+from .pagination import KeysetPagination
 from .permission import IsAdminUser, IsAdminOrCoachUser
 from .serializers import TeamSerializer, CoachSerializer, PlayerSerializer, RoundSerializer, MatchSerializer, \
-    UserSerializer
-from .models import Team, Coach, Player, Round, Match, User
-import numpy as np
+    UserSerializer, TeamStandingSerializer, get_expanded_fields, get_field_columns, FIELDS_QUERY_PARAM
+from .models import Team, Coach, Player, Round, Match, User, TeamStanding
+from . import percentile as percentile_engine
+from . import standings
+from .bracket import get_bracket
+from .player_stats import get_player_stats
+from .leaderboards import get_leaderboards, LEADERBOARDS, DEFAULT_LEADERBOARD_LIMIT, MAX_LEADERBOARD_LIMIT
+import copy
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class ExpandMixin:
+    """
+    Joins the relations requested with `?expand=` into the queryset with a single `select_related`, so the number
+    of queries does not grow with the number of rows.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        expandable_fields = getattr(self.get_serializer_class(), 'expandable_fields', {})
+        expanded_fields = get_expanded_fields(self.request, expandable_fields)
+        if expanded_fields:
+            queryset = queryset.select_related(*expanded_fields)
+        return queryset
+
+
+class FieldsMixin:
+    """
+    Narrows the SELECT of reads with `?fields=` to the columns of the selected fields, plus the primary key, the
+    keyset ordering fields and the relations joined with `select_related`, using `only()`. The queryset is left
+    whole when a selected field is not backed by a column of the model.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS or FIELDS_QUERY_PARAM not in self.request.query_params:
+            return queryset
+
+        # the serializer validates `?fields=` and keeps the selected fields only
+        field_columns = get_field_columns(self.get_serializer_class()(context=self.get_serializer_context()))
+        if field_columns is None:
+            return queryset
+
+        columns = {queryset.model._meta.pk.name}
+        columns.update(model_field.name for model_field in field_columns.values())
+        for ordering in (getattr(self, 'keyset_orderings', None) or {}).values():
+            columns.update(name.lstrip('-') for name in ordering)
+        if isinstance(queryset.query.select_related, dict):
+            columns.update(queryset.query.select_related)
+        return queryset.only(*columns)
+
+
+class PlayerQuerysetMixin:
+    """
+    Players filtered by `PlayerFilterSet`, then by the `percentile` query param.
+    """
+
+    def get_queryset(self):
+        queryset = PlayerFilterSet(self.request.query_params).filter_queryset(Player.objects.all())
+
+        percentile = self.request.query_params.get('percentile')
+        if percentile:
+            try:
+                queryset = self.filter_queryset_by_percentile(queryset, percentile)
+            except ValueError:
+                raise ValidationError({'percentile': 'Percentiles must be numbers in the range [0, 100].'})
+
+        return queryset
+
+    def filter_queryset_by_percentile(self, queryset, percentile):
+        with phase('percentile'):
+            return percentile_engine.filter_queryset_by_percentile(queryset, 'average_score', percentile)
+
+
+class MatchQuerysetMixin:
+    """
+    Matches filtered by `MatchFilterSet`.
+    """
+
+    def get_queryset(self):
+        return MatchFilterSet(self.request.query_params).filter_queryset(Match.objects.all())
+
+
+class TeamViewSet(TimedViewMixin, ConditionalGetMixin, ResponseCacheMixin, BulkModelMixin, FieldsMixin,
+                  FastListMixin, viewsets.ModelViewSet):
 
     serializer_class = TeamSerializer
     queryset = Team.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
 
-class CoachViewSet(viewsets.ModelViewSet):
+class CoachViewSet(TimedViewMixin, ConditionalGetMixin, ResponseCacheMixin, BulkModelMixin, FieldsMixin, ExpandMixin,
+                   FastListMixin, viewsets.ModelViewSet):
 
     serializer_class = CoachSerializer
     queryset = Coach.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
 
-class PlayerViewSet(viewsets.ModelViewSet):
+class PlayerViewSet(TimedViewMixin, ConditionalGetMixin, BulkModelMixin, FieldsMixin, ExpandMixin, PlayerQuerysetMixin,
+                    FastListMixin, viewsets.ModelViewSet):
 
     serializer_class = PlayerSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = KeysetPagination
+    keyset_orderings = {
+        'id': ('id',),
+        'average_score': ('average_score', 'id'),
+        '-average_score': ('-average_score', '-id'),
+    }
 
     def get_permissions(self):
         permission_classes = []
         if self.action == 'create':
             permission_classes = [IsAdminUser]
-        elif self.action == 'list':
+        elif self.action == 'list' or self.action == 'stats':
             permission_classes = [IsAdminOrCoachUser]
-        elif self.action == 'retrieve' or self.action == 'update' or self.action == 'partial_update':
+        elif self.action == 'retrieve' or self.action == 'update' or self.action == 'partial_update' \
+                or self.action == 'bulk_partial_update':
             permission_classes = [IsAdminOrCoachUser]
         elif self.action == 'destroy':
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
 
-    def get_queryset(self):
-        queryset = Player.objects.all()
-
-        query_params = self.request.query_params
-        team = query_params.get('team')
-        percentile = query_params.get('percentile')
+    @action(detail=False)
+    def stats(self, request):
+        """
+        Per-team statistics and histograms of player scores, sizes, ages, penalties and BMI, cached until the next
+        Team or Player write.
+        """
+        with phase('stats'):
+            return Response(get_player_stats())
 
-        if team:
-            try:
-                queryset = queryset.filter(team__id=team)
-                if percentile:
-                    queryset = self.filter_queryset_by_percentile(queryset, percentile)
-            except Exception:
-                raise ValidationError(
-                    'Error(s) occurred when filtering with query param. Please check for invalid query params')
 
-        return queryset
-
-    def filter_queryset_by_percentile(self, queryset, percentile):
-        query_arr = queryset.values_list('average_score', flat=True)
-        arr = list(query_arr)
-        calculated_percentile = np.percentile(arr, float(percentile))
-        queryset = queryset.filter(average_score__gte=calculated_percentile)
-        return queryset
-
-
-class RoundViewSet(viewsets.ModelViewSet):
+class RoundViewSet(TimedViewMixin, ConditionalGetMixin, ResponseCacheMixin, FieldsMixin, FastListMixin,
+                   viewsets.ModelViewSet):
 
     serializer_class = RoundSerializer
     queryset = Round.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
 
 
-class MatchViewSet(viewsets.ModelViewSet):
+class MatchViewSet(TimedViewMixin, ConditionalGetMixin, BulkModelMixin, MatchEventsMixin, FieldsMixin, ExpandMixin,
+                   MatchQuerysetMixin, FastListMixin, viewsets.ModelViewSet):
 
     serializer_class = MatchSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_orderings = {
+        'date': ('date', 'time', 'id'),
+        '-date': ('-date', '-time', '-id'),
+        'id': ('id',),
+    }
 
-    def get_queryset(self):
-        queryset = Match.objects.all()
-        query_params = self.request.query_params
-        round_param = query_params.get('round')
+    def get_permissions(self):
+        if self.action == 'events' and self.request.method == 'POST':
+            return [IsAdminUser()]
+        return super().get_permissions()
 
-        if round_param:
-            try:
-                queryset = queryset.filter(round=int(round_param))
-            except Exception:
-                raise ValidationError(
-                    'Error(s) occurred when filtering with query param. Please check for invalid query params')
-        return queryset
+    @action(detail=True, methods=['get', 'post'])
+    def events(self, request, pk=None):
+        """
+        Play-by-play events of the match. Posted events update the match scores, winner and player penalty counts.
+        """
+        match = self.get_object()
+        if request.method == 'POST':
+            return self.create_events(request, match)
+        return self.list_events(request, match)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            match = serializer.save()
+            standings.update_standings(added=[match])
+            publish_scores([match])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            previous = copy.copy(serializer.instance)
+            match = serializer.save()
+            standings.update_standings(added=[match], removed=[previous])
+            if score_changed(previous, match):
+                publish_scores([match])
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            standings.update_standings(removed=[instance])
+            instance.delete()
 
-class UserViewSet(viewsets.ModelViewSet):
+    def perform_bulk_create(self, instances):
+        standings.update_standings(added=instances)
+        publish_scores(instances)
+
+    def perform_bulk_update(self, instances, previous_instances):
+        standings.update_standings(added=instances, removed=previous_instances)
+        publish_scores([match for match, previous in zip(instances, previous_instances)
+                        if score_changed(previous, match)])
+
+
+class StandingViewSet(TimedViewMixin, FieldsMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Team standings ordered by wins then point differential, read from the stored aggregate in one indexed query.
+    """
+    serializer_class = TeamStandingSerializer
+    queryset = TeamStanding.objects.filter(played__gt=0).select_related('team') \
+        .order_by('-wins', '-point_differential', 'team')
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+
+class BracketView(TimedViewMixin, APIView):
+    """
+    The knockout bracket nested by round, cached until a Team, Round or Match write.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_bracket())
+
+
+class LeaderboardView(TimedViewMixin, APIView):
+    """
+    The top `?limit=` players (10 by default) by highest average score, fewest penalties and most games played,
+    overall and in every team, or in the `?team=` team only. `/btms_api/leaderboards/<board>/` gives one leaderboard.
+    Cached until the next Team or Player write.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminOrCoachUser]
+
+    def get(self, request, board=None):
+        if board is not None and board not in LEADERBOARDS:
+            raise NotFound('Unknown leaderboard %s. Leaderboards are: %s' % (board, ', '.join(LEADERBOARDS)))
+
+        limit = request.query_params.get('limit')
+        if limit is None:
+            limit = DEFAULT_LEADERBOARD_LIMIT
+        else:
+            limit = as_pk(limit)
+            if limit is None or not 1 <= limit <= MAX_LEADERBOARD_LIMIT:
+                raise ValidationError({'limit': 'Give a whole number from 1 to %d.' % MAX_LEADERBOARD_LIMIT})
+        team = request.query_params.get('team')
+        if team is not None and as_pk(team) is None:
+            raise ValidationError({'team': 'Give a team id.'})
+
+        with phase('leaderboards'):
+            leaderboards = get_leaderboards(limit)
+        teams = leaderboards['teams']
+        if team is not None:
+            teams = [boards for boards in teams if boards['team'] == as_pk(team)]
+        if board is None:
+            return Response(dict(leaderboards, teams=teams))
+        return Response({'limit': limit, 'overall': leaderboards['overall'][board],
+                         'teams': [{'team': boards['team'], 'name': boards['name'], board: boards[board]}
+                                   for boards in teams]})
+
+
+class ResponseCacheStatsView(TimedViewMixin, APIView):
+    """
+    Hit/miss counters of the response cache in this process.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache_stats.snapshot())
+
+
+class PlayerExportView(TimedViewMixin, PlayerQuerysetMixin, ExportView):
+    """
+    Every player, filtered like `/btms_api/players/`, streamed as CSV or NDJSON.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminOrCoachUser]
+    export_fields = [field.name for field in Player._meta.fields]
+    export_name = 'players'
+
+
+class MatchExportView(TimedViewMixin, MatchQuerysetMixin, ExportView):
+    """
+    Every match, filtered like `/btms_api/matches/`, streamed as CSV or NDJSON.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminOrCoachUser]
+    export_fields = [field.name for field in Match._meta.fields]
+    export_name = 'matches'
+
+
+class PlayerImportView(TimedViewMixin, ImportView):
+    """
+    Creates or updates (by `id`) players from an uploaded CSV or NDJSON file, in the format of the players export.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    importer_class = PlayerImporter
+
+
+class MatchImportView(TimedViewMixin, ImportView):
+    """
+    Creates or updates (by `id`) matches from an uploaded CSV or NDJSON file, in the format of the matches export.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    importer_class = MatchImporter
+
+
+class MetricsView(TimedViewMixin, APIView):
+    """
+    Per-route request metrics of this process in the Prometheus text format.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        return Response(metrics_registry.render(response_cache_lines(response_cache_stats.snapshot())))
+
+
+class UserViewSet(TimedViewMixin, FieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
 
 
 class LoginView(viewsets.ViewSet):
@@ -114,7 +357,11 @@ class LoginView(viewsets.ViewSet):
         return ObtainAuthToken().post(request)
 
 
-class LogoutView(APIView):
+class LogoutView(TimedViewMixin, APIView):
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
     def get(self, request):
+        # deleting the token also evicts it from the token cache, see signals.revoke_deleted_token
         request.user.auth_token.delete()
         return Response(status=status.HTTP_200_OK)